@@ -1,25 +1,218 @@
-from flask import Flask, render_template, request
-from datetime import datetime
-from tripweather import find_weather_along_route, get_weather_comment  # Ensure these functions are correctly imported
+import asyncio
+import json
+import math
+import os
+import time
+from flask import Flask, Response, g, make_response, render_template, request, jsonify, url_for, stream_with_context
+from datetime import datetime, timedelta
+from tripweather import APIError, find_weather_along_route_async, get_trip_comment, build_trip_report, iter_weather_along_route, stream_trip_comment  # Ensure these functions are correctly imported
+from sweep import sweep_departures
+from jobs import JobManager
+from corridors import start_corridor_warmer
+import telemetry
 
 app = Flask(__name__)
 # app.config['WTF_CSRF_ENABLED'] = False  # Disable CSRF protection for testing
 
+job_manager = JobManager(max_workers=int(os.getenv('JOB_WORKERS', '4')))
+
+# Shown instead of provider errors, whose text can include request URLs and API keys
+TRIP_ERROR = 'Could not get the weather along this route. Please try again later.'
+
+# Opt-in debug endpoints: /debug/profile samples the process, /debug/traces shows recent span trees
+PROFILING_ENABLED = os.getenv('TRIPWEATHER_PROFILING') == '1'
+
+HTTP_REQUESTS = telemetry.counter(
+    'tripweather_http_requests_total', 'HTTP requests served.', ['endpoint', 'method', 'status']
+)
+HTTP_SECONDS = telemetry.histogram(
+    'tripweather_http_request_seconds', 'Time to produce the HTTP response.', ['endpoint']
+)
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    """Count the request; streamed responses are timed until their headers are ready."""
+    endpoint = request.endpoint or 'unknown'
+    HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    started = g.get('request_started')
+    if started is not None:
+        HTTP_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+    return response
+
+def optional_number(name, cast=float, source=None):
+    """Read an optional numeric form field, returning None when it is empty."""
+    value = (source if source is not None else request.form).get(name)
+    value = '' if value is None else str(value).strip()
+    if not value:
+        return None
+    try:
+        return cast(value)
+    except ValueError:
+        raise ValueError(f'{name} must be a number')
+
+def read_sampling(source=None):
+    """
+    Read and check the optional sampling fields: stops, spacing_km or spacing_minutes.
+    
+    Raises:
+        ValueError: If a value is not a finite positive number or more than one is given
+    """
+    sampling = {
+        'stops': optional_number('stops', int, source),
+        'spacing_km': optional_number('spacing_km', float, source),
+        'spacing_minutes': optional_number('spacing_minutes', float, source)
+    }
+    given = [name for name, value in sampling.items() if value is not None]
+    if len(given) > 1:
+        raise ValueError('Use only one of stops, spacing_km or spacing_minutes')
+    if any(not math.isfinite(sampling[name]) or sampling[name] <= 0 for name in given):
+        raise ValueError(f'{given[0]} must be a positive number')
+    return sampling
+
 @app.route('/', methods=['GET', 'POST'])
-def index():
+async def index():
     weather_data = []
     ai_comment = ""
+    comparison = None
+    error = ""
+    status = 200
+    trip = None
     if request.method == 'POST':
-        origin = request.form['origin']
-        destination = request.form['destination']
-        starttime = request.form['starttime']
-        start_time = datetime.strptime(starttime, '%Y-%m-%dT%H:%M')
-        
-        weather_data = find_weather_along_route(origin, destination, start_time)
-        if weather_data:
-            ai_comment = get_weather_comment(weather_data)
+        with telemetry.trace('trip') as trip:
+            try:
+                origin = request.form['origin']
+                destination = request.form['destination']
+                start_time = datetime.strptime(request.form['starttime'], '%Y-%m-%dT%H:%M')
+                sampling = read_sampling()
+                window_end = request.form.get('window_end', '').strip()
+                if window_end:
+                    comparison = await asyncio.to_thread(
+                        sweep_departures, origin, destination, start_time,
+                        datetime.strptime(window_end, '%Y-%m-%dT%H:%M'),
+                        timedelta(minutes=optional_number('step_minutes') or 60),
+                        **sampling
+                    )
+                    best = next((row for row in comparison['departures'] if row['departure'] == comparison['best']), None)
+                    weather_data = [stop for stop in best['stops'] if stop.temperature is not None] if best else []
+                else:
+                    weather_data = await find_weather_along_route_async(origin, destination, start_time, **sampling)
+            except (KeyError, ValueError) as e:
+                error = f'Invalid trip request: {e}'
+                status = 400
+            except APIError as e:
+                app.logger.error(f"Trip failed: {e}")
+                error = TRIP_ERROR
+                status = 502
+            if weather_data:
+                ai_comment = await asyncio.to_thread(get_trip_comment, weather_data, use_llm='ai_comment' in request.form)
+    
+    response = make_response(render_template('index.html', weather_data=[stop.to_dict() for stop in weather_data],
+                                              ai_comment=ai_comment, comparison=comparison, error=error), status)
+    if trip is not None:
+        response.headers['Server-Timing'] = telemetry.server_timing(trip)
+    return response
+
+def sse_event(event, data):
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/stream', methods=['GET'])
+def stream():
+    """
+    Stream a trip as Server-Sent Events.
+    
+    Each stop is sent as a "stop" event as soon as its geocode and forecast have
+    resolved. The AI comment follows as "comment_delta" events while the model
+    writes it, then a "comment" event with the full text and a final "done".
+    Failures are sent as an "error" event.
+    """
+    try:
+        origin = request.args['origin']
+        destination = request.args['destination']
+        start_time = datetime.strptime(request.args['starttime'], '%Y-%m-%dT%H:%M')
+        sampling = read_sampling(request.args)
+        use_llm = 'ai_comment' in request.args
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': f'Invalid trip request: {e}'}), 400
+    
+    def generate():
+        stops = {}
+        with telemetry.trace('stream'):
+            try:
+                for index, stop in iter_weather_along_route(origin, destination, start_time, **sampling):
+                    stops[index] = stop
+                    yield sse_event('stop', {'index': index, 'stop': stop.to_dict()})
+                weather_data = [stops[index] for index in sorted(stops)]
+                if weather_data:
+                    chunks = []
+                    for text in stream_trip_comment(weather_data, use_llm=use_llm):
+                        chunks.append(text)
+                        yield sse_event('comment_delta', {'text': text})
+                    yield sse_event('comment', {'ai_comment': ''.join(chunks)})
+                yield sse_event('done', {'stops': len(weather_data)})
+            except APIError as e:
+                app.logger.error(f"Streaming trip failed: {e}")
+                yield sse_event('error', {'error': TRIP_ERROR})
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue a trip computation and return its job id; poll /jobs/<job_id> for the result."""
+    data = request.get_json(silent=True) or request.form
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Invalid trip request: expected a JSON object or form fields'}), 400
+    try:
+        origin = data['origin'].strip()
+        destination = data['destination'].strip()
+        start_time = datetime.strptime(data['starttime'], '%Y-%m-%dT%H:%M')
+        sampling = read_sampling(data)
+        use_llm = str(data.get('ai_comment', '')).lower() in ('1', 'true', 'on', 'yes')
+    except (KeyError, ValueError, TypeError, AttributeError) as e:
+        return jsonify({'error': f'Invalid trip request: {e}'}), 400
+    
+    key = (origin.lower(), destination.lower(), start_time.isoformat(), *sampling.values(), use_llm)
+    job = job_manager.submit(key, build_trip_report, origin, destination, start_time, use_llm=use_llm, **sampling)
+    response = jsonify(job.to_dict())
+    response.headers['Location'] = url_for('get_job', job_id=job.id)
+    return response, 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Return the status of a job, including its result once it is done."""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    data = job.to_dict()
+    if 'error' in data:
+        # The job manager has logged the failure; its text can include request URLs and API keys
+        data['error'] = TRIP_ERROR
+    return jsonify(data)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics: stage and outbound request latencies, outbound calls and bytes, cache counters."""
+    return Response(telemetry.render_metrics(), mimetype='text/plain; version=0.0.4')
+
+if PROFILING_ENABLED:
+    @app.route('/debug/profile', methods=['GET'])
+    def debug_profile():
+        """Sample all threads for ?seconds= (default 5, max 60) and return collapsed stacks."""
+        seconds = min(float(request.args.get('seconds', 5)), 60.0)
+        profiler = telemetry.profile(seconds, interval=float(request.args.get('interval', 0.005)))
+        return Response(profiler.collapsed() + '\n', mimetype='text/plain')
     
-    return render_template('index.html', weather_data=weather_data, ai_comment=ai_comment)
+    @app.route('/debug/traces', methods=['GET'])
+    def debug_traces():
+        """Span trees of the most recent requests, newest first."""
+        return jsonify([trace.to_dict() for trace in reversed(telemetry.recent_traces)])
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
+    # Development server only; use serve.py in production
+    start_corridor_warmer()
+    app.run(host='0.0.0.0', port=5001, debug=os.getenv('FLASK_DEBUG') == '1')
\ No newline at end of file
@@ -0,0 +1,264 @@
+import argparse
+import csv
+import json
+import sys
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional, Dict, List, Tuple, Any, Iterable, Iterator, TextIO
+
+from models import RoutePoint, Stop
+from tripweather import (
+    build_stop,
+    forecast_at,
+    forecast_key,
+    geocode_key,
+    get_city_name,
+    get_forecast_days,
+    plan_forecast_requests,
+    plan_route_points,
+    record_stop_error
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_WORKERS = 16
+
+@dataclass
+class Trip:
+    """One origin/destination pair of a batch."""
+    id: str
+    origin: str
+    destination: str
+    start_time: Optional[datetime]
+    stops: Optional[int] = None
+    spacing_km: Optional[float] = None
+    spacing_minutes: Optional[float] = None
+    error: Optional[str] = None
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any], index: int) -> "Trip":
+        """
+        Build a trip from a CSV row or JSON object.
+
+        A row with missing or malformed fields becomes a trip with ``error`` set, so
+        it is reported in the results instead of stopping the batch.
+        """
+        def number(name, cast):
+            value = record.get(name)
+            return cast(value) if value not in (None, "") else None
+
+        trip_id = str(record.get("id") or index)
+        try:
+            return cls(
+                id=trip_id,
+                origin=record["origin"],
+                destination=record["destination"],
+                start_time=datetime.fromisoformat(record["start_time"]),
+                stops=number("stops", int),
+                spacing_km=number("spacing_km", float),
+                spacing_minutes=number("spacing_minutes", float)
+            )
+        except KeyError as e:
+            error = f"Missing field {e}"
+        except (TypeError, ValueError) as e:
+            error = f"Invalid field: {e}"
+        return cls(trip_id, str(record.get("origin") or ""), str(record.get("destination") or ""),
+                   None, error=error)
+
+@dataclass
+class _PendingTrip:
+    """A routed trip waiting for its shared lookups."""
+    trip: Trip
+    points: List[RoutePoint]
+    lookups: List[Tuple[Future, Future]] = field(default_factory=list)
+
+    def done(self) -> bool:
+        return all(city.done() and forecast.done() for city, forecast in self.lookups)
+
+def read_trips(path: str) -> List[Trip]:
+    """
+    Read trips from a CSV file with a header row, or from a JSONL file.
+
+    Both formats use the fields origin, destination and start_time (ISO 8601), plus
+    optional id, stops, spacing_km and spacing_minutes. Rows that cannot be read are
+    returned as trips with ``error`` set (see ``Trip.from_record``).
+    """
+    with open(path, newline="") as file:
+        if path.endswith(".jsonl"):
+            records = [_json_record(line) for line in file if line.strip()]
+        else:
+            records = list(csv.DictReader(file))
+    return [Trip.from_record(record, index) for index, record in enumerate(records)]
+
+def _json_record(line: str) -> Dict[str, Any]:
+    """Parse one JSONL line; a malformed line becomes a record without trip fields."""
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return {}
+    return record if isinstance(record, dict) else {}
+
+def run_batch(trips: Iterable[Trip], max_workers: int = DEFAULT_BATCH_WORKERS,
+              stats: Optional[Dict[str, int]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Compute weather along many trips, yielding each result as soon as it is complete.
+
+    All routes are requested through one thread pool. Each sample point is then mapped
+    to its geocode cell and forecast (cell, date) key, and every distinct key across the
+    whole batch is looked up exactly once through the same pool, so throughput is set by
+    ``max_workers`` and the providers' limits rather than by the number of trips. The
+    forecast days a routed trip still needs are requested with one call per grid cell.
+
+    ``max_workers`` bounds route and geocode calls. Forecast calls share the same pool
+    but also hold a weather provider's slot, so at most ``PROVIDER_CONCURRENCY`` of
+    them (4 per provider) are in flight whatever ``max_workers`` is.
+
+    Args:
+        trips: Trips to compute
+        max_workers: Concurrent route and geocode calls of the batch; at least 1
+        stats: Optional dictionary that receives trip and lookup counters; forecast_lookups
+            counts distinct (cell, date) keys and forecast_requests the calls made for them
+
+    Yields:
+        One result dictionary per trip, in completion order, with either "stops" or "error"
+    """
+    counters = stats if stats is not None else {}
+    counters.update({"trips": 0, "failed_trips": 0, "points": 0, "geocode_lookups": 0,
+                     "forecast_lookups": 0, "forecast_requests": 0})
+    geocodes: Dict[Tuple[float, float], Future] = {}
+    forecasts: Dict[Tuple[float, float, str], Future] = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        routes = {}
+        for trip in trips:
+            if trip.error is not None:
+                counters["trips"] += 1
+                counters["failed_trips"] += 1
+                yield _result(trip, error=trip.error)
+                continue
+            routes[executor.submit(
+                plan_route_points, trip.origin, trip.destination, trip.start_time,
+                trip.stops, trip.spacing_km, trip.spacing_minutes
+            )] = trip
+        waiting: List[_PendingTrip] = []
+
+        while routes or waiting:
+            outstanding = set(routes)
+            for pending in waiting:
+                for city, forecast in pending.lookups:
+                    outstanding.update((city, forecast))
+            done, _ = wait(outstanding, return_when=FIRST_COMPLETED)
+
+            for future in done & set(routes):
+                trip = routes.pop(future)
+                counters["trips"] += 1
+                try:
+                    points = future.result()
+                except Exception as e:
+                    counters["failed_trips"] += 1
+                    yield _result(trip, error=str(e))
+                    continue
+                pending = _PendingTrip(trip, points)
+                for cell, dates in plan_forecast_requests(points).items():
+                    missing = [date_str for date_str in dates if (*cell, date_str) not in forecasts]
+                    if missing:
+                        counters["forecast_requests"] += 1
+                        days = executor.submit(get_forecast_days, cell[0], cell[1], missing)
+                        forecasts.update(((*cell, date_str), days) for date_str in missing)
+                for lat, lng, arrival_time in points:
+                    counters["points"] += 1
+                    pending.lookups.append((
+                        _shared_lookup(executor, geocodes, geocode_key(lat, lng), get_city_name, lat, lng),
+                        forecasts[forecast_key(lat, lng, arrival_time.strftime("%Y-%m-%d"))]
+                    ))
+                waiting.append(pending)
+
+            for pending in [pending for pending in waiting if pending.done()]:
+                waiting.remove(pending)
+                yield _result(pending.trip, stops=_assemble_stops(pending))
+
+    counters["geocode_lookups"] = len(geocodes)
+    counters["forecast_lookups"] = len(forecasts)
+
+def _shared_lookup(executor: ThreadPoolExecutor, futures: Dict[Any, Future], key: Any, func, *args) -> Future:
+    """
+    Submit a lookup once per key and hand every later caller the same future.
+
+    Geocodes are not capped by the interactive ``PROVIDER_CONCURRENCY`` slots here,
+    so ``max_workers`` sets the batch's concurrency for them too; the provider's
+    rate limiter still paces the requests.
+    """
+    future = futures.get(key)
+    if future is None:
+        future = executor.submit(func, *args)
+        futures[key] = future
+    return future
+
+def _assemble_stops(pending: _PendingTrip) -> List[Stop]:
+    """Build the stops of a trip whose lookups have all finished."""
+    stops = []
+    for (lat, lng, arrival_time), (city_future, forecast_future) in zip(pending.points, pending.lookups):
+        errors = []
+        city = "Unknown Location"
+        weather = None
+        try:
+            city = city_future.result()
+        except Exception as e:
+            record_stop_error(errors, e)
+        try:
+            weather = forecast_at(forecast_future.result(), arrival_time)
+        except Exception as e:
+            record_stop_error(errors, e)
+        if weather or errors:
+            stops.append(build_stop(arrival_time, city, weather, "; ".join(errors) or None))
+    return stops
+
+def _result(trip: Trip, stops: Optional[List[Stop]] = None, error: Optional[str] = None) -> Dict[str, Any]:
+    """Serialise one trip result."""
+    result = {
+        "id": trip.id,
+        "origin": trip.origin,
+        "destination": trip.destination,
+        "start_time": trip.start_time.isoformat() if trip.start_time else None
+    }
+    if error is not None:
+        result["error"] = error
+    else:
+        result["stops"] = [stop.to_dict() for stop in stops]
+    return result
+
+def write_jsonl(results: Iterable[Dict[str, Any]], output: TextIO) -> None:
+    """Write results as JSON lines, flushing after each trip."""
+    for result in results:
+        output.write(json.dumps(result, ensure_ascii=False) + "\n")
+        output.flush()
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point: python batch.py trips.csv [-o results.jsonl]."""
+    parser = argparse.ArgumentParser(description="Compute weather along many trips.")
+    parser.add_argument("trips", help="CSV or JSONL file with origin, destination and start_time")
+    parser.add_argument("-o", "--output", help="JSONL output file (default: stdout)")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_BATCH_WORKERS,
+                        help="Maximum number of concurrent route and geocode calls; forecast "
+                             "calls are also limited to 4 per weather provider, and all requests "
+                             "are paced by TRIPWEATHER_RATE_LIMITS")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    trips = read_trips(args.trips)
+    stats: Dict[str, int] = {}
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        write_jsonl(run_batch(trips, max_workers=args.workers, stats=stats), output)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    logger.info(f"Batch finished: {stats}")
+    return 1 if stats.get("failed_trips") else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
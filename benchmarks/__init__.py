@@ -0,0 +1 @@
+"""Offline benchmarks against recorded provider responses; run with python -m benchmarks.run."""
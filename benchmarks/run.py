@@ -0,0 +1,311 @@
+"""
+Offline performance benchmarks for the trip pipeline.
+
+All providers are replaced by the local stub server replaying recorded responses with
+injected latency, so the numbers are repeatable and cost nothing. The stub runs in a
+child process so its CPU time is not counted. Measured:
+
+- trip: end-to-end latency percentiles and CPU time of ``find_weather_along_route``,
+  and outbound calls per trip by endpoint
+- load: throughput and latency of concurrent POST / requests against ``app.py``
+  served by waitress
+- long_route: CPU time to decode and sample a long, dense route
+
+Usage:
+    python -m benchmarks.run -o results.json
+    python -m benchmarks.run --baseline results.json   # exit 1 on regressions
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import logging
+import platform
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List, Tuple, Any
+
+import numpy as np
+import requests
+
+import tripweather
+from benchmarks.stub_server import StubClient, load_fixture, start_process
+from route_geometry import decode_polyline, sample_route
+from singleflight import get_singleflight_stats
+from transport import configure_transport, get_transport_stats
+
+logger = logging.getLogger(__name__)
+
+ORIGIN = "Sundsvall, Sweden"
+DESTINATION = "Stockholm, Sweden"
+
+# (metric path, True if higher is better) compared against a baseline
+COMPARED_METRICS = [
+    ("trip.latency_ms.p50", False),
+    ("trip.latency_ms.p90", False),
+    ("trip.cpu_ms_per_trip", False),
+    ("trip.calls_per_trip.total", False),
+    ("load.requests_per_second", True),
+    ("load.latency_ms.p90", False),
+    ("long_route.cpu_ms", False),
+]
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p90/p99, mean and max of latencies given in seconds, in milliseconds."""
+    if not samples:
+        return {}
+    values = np.asarray(samples) * 1000
+    return {
+        "p50": round(float(np.percentile(values, 50)), 2),
+        "p90": round(float(np.percentile(values, 90)), 2),
+        "p99": round(float(np.percentile(values, 99)), 2),
+        "mean": round(float(values.mean()), 2),
+        "max": round(float(values.max()), 2),
+    }
+
+def use_stub(stub: StubClient) -> None:
+    """Point every provider at the stub server and install placeholder API keys."""
+    for provider in ("google", "weatherapi", "metno"):
+        configure_transport(provider, base_url=stub.base_url(provider))
+    os.environ["OPENAI_BASE_URL"] = stub.base_url("openai")
+    tripweather._openai_client = None
+    # Only the stub sees this User-Agent, so keep met.no first as in a configured deployment
+    tripweather.YR_USER_AGENT = tripweather.YR_USER_AGENT or "tripweather-benchmark/1.0"
+    if "TRIPWEATHER_WEATHER_PROVIDERS" not in os.environ:
+        tripweather.WEATHER_PROVIDERS = ["metno", "weatherapi"]
+
+    config = tripweather.Config.__new__(tripweather.Config)
+    config.GOOGLE_API_KEY = config.WEATHERAPI_API_KEY = config.OPENAI_API_KEY = "benchmark"
+    config._initialized = True
+
+def reset_caches() -> None:
+    """Empty every cache so the next trip starts cold."""
+    for cache in (tripweather.route_cache, tripweather.geocode_cache,
+                  tripweather.forecast_cache, tripweather.comment_cache):
+        cache.clear()
+    tripweather._weather_router = None
+
+def departure() -> datetime:
+    """Tomorrow at 08:00, inside the replayed forecast range."""
+    return (datetime.now() + timedelta(days=1)).replace(hour=8, minute=0, second=0, microsecond=0)
+
+def bench_trips(stub: StubClient, trips: int, warm: bool = False) -> Dict[str, Any]:
+    """
+    Run ``find_weather_along_route`` sequentially.
+
+    Args:
+        stub: Running stub server
+        trips: Number of trips
+        warm: Keep the caches between trips instead of starting every trip cold
+    """
+    reset_caches()
+    stub.reset_counts()
+    latencies = []
+    cpu_started = time.process_time()
+    for _ in range(trips):
+        if not warm:
+            reset_caches()
+        started = time.perf_counter()
+        tripweather.find_weather_along_route(ORIGIN, DESTINATION, departure())
+        latencies.append(time.perf_counter() - started)
+    cpu = time.process_time() - cpu_started
+
+    stats = stub.stats()
+    calls = {endpoint: round(count / trips, 2) for endpoint, count in sorted(stats["calls"].items())}
+    calls["total"] = round(sum(stats["calls"].values()) / trips, 2)
+    return {
+        "trips": trips,
+        "warm": warm,
+        "latency_ms": percentiles(latencies),
+        "cpu_ms_per_trip": round(cpu / trips * 1000, 2),
+        "calls_per_trip": calls,
+        "bytes_per_trip": round(sum(stats["bytes"].values()) / trips),
+    }
+
+def bench_load(stub: StubClient, total: int, concurrency: int, threads: int = 32) -> Dict[str, Any]:
+    """
+    Send ``total`` trip requests to app.py, ``concurrency`` at a time.
+
+    The app runs under waitress on a free local port, as in production (serve.py).
+    """
+    from waitress.server import create_server
+    from app import app
+
+    reset_caches()
+    stub.reset_counts()
+    server = create_server(app, host="127.0.0.1", port=0, threads=threads)
+    thread = threading.Thread(target=server.run, name="waitress", daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.effective_port}/"
+    form = {
+        "origin": ORIGIN,
+        "destination": DESTINATION,
+        "starttime": departure().strftime("%Y-%m-%dT%H:%M"),
+    }
+    local = threading.local()
+
+    def request_once(_: int) -> Tuple[float, bool]:
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            response = session.post(url, data=form, timeout=60)
+            ok = response.status_code == 200
+        except requests.exceptions.RequestException:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(request_once, range(total)))
+        elapsed = time.perf_counter() - started
+    finally:
+        server.close()
+
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": sum(1 for _, ok in results if not ok),
+        "requests_per_second": round(total / elapsed, 2),
+        "latency_ms": percentiles([latency for latency, _ in results]),
+        "outbound_calls": dict(sorted(stub.stats()["calls"].items())),
+    }
+
+def long_route(copies: int, density: int) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Build a long, dense route from the recorded one.
+
+    The recorded route is chained ``copies`` times end to end (each copy shifted south)
+    and every segment is split into ``density`` pieces.
+    """
+    route = load_fixture("directions.json")["routes"][0]
+    points = decode_polyline(route["overview_polyline"]["points"])
+    shift = points[-1, 0] - points[0, 0]
+    chained = np.vstack([points + (shift * i, 0.0) for i in range(copies)])
+    positions = np.linspace(0, len(chained) - 1, (len(chained) - 1) * density + 1)
+    dense = np.column_stack([
+        np.interp(positions, np.arange(len(chained)), chained[:, column]) for column in (0, 1)
+    ])
+    steps = route["legs"][0]["steps"] * copies
+    return encode_polyline(dense), steps
+
+def encode_polyline(points: np.ndarray, precision: int = 5) -> str:
+    """Encode (lat, lng) rows as a Google polyline string."""
+    values = np.round(np.asarray(points) * 10 ** precision).astype(np.int64)
+    deltas = np.diff(values, axis=0, prepend=0).ravel()
+    chars = []
+    for value in deltas.tolist():
+        value = ~(value << 1) if value < 0 else value << 1
+        while value >= 0x20:
+            chars.append(chr((0x20 | (value & 0x1f)) + 63))
+            value >>= 5
+        chars.append(chr(value + 63))
+    return "".join(chars)
+
+def bench_long_route(copies: int = 10, density: int = 10, repeat: int = 20) -> Dict[str, Any]:
+    """CPU time to decode and sample a long route, averaged over ``repeat`` runs."""
+    encoded, steps = long_route(copies, density)
+    cpu_started = time.process_time()
+    for _ in range(repeat):
+        waypoints = decode_polyline(encoded)
+        sample_route(waypoints, steps, count=50)
+    cpu = time.process_time() - cpu_started
+    return {
+        "vertices": len(waypoints),
+        "steps": len(steps),
+        "cpu_ms": round(cpu / repeat * 1000, 3),
+    }
+
+def lookup(results: Dict[str, Any], path: str) -> Optional[float]:
+    """Value at a dotted path such as "trip.latency_ms.p50", or None if missing."""
+    value: Any = results
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.2) -> List[str]:
+    """
+    Compare results against a baseline.
+
+    Args:
+        results: Current benchmark results
+        baseline: Earlier results from the same machine and settings
+        tolerance: Allowed relative change in the bad direction, e.g. 0.2 for 20 %
+
+    Returns:
+        One message per metric that regressed beyond the tolerance
+    """
+    regressions = []
+    for path, higher_is_better in COMPARED_METRICS:
+        current, previous = lookup(results, path), lookup(baseline, path)
+        if current is None or not previous:
+            continue
+        change = (current - previous) / previous
+        logger.info(f"{path}: {previous} -> {current} ({change:+.1%})")
+        if (-change if higher_is_better else change) > tolerance:
+            regressions.append(f"{path} regressed from {previous} to {current} ({change:+.1%})")
+    return regressions
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run the selected benchmarks and return their results."""
+    latency = {provider: args.latency for provider in ("google", "weatherapi", "metno")}
+    latency["openai"] = args.llm_latency
+    results: Dict[str, Any] = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "latency_s": args.latency,
+            "llm_latency_s": args.llm_latency,
+            "weather_providers": tripweather.WEATHER_PROVIDERS,
+        }
+    }
+    process, stub = start_process(latency, jitter=args.jitter)
+    try:
+        use_stub(stub)
+        results["trip"] = bench_trips(stub, args.trips)
+        results["trip_warm"] = bench_trips(stub, args.trips, warm=True)
+        if args.requests:
+            results["load"] = bench_load(stub, args.requests, args.concurrency)
+        results["transport"] = get_transport_stats()
+        results["singleflight"] = get_singleflight_stats()
+    finally:
+        process.terminate()
+    results["long_route"] = bench_long_route()
+    return results
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point: python -m benchmarks.run [-o results.json] [--baseline old.json]."""
+    parser = argparse.ArgumentParser(description="Benchmark TripWeather against recorded provider responses.")
+    parser.add_argument("-o", "--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against results saved earlier")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression (default 0.2)")
+    parser.add_argument("--trips", type=int, default=20, help="Sequential trips to time")
+    parser.add_argument("--requests", type=int, default=100, help="Requests for the load test, 0 to skip")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients in the load test")
+    parser.add_argument("--latency", type=float, default=0.05, help="Injected provider latency in seconds")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Injected OpenAI latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Relative latency jitter")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for message in regressions:
+            logger.warning(message)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""
+Local stand-in for the Directions, Geocoding, weatherapi.com, met.no and OpenAI APIs.
+
+Responses are replayed from the recorded fixtures in ``benchmarks/fixtures`` with
+their dates moved to the requested day, after an injected per-provider latency.
+Every request is counted per endpoint so benchmarks can report outbound calls;
+``GET /_stats`` returns the counters and ``POST /_reset`` clears them.
+
+Run standalone with ``python -m benchmarks.stub_server --port 8099 --latency 0.05``,
+or in a child process with ``start_process`` so its CPU time is not charged to the
+code being measured.
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import threading
+import time
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional, Dict, Any, Tuple
+from urllib.parse import parse_qs, urlsplit
+from urllib.request import Request, urlopen
+
+logger = logging.getLogger(__name__)
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+# Path prefix of every provider on the stub; see StubServer.base_url
+PROVIDERS = ("google", "weatherapi", "metno", "openai")
+
+# Date the fixtures were recorded on, replaced by the requested day when replaying
+RECORDED_DATE = "2024-01-15"
+
+def load_fixture(name: str) -> Dict[str, Any]:
+    """Load one recorded response from the fixtures directory."""
+    with open(FIXTURES_DIR / name, encoding="utf-8") as file:
+        return json.load(file)
+
+class StubServer:
+    """
+    Threaded HTTP server replaying recorded provider responses.
+
+    Args:
+        latency: Seconds to wait before answering, per provider; missing providers
+            answer immediately
+        jitter: Relative random variation of the latency, e.g. 0.2 for ±20 %
+        host: Interface to bind
+        port: Port to bind; 0 lets the OS choose
+    """
+
+    def __init__(self, latency: Optional[Dict[str, float]] = None, jitter: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency or {}
+        self.jitter = jitter
+        self.calls: Counter = Counter()
+        self.bytes_sent: Counter = Counter()
+        self._lock = threading.Lock()
+        self._directions = json.dumps(load_fixture("directions.json"))
+        geocode = load_fixture("geocode.json")
+        self._towns = geocode["towns"]
+        self._geocode = json.dumps(geocode["response"], ensure_ascii=False)
+        self._weatherapi = json.dumps(load_fixture("weatherapi_forecast.json"))
+        self._metno = load_fixture("metno_compact.json")
+        self._openai = json.dumps(load_fixture("openai_chat.json"))
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def base_url(self, provider: str) -> str:
+        """URL to configure as the provider's base_url."""
+        return f"{self.url}/{provider}"
+
+    def start(self) -> "StubServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_counts(self) -> None:
+        with self._lock:
+            self.calls.clear()
+            self.bytes_sent.clear()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {"calls": dict(self.calls), "bytes": dict(self.bytes_sent)}
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def respond(self, method: str, path: str, query: Dict[str, str]) -> Tuple[str, int, str]:
+        """
+        Build the replayed response for a request.
+
+        Returns:
+            (endpoint name used for counting, HTTP status, JSON body)
+        """
+        if path == "/_stats":
+            return "_stats", 200, json.dumps(self.stats())
+        if path == "/_reset":
+            self.reset_counts()
+            return "_reset", 200, "{}"
+
+        provider = path.strip("/").split("/", 1)[0]
+        if provider in self.latency:
+            delay = self.latency[provider]
+            time.sleep(max(0.0, delay * (1 + random.uniform(-self.jitter, self.jitter))))
+
+        if path.endswith("/maps/api/directions/json"):
+            return "google.directions", 200, self._directions
+        if path.endswith("/maps/api/geocode/json"):
+            lat, lng = (float(value) for value in query.get("latlng", "0,0").split(","))
+            return "google.geocode", 200, self._geocode.replace("{town}", self._nearest_town(lat, lng))
+        if path.endswith("/v1/forecast.json"):
+            return "weatherapi.forecast", 200, self._weatherapi_days(query)
+        if path.endswith("/locationforecast/2.0/compact"):
+            return "metno.locationforecast", 200, self._shifted_metno()
+        if method == "POST" and path.endswith("/chat/completions"):
+            return "openai.chat", 200, self._openai
+        return "unknown", 404, json.dumps({"error": f"No fixture for {path}"})
+
+    def _weatherapi_days(self, query: Dict[str, str]) -> str:
+        """The recorded day moved to ``dt``, or repeated for ``days`` days from today."""
+        if "dt" in query or "days" not in query:
+            return self._weatherapi.replace(RECORDED_DATE, query.get("dt", RECORDED_DATE))
+        data = json.loads(self._weatherapi)
+        recorded = data["forecast"]["forecastday"][0]
+        today = datetime.now().date()
+        data["forecast"]["forecastday"] = [
+            json.loads(json.dumps(recorded).replace(RECORDED_DATE, (today + timedelta(days=offset)).isoformat()))
+            for offset in range(int(query["days"]))
+        ]
+        return json.dumps(data)
+
+    def _nearest_town(self, lat: float, lng: float) -> str:
+        return min(self._towns, key=lambda town: (town[0] - lat) ** 2 + (town[1] - lng) ** 2)[2]
+
+    def _shifted_metno(self) -> str:
+        """The recorded timeseries moved so that it starts at today's UTC midnight."""
+        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+        shift = today - datetime.strptime(RECORDED_DATE, "%Y-%m-%d")
+        data = json.loads(json.dumps(self._metno))
+        for step in data["properties"]["timeseries"]:
+            recorded = datetime.strptime(step["time"], "%Y-%m-%dT%H:%M:%SZ")
+            step["time"] = (recorded + shift).strftime("%Y-%m-%dT%H:%M:%SZ")
+        return json.dumps(data)
+
+    def _count(self, endpoint: str, size: int) -> None:
+        with self._lock:
+            self.calls[endpoint] += 1
+            self.bytes_sent[endpoint] += size
+
+    def _handler_class(self) -> type:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                self._reply("GET")
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                self.rfile.read(length)
+                self._reply("POST")
+
+            def _reply(self, method: str) -> None:
+                parts = urlsplit(self.path)
+                query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+                endpoint, status, body = stub.respond(method, parts.path, query)
+                payload = body.encode("utf-8")
+                if not endpoint.startswith("_"):
+                    stub._count(endpoint, len(payload))
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                if endpoint.startswith("metno"):
+                    expires = datetime.now(timezone.utc) + timedelta(minutes=30)
+                    self.send_header("Expires", expires.strftime("%a, %d %b %Y %H:%M:%S GMT"))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                logger.debug(format % args)
+
+        return Handler
+
+class StubClient:
+    """Handle on a stub server running elsewhere, e.g. in a child process."""
+
+    def __init__(self, url: str):
+        self.url = url
+
+    def base_url(self, provider: str) -> str:
+        """URL to configure as the provider's base_url."""
+        return f"{self.url}/{provider}"
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with urlopen(f"{self.url}/_stats") as response:
+            return json.load(response)
+
+    def reset_counts(self) -> None:
+        urlopen(Request(f"{self.url}/_reset", data=b"", method="POST")).close()
+
+def _serve(latency: Dict[str, float], jitter: float, port: int, ready: Any) -> None:
+    stub = StubServer(latency, jitter, port=port)
+    ready.put(stub.url)
+    stub._server.serve_forever()
+
+def start_process(latency: Optional[Dict[str, float]] = None,
+                  jitter: float = 0.0) -> Tuple[multiprocessing.Process, StubClient]:
+    """
+    Run a stub server in a child process.
+
+    Returns:
+        The process (terminate it when done) and a client for the server
+    """
+    ready: Any = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(latency or {}, jitter, 0, ready), daemon=True)
+    process.start()
+    return process, StubClient(ready.get(timeout=10))
+
+def main() -> None:
+    """Command line entry point: serve the fixtures until interrupted."""
+    parser = argparse.ArgumentParser(description="Replay recorded provider responses.")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0, help="Injected latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Relative latency jitter")
+    args = parser.parse_args()
+    stub = StubServer({provider: args.latency for provider in PROVIDERS}, args.jitter, port=args.port)
+    print(f"Serving recorded responses on {stub.url}; providers under /" + ", /".join(PROVIDERS))
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
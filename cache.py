@@ -0,0 +1,279 @@
+import copy
+import json
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Optional, Dict, Tuple, Any, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+def quantize_coordinate(lat: float, lng: float, precision: int = 2) -> Tuple[float, float]:
+    """
+    Snap a coordinate to a regular lat/lng grid.
+
+    Args:
+        lat: Latitude coordinate
+        lng: Longitude coordinate
+        precision: Number of decimals to keep; 2 gives cells of roughly 1 km
+
+    Returns:
+        The (latitude, longitude) of the grid cell containing the coordinate
+    """
+    return round(lat, precision), round(lng, precision)
+
+class SQLiteStore:
+    """
+    Persistent key/value store backing a TTLCache.
+
+    Values are stored as JSON together with their expiry time, so the cache survives
+    restarts. The store is bounded by ``maxsize`` rows; the least recently written
+    rows are dropped first. ``encode``/``decode`` convert values that are not plain
+    JSON types on the way in and out.
+    """
+
+    def __init__(self, path: str, table: str, maxsize: int = 100000,
+                 encode: Callable[[Any], Any] = lambda value: value,
+                 decode: Callable[[Any], Any] = lambda value: value):
+        self.path = path
+        self.table = table
+        self.maxsize = maxsize
+        self.encode = encode
+        self.decode = decode
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, written_at REAL NOT NULL)"
+            )
+
+    def get(self, key: Hashable) -> Tuple[Any, float]:
+        """Return (value, expires_at), or (_MISSING, 0.0) if the key is not stored."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (_encode_key(key),)
+            ).fetchone()
+        if row is None:
+            return _MISSING, 0.0
+        return self.decode(json.loads(row[0])), row[1]
+
+    def set(self, key: Hashable, value: Any, expires_at: float) -> None:
+        """Store a value with its absolute expiry time."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, written_at) VALUES (?, ?, ?, ?)",
+                (_encode_key(key), json.dumps(self.encode(value)), expires_at, time.time())
+            )
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY written_at DESC, rowid DESC LIMIT -1 OFFSET ?)",
+                (self.maxsize,)
+            )
+
+    def delete(self, key: Hashable) -> None:
+        """Remove a key from the store."""
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (_encode_key(key),))
+
+    def clear(self) -> None:
+        """Remove every row from the store."""
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+def _encode_key(key: Hashable) -> str:
+    """Encode a (possibly tuple) cache key as a stable string."""
+    return json.dumps(key, default=str)
+
+def _fresh_error(error: Exception) -> Exception:
+    """A copy of an exception with the same type, message and attributes but no traceback."""
+    try:
+        return copy.copy(error)
+    except TypeError:
+        # The constructor does not accept the exception's own args; reuse it without its traceback
+        return error.with_traceback(None)
+
+class TTLCache:
+    """
+    Thread-safe in-memory cache with per-entry TTL and LRU eviction.
+
+    An optional SQLiteStore acts as a second tier: memory misses fall through to the
+    store, and every write goes to both. With ``stale_ttl`` expired entries are kept
+    that much longer; ``get`` treats them as misses, but ``get_stale`` still returns
+    them as a fallback when the upstream API cannot be reached. Failed lookups can be
+    remembered briefly with ``set_failure`` (negative caching); they are kept in
+    memory only, apart from the values.
+    """
+
+    def __init__(self, name: str, maxsize: int = 10000, ttl: float = 3600,
+                 store: Optional[SQLiteStore] = None, stale_ttl: float = 0.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.store = store
+        self._data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._failures: "OrderedDict[Hashable, Tuple[Exception, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_hits = 0
+        self.negative_hits = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Look up a key.
+
+        Args:
+            key: Cache key
+            default: Value returned on a miss
+
+        Returns:
+            The cached value, or ``default`` if it is missing or expired
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                if expires_at + self.stale_ttl <= now:
+                    del self._data[key]
+                    self.expirations += 1
+
+        if self.store is not None:
+            value, expires_at = self.store.get(key)
+            if value is not _MISSING and expires_at > now:
+                with self._lock:
+                    self._insert(key, value, expires_at)
+                    self.hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def get_stale(self, key: Hashable, default: Any = None, max_age: Optional[float] = None) -> Any:
+        """
+        Look up a key, accepting an entry that expired less than ``stale_ttl`` ago.
+
+        Args:
+            key: Cache key
+            default: Value returned if there is no usable entry
+            max_age: Accept only entries that expired less than this many seconds ago;
+                capped at ``stale_ttl``
+
+        Returns:
+            The cached value, fresh or stale, or ``default``
+        """
+        grace = self.stale_ttl if max_age is None else min(max_age, self.stale_ttl)
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is None and self.store is not None:
+            value, expires_at = self.store.get(key)
+            if value is not _MISSING:
+                entry = (value, expires_at)
+        if entry is None or entry[1] + grace <= now:
+            return default
+        with self._lock:
+            self.stale_hits += 1
+        return entry[0]
+
+    def get_failure(self, key: Hashable) -> Optional[Exception]:
+        """
+        Return the error of a recent failed lookup of the key, if one is remembered.
+
+        Each call returns a new exception built from the stored one, so raising it
+        does not add to the traceback and context kept in the cache.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._failures.get(key)
+            if entry is None:
+                return None
+            error, expires_at = entry
+            if expires_at <= now:
+                del self._failures[key]
+                return None
+            self.negative_hits += 1
+        return _fresh_error(error)
+
+    def set_failure(self, key: Hashable, error: Exception, ttl: float) -> None:
+        """
+        Remember that looking up a key failed.
+
+        Args:
+            key: Cache key
+            error: Error to raise again for lookups within ``ttl``
+            ttl: Seconds to remember the failure
+        """
+        with self._lock:
+            self._failures[key] = (error, time.time() + ttl)
+            self._failures.move_to_end(key)
+            while len(self._failures) > self.maxsize:
+                self._failures.popitem(last=False)
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store a value.
+
+        Args:
+            key: Cache key
+            value: Value to cache; must be JSON serialisable when a store is configured
+            ttl: Optional TTL in seconds overriding the cache default
+        """
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._insert(key, value, expires_at)
+            self._failures.pop(key, None)
+        if self.store is not None:
+            try:
+                self.store.set(key, value, expires_at)
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                logger.error(f"Error writing {self.name} cache entry to disk: {e}")
+
+    def clear(self) -> None:
+        """Drop all entries and reset the counters."""
+        with self._lock:
+            self._data.clear()
+            self._failures.clear()
+            self.hits = self.misses = self.evictions = self.expirations = 0
+            self.stale_hits = self.negative_hits = 0
+        if self.store is not None:
+            self.store.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit, miss and eviction counters together with the hit rate."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "stale_hits": self.stale_hits,
+                "negative_hits": self.negative_hits,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def _insert(self, key: Hashable, value: Any, expires_at: float) -> None:
+        """Insert under the lock, evicting least recently used entries beyond maxsize."""
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
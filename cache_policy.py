@@ -0,0 +1,148 @@
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, Executor
+from typing import Optional, Dict, Tuple, Any, Callable, Hashable
+
+from cache import TTLCache
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Shared by every CachedLookup; refreshes are short provider calls
+_refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+
+class CachedLookup:
+    """
+    Stale-while-revalidate and negative caching on top of a TTLCache.
+
+    ``get`` answers from the cache when it can:
+
+    - a fresh entry is returned as is;
+    - an entry that expired less than ``serve_stale_for`` seconds ago is returned
+      immediately, and the key is refreshed in the background;
+    - otherwise the value is fetched; a failure is remembered for ``negative_ttl``
+      seconds, during which lookups of the key fail at once instead of calling the
+      provider again, and an older entry within the cache's ``stale_ttl`` is served
+      instead of the error when there is one.
+
+    Concurrent misses of the same key share one fetch (see SingleFlight), so a burst
+    of identical requests makes one provider call.
+
+    Args:
+        cache: Cache holding the values; its ``stale_ttl`` bounds what can be served stale
+        serve_stale_for: Seconds after expiry an entry is still served while it is refreshed
+        negative_ttl: Seconds a failed lookup is remembered
+        errors: Exception types that count as a failed lookup
+        executor: Runs background refreshes; defaults to a small shared pool
+    """
+
+    def __init__(self, cache: TTLCache, serve_stale_for: float, negative_ttl: float,
+                 errors: Tuple[type, ...] = (Exception,), executor: Optional[Executor] = None):
+        self.cache = cache
+        self.serve_stale_for = serve_stale_for
+        self.negative_ttl = negative_ttl
+        self.errors = errors
+        self.executor = executor or _refresh_executor
+        self._lock = threading.Lock()
+        self._refreshing: set = set()
+        self.flight = SingleFlight(cache.name)
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def get(self, key: Hashable, fetch: Callable[[], Any]) -> Tuple[Any, str]:
+        """
+        Look up a key, fetching it on a miss.
+
+        Args:
+            key: Cache key
+            fetch: Fetches the value to cache for the key
+
+        Returns:
+            The value and where it came from: "hit", "stale" (being refreshed),
+            "fetched", "shared" (fetched by a concurrent identical lookup) or
+            "fallback" (stale entry served because the fetch failed)
+
+        Raises:
+            Exception: The fetch error, or the remembered one during ``negative_ttl``,
+                if no stale entry can be served instead
+        """
+        value = self.cache.get(key)
+        if value is not None:
+            return value, "hit"
+        value = self.cache.get_stale(key, max_age=self.serve_stale_for)
+        if value is not None:
+            self.refresh_in_background(key, lambda: self.cache.set(key, fetch()))
+            return value, "stale"
+
+        error = self.cache.get_failure(key)
+        if error is None:
+            try:
+                value, shared = self.flight.do(key, self._fetch, key, fetch)
+            except self.errors as e:
+                error = e
+            else:
+                return value, "shared" if shared else "fetched"
+        return self.fallback(key, error), "fallback"
+
+    def fallback(self, key: Hashable, error: Exception) -> Any:
+        """Return the stale entry of a key whose lookup failed, or raise the error."""
+        value = self.cache.get_stale(key)
+        if value is None:
+            raise error
+        logger.warning(f"Serving expired {self.cache.name} entry for {key}: {error}")
+        return value
+
+    def refresh_in_background(self, key: Hashable, refresh: Callable[[], None]) -> bool:
+        """
+        Run ``refresh`` for a key in the background unless it is already running.
+
+        Keys whose last lookup failed within ``negative_ttl`` are not refreshed, so a
+        failing provider is not called again for every request.
+
+        Returns:
+            True if a refresh was started
+        """
+        if self.cache.get_failure(key) is not None:
+            return False
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            self.refreshes += 1
+        try:
+            self.executor.submit(self._refresh, key, refresh)
+        except RuntimeError:
+            # The pool is shut down at interpreter exit
+            with self._lock:
+                self._refreshing.discard(key)
+            return False
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        """Background refreshes started and failed, and fetches shared by concurrent lookups."""
+        flight = self.flight.stats()
+        with self._lock:
+            return {"refreshes": self.refreshes, "refresh_failures": self.refresh_failures,
+                    "refreshing": len(self._refreshing), "fetches": flight["calls"], "shared": flight["shared"]}
+
+    def _fetch(self, key: Hashable, fetch: Callable[[], Any]) -> Any:
+        """Fetch and cache a value, remembering a failure."""
+        try:
+            value = fetch()
+        except self.errors as e:
+            self.cache.set_failure(key, e, self.negative_ttl)
+            raise
+        self.cache.set(key, value)
+        return value
+
+    def _refresh(self, key: Hashable, refresh: Callable[[], None]) -> None:
+        try:
+            refresh()
+        except self.errors as e:
+            logger.warning(f"Background refresh of {self.cache.name} entry {key} failed: {e}")
+            self.cache.set_failure(key, e, self.negative_ttl)
+            with self._lock:
+                self.refresh_failures += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
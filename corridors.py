@@ -0,0 +1,304 @@
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List, Tuple, Any
+
+import numpy as np
+import pytz
+
+import telemetry
+from route_geometry import sample_route
+from tiles import Tile, TileStore
+from tripweather import (
+    FORECAST_TTL,
+    GEOCODE_PRECISION,
+    TRIP_TIMEZONE,
+    APIError,
+    call_limited,
+    corridor_tiles,
+    fetch_forecast_days,
+    forecast_cell,
+    geocode_key,
+    get_city_name,
+    get_route_data_detailed
+)
+
+logger = logging.getLogger(__name__)
+
+# JSON file listing the corridors to keep warm: [{"name", "origin", "destination", "mode"}]
+CORRIDORS_FILE = os.getenv("TRIPWEATHER_CORRIDORS")
+# Seconds between warm-ups, and how long a tile may be served after it was built;
+# by default no longer than a cached forecast
+CORRIDOR_REFRESH = float(os.getenv("TRIPWEATHER_CORRIDOR_REFRESH", "1800"))
+CORRIDOR_TILE_TTL = float(os.getenv("TRIPWEATHER_CORRIDOR_TILE_TTL", str(FORECAST_TTL)))
+# Set to 0 on every instance but one when several serve.py processes share a tile
+# directory, or build the tiles with "python corridors.py --once" from cron instead
+CORRIDOR_WARMER = os.getenv("TRIPWEATHER_CORRIDOR_WARMER", "1") == "1"
+# Days covered by a tile, starting today in TRIPWEATHER_TIMEZONE
+CORRIDOR_DAYS = int(os.getenv("TRIPWEATHER_CORRIDOR_DAYS", "3"))
+# Length of one degree of latitude; a geocode cell is 10**-GEOCODE_PRECISION degrees
+# on each side, so its east-west width shrinks with the cosine of the latitude
+KM_PER_DEGREE = 111.32
+MAX_CELL_SAMPLES = 20000
+DEFAULT_CORRIDOR_WORKERS = 8
+
+@dataclass
+class Corridor:
+    """A route kept warm in the tile store."""
+    name: str
+    origin: str
+    destination: str
+    mode: str = "driving"
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "Corridor":
+        """
+        Build a corridor from one entry of the corridors file.
+
+        Raises:
+            ValueError: If origin or destination is missing or the name is not a plain file name
+        """
+        if not record.get("origin") or not record.get("destination"):
+            raise ValueError(f"Corridor needs an origin and a destination: {record}")
+        name = record.get("name") or f"{record['origin']}-{record['destination']}"
+        name = "".join(c if c.isalnum() or c in "-_" else "_" for c in name)
+        return cls(name, record["origin"], record["destination"], record.get("mode", "driving"))
+
+def load_corridors(path: str) -> List[Corridor]:
+    """
+    Read the corridors file.
+
+    Args:
+        path: JSON file with a list of corridors
+
+    Returns:
+        The corridors
+
+    Raises:
+        ValueError: If the file is not a list of valid corridors
+    """
+    with open(path, encoding="utf-8") as file:
+        records = json.load(file)
+    if not isinstance(records, list):
+        raise ValueError(f"{path} must contain a list of corridors")
+    return [Corridor.from_record(record) for record in records]
+
+def cell_spacing_km(waypoints: np.ndarray) -> float:
+    """
+    Distance between the route points whose grid cells are collected.
+
+    Half the width of the narrowest geocode cell on the route, the one at its highest
+    latitude, so every cell the route crosses gets a point unless the route only clips
+    one of its corners. Forecast cells are larger and are covered as well.
+    """
+    latitude = min(float(np.max(np.abs(waypoints[:, 0]))), 89.0)
+    width = 10 ** -GEOCODE_PRECISION * KM_PER_DEGREE * math.cos(math.radians(latitude))
+    return width / 2
+
+def corridor_cells(corridor: Corridor) -> Tuple[Dict[Tuple[float, float], Tuple[float, float]],
+                                                Dict[Tuple[float, float], Tuple[float, float]]]:
+    """
+    Forecast and geocode grid cells the corridor's route passes through.
+
+    Returns:
+        Forecast cells and geocode cells, each mapped to a coordinate inside the cell
+
+    Raises:
+        APIError: If the route cannot be fetched
+    """
+    waypoints, steps = get_route_data_detailed(corridor.origin, corridor.destination, corridor.mode)
+    forecast_cells: Dict[Tuple[float, float], Tuple[float, float]] = {}
+    geocode_cells: Dict[Tuple[float, float], Tuple[float, float]] = {}
+    if len(waypoints) == 0:
+        return forecast_cells, geocode_cells
+    spacing_km = cell_spacing_km(np.asarray(waypoints, dtype=float).reshape(-1, 2))
+    for lat, lng, _ in sample_route(waypoints, steps, spacing_km=spacing_km, max_samples=MAX_CELL_SAMPLES):
+        forecast_cells.setdefault(forecast_cell(lat, lng), (lat, lng))
+        geocode_cells.setdefault(geocode_key(lat, lng), (lat, lng))
+    return forecast_cells, geocode_cells
+
+def build_tile(corridor: Corridor, days: int = CORRIDOR_DAYS, ttl: float = CORRIDOR_TILE_TTL,
+               max_workers: int = DEFAULT_CORRIDOR_WORKERS, now: Optional[datetime] = None) -> Tile:
+    """
+    Fetch the forecasts and city names along a corridor into a tile.
+
+    Forecasts are fetched from the providers (see ``fetch_forecast_days``), never
+    taken from expired cache entries or fallbacks, so a tile holds nothing older than
+    its build. City names go through the geocode cache, which keeps them for days
+    anyway. A cell whose lookup fails is left out of the tile and served the
+    regular way.
+
+    Args:
+        corridor: Corridor to build
+        days: Number of days covered, starting today
+        ttl: Seconds the tile may be served
+        max_workers: Concurrent lookups
+        now: Current time in trip time, for tests
+
+    Returns:
+        The tile
+
+    Raises:
+        APIError: If the route cannot be fetched
+    """
+    if now is None:
+        now = datetime.now(pytz.timezone(TRIP_TIMEZONE)).replace(tzinfo=None)
+    start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    dates = [(start + timedelta(days=day)).strftime("%Y-%m-%d") for day in range(days)]
+
+    forecast_cells, geocode_cells = corridor_cells(corridor)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        forecasts = {
+            cell: executor.submit(fetch_forecast_days, lat, lng, dates)
+            for cell, (lat, lng) in forecast_cells.items()
+        }
+        cities = {
+            cell: executor.submit(call_limited, "google", get_city_name, lat, lng, False)
+            for cell, (lat, lng) in geocode_cells.items()
+        }
+        forecasts = _results(corridor, forecasts)
+        cities = _results(corridor, cities)
+    return Tile.build(corridor.name, start, days * 24, forecasts, cities, ttl)
+
+def _results(corridor: Corridor, futures: Dict[Any, Any]) -> Dict[Any, Any]:
+    """Results of the lookups that succeeded; failures are logged."""
+    results = {}
+    for cell, future in futures.items():
+        try:
+            results[cell] = future.result()
+        except APIError as e:
+            logger.warning(f"Corridor {corridor.name}: lookup for {cell} failed: {e}")
+    return results
+
+class CorridorWarmer:
+    """
+    Background thread rebuilding the tiles of the configured corridors.
+
+    Every ``interval`` seconds each corridor's route is decoded, the forecasts and
+    city names of every grid cell along it are fetched, and the tile is written to
+    ``store``, where every worker process reading the same directory picks it up.
+
+    Args:
+        corridors: Corridors to keep warm
+        store: Tile store to write to
+        interval: Seconds between warm-ups
+        days: Number of days covered by each tile
+        ttl: Seconds a tile may be served
+    """
+
+    def __init__(self, corridors: List[Corridor], store: TileStore, interval: float = CORRIDOR_REFRESH,
+                 days: int = CORRIDOR_DAYS, ttl: float = CORRIDOR_TILE_TTL):
+        self.corridors = corridors
+        self.store = store
+        self.interval = interval
+        self.days = days
+        self.ttl = ttl
+        self.runs = 0
+        self.failures = 0
+        self.last_run: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> int:
+        """
+        Rebuild every corridor's tile once.
+
+        Returns:
+            Number of corridors whose tile was written
+        """
+        written = 0
+        for corridor in self.corridors:
+            if self._stop.is_set():
+                break
+            started = time.perf_counter()
+            try:
+                with telemetry.span("corridor", corridor=corridor.name):
+                    tile = build_tile(corridor, self.days, self.ttl)
+                    self.store.save(tile)
+            except (APIError, OSError, ValueError) as e:
+                self.failures += 1
+                logger.error(f"Error warming corridor {corridor.name}: {e}")
+                continue
+            written += 1
+            logger.info(f"Corridor {corridor.name}: {len(tile.cells)} forecast cells, {len(tile.cities)} cities "
+                        f"in {time.perf_counter() - started:.1f} s")
+        self.runs += 1
+        self.last_run = time.time()
+        return written
+
+    def start(self) -> None:
+        """Start warming in a daemon thread; the first warm-up runs at once."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="corridor-warmer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop after the corridor being built."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Warm-ups run, corridors that failed, and the tiles served."""
+        return {"runs": self.runs, "failures": self.failures, "last_run": self.last_run,
+                **self.store.stats()}
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Corridor warm-up failed")
+            self._stop.wait(self.interval)
+
+def start_corridor_warmer() -> Optional[CorridorWarmer]:
+    """
+    Start warming the corridors in TRIPWEATHER_CORRIDORS, if set.
+
+    Called once per server process by serve.py (and the development server), not
+    when app.py is imported. TRIPWEATHER_CORRIDOR_WARMER=0 turns it off.
+
+    Returns:
+        The running warmer, or None if no corridors are configured
+    """
+    if not CORRIDORS_FILE or not CORRIDOR_WARMER:
+        return None
+    if not corridor_tiles.directory:
+        logger.error("TRIPWEATHER_CORRIDORS is set but TRIPWEATHER_TILE_DIR is empty; not warming corridors")
+        return None
+    warmer = CorridorWarmer(load_corridors(CORRIDORS_FILE), corridor_tiles)
+    warmer.start()
+    return warmer
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point: python corridors.py corridors.json [--once]."""
+    parser = argparse.ArgumentParser(description="Precompute weather tiles along busy corridors.")
+    parser.add_argument("corridors", nargs="?", default=CORRIDORS_FILE,
+                        help="JSON file with the corridors (default: TRIPWEATHER_CORRIDORS)")
+    parser.add_argument("--once", action="store_true", help="Build every tile once and exit")
+    args = parser.parse_args(argv)
+    if not args.corridors:
+        parser.error("no corridors file given and TRIPWEATHER_CORRIDORS is not set")
+
+    warmer = CorridorWarmer(load_corridors(args.corridors), corridor_tiles)
+    if args.once:
+        written = warmer.run_once()
+        return 0 if written == len(warmer.corridors) else 1
+    try:
+        warmer._run()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+import calendar
+import sys
+from array import array
+from bisect import bisect_left
+from dataclasses import replace
+from datetime import datetime
+from typing import Optional, Dict, List, Tuple, Any
+
+from models import Forecast
+
+def wall_clock_epoch(date_time: datetime) -> int:
+    """
+    Seconds since the epoch for a datetime's wall-clock fields.
+
+    Forecast hours from weatherapi.com and trip times are both local, naive
+    datetimes, so they are compared on their wall-clock values.
+    """
+    return calendar.timegm(date_time.timetuple())
+
+class HourlySeries:
+    """
+    One forecast series parsed once into sorted, parallel arrays.
+
+    ``epochs`` holds wall-clock timestamps in ascending order and the value arrays hold
+    the already converted details for each hour, so lookups are a bisect instead of
+    parsing every ``hour['time']`` string on each call.
+    """
+    __slots__ = ("epochs", "temperature", "precipitation", "wind_speed", "icons")
+
+    def __init__(self, epochs: List[int], temperature: List[float], precipitation: List[float],
+                 wind_speed: List[float], icons: List[Optional[str]]):
+        self.epochs = array("q", epochs)
+        self.temperature = array("d", temperature)
+        self.precipitation = array("d", precipitation)
+        self.wind_speed = array("d", wind_speed)
+        # The same few dozen icon URLs repeat in every cached day, so share one copy
+        self.icons = [sys.intern(icon) if icon else icon for icon in icons]
+
+    @classmethod
+    def from_rows(cls, rows: List[Tuple[datetime, Forecast]]) -> "HourlySeries":
+        """
+        Build a series from parsed forecast hours.
+
+        Args:
+            rows: (time, forecast) pairs, in any order
+
+        Returns:
+            The parsed series
+        """
+        columns: Tuple[List[Any], ...] = ([], [], [], [], [])
+        for date_time, forecast in sorted(rows, key=lambda row: row[0]):
+            columns[0].append(wall_clock_epoch(date_time))
+            columns[1].append(_number(forecast.temperature))
+            columns[2].append(_number(forecast.precipitation))
+            columns[3].append(_number(forecast.wind_speed))
+            columns[4].append(forecast.icon_url)
+        return cls(*columns)
+
+    def __len__(self) -> int:
+        return len(self.epochs)
+
+    def at(self, date_time: datetime, interpolate: bool = False) -> Optional[Forecast]:
+        """
+        Forecast details for a point in time.
+
+        Args:
+            date_time: Time to look up
+            interpolate: Linearly interpolate temperature, precipitation and wind speed
+                between the neighbouring hours instead of using the closest hour
+
+        Returns:
+            The forecast, or None if the series is empty
+        """
+        if not self.epochs:
+            return None
+
+        t = wall_clock_epoch(date_time)
+        i = bisect_left(self.epochs, t)
+        if i == 0 or i == len(self.epochs):
+            return self._row(0 if i == 0 else i - 1)
+
+        before, after = self.epochs[i - 1], self.epochs[i]
+        closest = i - 1 if t - before <= after - t else i
+        if not interpolate or t == after:
+            return self._row(closest)
+
+        weight = (t - before) / (after - before)
+        blended = {}
+        for field in ("temperature", "precipitation", "wind_speed"):
+            values = getattr(self, field)
+            a, b = values[i - 1], values[i]
+            if a == a and b == b:  # skip NaN placeholders for missing values
+                blended[field] = round(a + (b - a) * weight, 1)
+        return replace(self._row(closest), **blended)
+
+    def window(self, start: datetime, end: datetime) -> "HourlySeries":
+        """
+        The hours from ``start`` (inclusive) to ``end`` (exclusive) as a new series.
+
+        Used to cut one day out of a multi-day series with two bisects.
+        """
+        lo = bisect_left(self.epochs, wall_clock_epoch(start))
+        hi = bisect_left(self.epochs, wall_clock_epoch(end))
+        return HourlySeries(self.epochs[lo:hi], self.temperature[lo:hi], self.precipitation[lo:hi],
+                            self.wind_speed[lo:hi], self.icons[lo:hi])
+
+    def to_dict(self) -> Dict[str, List[Any]]:
+        """Plain lists suitable for JSON serialisation."""
+        return {field: list(getattr(self, field)) for field in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, List[Any]]) -> "HourlySeries":
+        """Rebuild a series from ``to_dict`` output."""
+        return cls(**data)
+
+    def _row(self, i: int) -> Forecast:
+        return Forecast(_value(self.temperature[i]), _value(self.precipitation[i]),
+                        _value(self.wind_speed[i]), self.icons[i])
+
+def _number(value: Optional[float]) -> float:
+    """Store missing values as NaN so they fit in a float array."""
+    return float("nan") if value is None else float(value)
+
+def _value(value: float) -> Optional[float]:
+    """Turn NaN placeholders back into None."""
+    return None if value != value else value
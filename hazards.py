@@ -0,0 +1,122 @@
+import re
+from dataclasses import dataclass
+from typing import Optional, Dict, List
+
+from models import Forecast, Stop
+
+# Thresholds for driving hazards, in the units of Forecast
+NEAR_ZERO_RANGE = (-2.0, 2.0)   # °C, risk of ice on the road
+SNOW_MAX_TEMPERATURE = 1.0      # °C, precipitation at or below this is treated as snow or sleet
+MIN_PRECIPITATION = 0.1         # mm, less than this counts as dry
+HEAVY_RAIN = 4.0                # mm per hour
+STRONG_WIND = 10.0              # m/s
+
+# weatherapi.com icon numbers (…/64x64/day/<n>.png) for snow, sleet and blizzard conditions
+SNOW_ICONS = frozenset({179, 182, 185, 227, 230, 317, 320, 323, 326, 329, 332, 335, 338,
+                        350, 362, 365, 368, 371, 374, 377, 392, 395})
+_ICON_NUMBER = re.compile(r"/(\d+)\.png$")
+
+SNOW = "snow"
+ICE = "ice"
+WIND = "wind"
+RAIN = "rain"
+
+HAZARD_DESCRIPTIONS = {
+    SNOW: "snow or sleet",
+    ICE: "temperatures around 0°C with a risk of ice",
+    WIND: "strong wind",
+    RAIN: "heavy rain",
+}
+
+@dataclass(frozen=True)
+class HazardAssessment:
+    """Hazards found along a trip together with an instant templated summary."""
+    hazards: Dict[str, List[str]]
+    summary: str
+
+    @property
+    def benign(self) -> bool:
+        return not self.hazards
+
+def classify_hazards(forecast: Forecast) -> List[str]:
+    """
+    Classify the driving hazards of one forecast.
+
+    Args:
+        forecast: Forecast for one place and hour
+
+    Returns:
+        Hazard kinds (SNOW, ICE, WIND, RAIN) present in the forecast
+    """
+    temperature = forecast.temperature
+    precipitation = forecast.precipitation or 0.0
+    wind_speed = forecast.wind_speed or 0.0
+
+    hazards = []
+    wet = precipitation >= MIN_PRECIPITATION
+    if _is_snow_icon(forecast.icon_url) or (
+            wet and temperature is not None and temperature <= SNOW_MAX_TEMPERATURE):
+        hazards.append(SNOW)
+    if temperature is not None and NEAR_ZERO_RANGE[0] <= temperature <= NEAR_ZERO_RANGE[1]:
+        hazards.append(ICE)
+    if wind_speed >= STRONG_WIND:
+        hazards.append(WIND)
+    if precipitation >= HEAVY_RAIN and SNOW not in hazards:
+        hazards.append(RAIN)
+    return hazards
+
+def assess_trip(weather_data: List[Stop]) -> HazardAssessment:
+    """
+    Classify every stop of a trip and write a templated summary.
+
+    Args:
+        weather_data: Stops from ``find_weather_along_route``
+
+    Returns:
+        The hazards per kind (with the cities where they occur) and the summary text
+    """
+    hazards: Dict[str, List[str]] = {}
+    temperatures = []
+    for stop in weather_data:
+        if stop.temperature is None:
+            continue
+        temperatures.append(stop.temperature)
+        for kind in classify_hazards(stop.forecast):
+            places = hazards.setdefault(kind, [])
+            if stop.city not in places:
+                places.append(stop.city)
+
+    return HazardAssessment(hazards, _summary(hazards, temperatures))
+
+def _summary(hazards: Dict[str, List[str]], temperatures: List[float]) -> str:
+    """Templated travel comment."""
+    if not temperatures:
+        return "No forecast is available for this trip."
+
+    low, high = round(min(temperatures)), round(max(temperatures))
+    span = f"{low}°C" if low == high else f"between {low}°C and {high}°C"
+    if not hazards:
+        return f"Good driving conditions along the route, with temperatures {span} and no significant precipitation or wind."
+
+    warnings = [
+        f"{HAZARD_DESCRIPTIONS[kind]} near {_places(hazards[kind])}"
+        for kind in (SNOW, ICE, WIND, RAIN) if kind in hazards
+    ]
+    return f"Drive carefully: expect {'; '.join(warnings)}. Temperatures along the route are {span}."
+
+def _places(places: List[str]) -> str:
+    if len(places) <= 1:
+        return places[0] if places else "the route"
+    return ", ".join(places[:-1]) + " and " + places[-1]
+
+def _is_snow_icon(icon_url: Optional[str]) -> bool:
+    """weatherapi.com snow icon numbers, or met.no symbol names such as heavysnow or lightsleet."""
+    if not icon_url:
+        return False
+    return _icon_number(icon_url) in SNOW_ICONS or "snow" in icon_url or "sleet" in icon_url
+
+def _icon_number(icon_url: Optional[str]) -> Optional[int]:
+    if not icon_url:
+        return None
+    match = _ICON_NUMBER.search(icon_url)
+    return int(match.group(1)) if match else None
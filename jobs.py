@@ -0,0 +1,127 @@
+import threading
+import time
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+@dataclass
+class Job:
+    """A background computation that clients poll for its result."""
+    id: str
+    key: Hashable
+    status: str = QUEUED
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    submissions: int = 1
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Status representation returned by the polling endpoint."""
+        data = {"job_id": self.id, "status": self.status}
+        if self.status == DONE:
+            data["result"] = self.result
+        elif self.status == FAILED:
+            data["error"] = self.error
+        return data
+
+class JobManager:
+    """
+    In-process job queue backed by a worker thread pool.
+
+    Submitting a key that already has a queued or running job returns that job instead
+    of starting a new one, so identical in-flight requests share one computation.
+    Finished jobs are kept for ``ttl`` seconds so clients can poll for them.
+    """
+
+    def __init__(self, max_workers: int = 4, ttl: float = 600):
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+        self._in_flight: Dict[Hashable, Job] = {}
+        self.coalesced = 0
+
+    def submit(self, key: Hashable, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Job:
+        """
+        Queue ``func(*args, **kwargs)`` unless an identical job is already in flight.
+
+        Args:
+            key: Identity of the computation, used for coalescing
+            func: Function computing the job result
+
+        Returns:
+            The new job, or the in-flight job with the same key
+        """
+        with self._lock:
+            self._purge_expired()
+            job = self._in_flight.get(key)
+            if job is not None:
+                job.submissions += 1
+                self.coalesced += 1
+                return job
+            job = Job(id=uuid.uuid4().hex, key=key)
+            self._jobs[job.id] = job
+            self._in_flight[key] = job
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Look up a job by id, or None if it is unknown or expired."""
+        with self._lock:
+            self._purge_expired()
+            return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        """Job counts by status and the number of coalesced submissions."""
+        with self._lock:
+            counts = {status: 0 for status in (QUEUED, RUNNING, DONE, FAILED)}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            counts["coalesced"] = self.coalesced
+            return counts
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting jobs and optionally wait for running ones."""
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job: Job, func: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]) -> None:
+        with self._lock:
+            job.status = RUNNING
+        result, error, status = None, None, FAILED
+        try:
+            result = func(*args, **kwargs)
+            status = DONE
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}")
+            error = str(e)
+        finally:
+            # Pollers purge by finished_at, so it is set before the job reads as finished
+            with self._lock:
+                job.finished_at = time.time()
+                job.result = result
+                job.error = error
+                job.status = status
+                if self._in_flight.get(job.key) is job:
+                    del self._in_flight[job.key]
+
+    def _purge_expired(self) -> None:
+        """Drop finished jobs older than the TTL; caller holds the lock."""
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
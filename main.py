@@ -1,5 +1,6 @@
 
 
+import os
 import requests
 import polyline
 from datetime import datetime, timedelta
@@ -19,6 +20,10 @@ GOOGLE_API_KEY = read_api_key('../hemligheter/google_api.txt')
 WEATHERAPI_API_KEY = read_api_key('../hemligheter/weather_api.txt')
 OPENAI_API_KEY = read_api_key('../hemligheter/openai_api.txt')
 
+# met.no requires a User-Agent that identifies the application and a contact, e.g.
+# "tripweather/1.0 you@example.com"; generic ones are blocked, so there is no default
+YR_USER_AGENT = os.getenv("YR_USER_AGENT")
+
 # Print API keys to verify they are read correctly (for debugging purposes)
 print(f"Google API Key: {GOOGLE_API_KEY}")
 print(f"Weather API Key: {WEATHERAPI_API_KEY}")
@@ -97,6 +102,9 @@ def get_city_name(lat, lng):
 from datetime import datetime
 
 def get_weather_data(lat, lng, user_agent, target_time):
+    if not user_agent:
+        return None  # met.no may only be called with an identifying User-Agent (YR_USER_AGENT)
+    
     url = f"https://api.met.no/weatherapi/locationforecast/2.0/compact?lat={lat}&lon={lng}"
     
     headers = {
@@ -0,0 +1,73 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import NamedTuple, Optional, Dict, Any
+
+# Format of the stop time shown in the page and sent in JSON results
+STOP_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+class RoutePoint(NamedTuple):
+    """A sample point along a route and the time the car reaches it."""
+    lat: float
+    lng: float
+    arrival_time: datetime
+
+@dataclass(frozen=True, slots=True)
+class Forecast:
+    """Weather at one place and hour, in the units shown to the user."""
+    temperature: Optional[float] = None     # °C
+    precipitation: Optional[float] = None   # mm
+    wind_speed: Optional[float] = None      # m/s
+    icon_url: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain dictionary with the temperature, precipitation, wind_speed and icon_url."""
+        return {
+            "temperature": self.temperature,
+            "precipitation": self.precipitation,
+            "wind_speed": self.wind_speed,
+            "icon_url": self.icon_url
+        }
+
+@dataclass(frozen=True, slots=True)
+class Stop:
+    """One stop of a trip: where and when, the forecast there and any lookup error."""
+    city: str
+    time: datetime
+    forecast: Optional[Forecast] = None
+    error: Optional[str] = None
+
+    @property
+    def temperature(self) -> Optional[float]:
+        return self.forecast.temperature if self.forecast else None
+
+    @property
+    def precipitation(self) -> Optional[float]:
+        return self.forecast.precipitation if self.forecast else None
+
+    @property
+    def wind_speed(self) -> Optional[float]:
+        return self.forecast.wind_speed if self.forecast else None
+
+    @property
+    def icon_url(self) -> Optional[str]:
+        return self.forecast.icon_url if self.forecast else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Serialise the stop for the template, JSON responses and batch output.
+
+        Returns:
+            Dictionary with City, Time, Temperature, Precipitation, WindSpeed and
+            IconURL, plus Error when a lookup failed
+        """
+        data = {
+            "City": self.city,
+            "Time": self.time.strftime(STOP_TIME_FORMAT),
+            "Temperature": self.temperature,
+            "Precipitation": self.precipitation,
+            "WindSpeed": self.wind_speed,
+            "IconURL": self.icon_url
+        }
+        if self.error:
+            data["Error"] = self.error
+        return data
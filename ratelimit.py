@@ -0,0 +1,292 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Optional, Dict, Tuple, Any, Callable
+
+import requests
+
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+class RateLimitExceeded(requests.exceptions.RequestException):
+    """
+    The local rate limiter refused a request.
+
+    Subclasses RequestException so callers that already handle failed requests treat
+    it the same way. ``retry_after`` says when a token will be available again.
+    """
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class QuotaExceeded(RateLimitExceeded):
+    """The provider's daily request budget is used up."""
+    pass
+
+@dataclass
+class RateLimit:
+    """
+    Request budget of one provider and API key.
+
+    ``rate`` tokens per second are added to a bucket holding at most ``burst`` tokens;
+    every request takes one. ``daily`` caps the requests per UTC day (None for no cap).
+    """
+    rate: float
+    burst: float
+    daily: Optional[int] = None
+
+def parse_provider_values(text: str) -> Dict[str, float]:
+    """Parse "google=50,weatherapi=10" into {"google": 50.0, "weatherapi": 10.0}."""
+    values = {}
+    for item in filter(None, (part.strip() for part in text.split(","))):
+        name, _, value = item.partition("=")
+        try:
+            values[name.strip()] = float(value)
+        except ValueError:
+            logger.error(f"Ignoring invalid rate limit setting: {item}")
+    return values
+
+# Requests per second per provider and key. Google Maps allows 50 QPS per project and
+# met.no asks for at most 20 per application; weatherapi.com is only bounded monthly.
+DEFAULT_RATES = {"google": 50.0, "weatherapi": 10.0, "metno": 10.0}
+RATES = {**DEFAULT_RATES, **parse_provider_values(os.getenv("TRIPWEATHER_RATE_LIMITS", ""))}
+DAILY_QUOTAS = parse_provider_values(os.getenv("TRIPWEATHER_DAILY_QUOTAS", ""))
+
+# Per-provider limits; providers not listed are not limited
+PROVIDER_LIMITS: Dict[str, RateLimit] = {
+    name: RateLimit(rate, burst=max(1.0, rate), daily=int(DAILY_QUOTAS[name]) if name in DAILY_QUOTAS else None)
+    for name, rate in RATES.items()
+}
+
+# Longest a caller queues for a token before the request is refused
+MAX_WAIT = float(os.getenv("TRIPWEATHER_RATE_LIMIT_WAIT", "2.0"))
+# Share buckets and quotas between worker processes through this SQLite file
+RATELIMIT_DB_PATH = os.getenv("TRIPWEATHER_RATELIMIT_DB")
+
+class MemoryBucketStore:
+    """Bucket and quota state for the threads of one process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._quotas: Dict[Tuple[str, str], int] = {}
+
+    def update(self, key: str, day: str, change: Callable[[Optional[Tuple[float, float]], int], Tuple[Any, Optional[Tuple[float, float]], bool]]) -> Any:
+        """
+        Atomically read and replace one bucket and its quota counter.
+
+        ``change`` receives (tokens, updated_at) or None and the requests used today,
+        and returns (result, new bucket state, whether to count one request).
+        """
+        with self._lock:
+            result, bucket, counted = change(self._buckets.get(key), self._quotas.get((key, day), 0))
+            if bucket is not None:
+                self._buckets[key] = bucket
+            if counted:
+                self._quotas[(key, day)] = self._quotas.get((key, day), 0) + 1
+            return result
+
+    def used(self, key: str, day: str) -> int:
+        with self._lock:
+            return self._quotas.get((key, day), 0)
+
+class SQLiteBucketStore:
+    """
+    Bucket and quota state shared by every process using the same SQLite file.
+
+    Each update runs in a ``BEGIN IMMEDIATE`` transaction, which takes the database
+    write lock, so concurrent workers never hand out the same token twice.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_quotas (key TEXT NOT NULL, day TEXT NOT NULL, used INTEGER NOT NULL, "
+                "PRIMARY KEY (key, day))"
+            )
+
+    def update(self, key: str, day: str, change: Callable[[Optional[Tuple[float, float]], int], Tuple[Any, Optional[Tuple[float, float]], bool]]) -> Any:
+        """See MemoryBucketStore.update."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT tokens, updated_at FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+                used = self._used(key, day)
+                result, bucket, counted = change(tuple(row) if row else None, used)
+                if bucket is not None:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO rate_buckets (key, tokens, updated_at) VALUES (?, ?, ?)", (key, *bucket)
+                    )
+                if counted:
+                    self._conn.execute(
+                        "INSERT INTO rate_quotas (key, day, used) VALUES (?, ?, 1) "
+                        "ON CONFLICT (key, day) DO UPDATE SET used = used + 1", (key, day)
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            return result
+
+    def used(self, key: str, day: str) -> int:
+        with self._lock:
+            return self._used(key, day)
+
+    def _used(self, key: str, day: str) -> int:
+        row = self._conn.execute("SELECT used FROM rate_quotas WHERE key = ? AND day = ?", (key, day)).fetchone()
+        return row[0] if row else 0
+
+class RateLimiter:
+    """
+    Token-bucket rate limiter and daily quota budgeter per provider and API key.
+
+    ``acquire`` reserves the next token and sleeps until it is due, so callers queue
+    in arrival order and requests leave at an even ``rate`` instead of bursting into
+    the provider's limit. A caller that would have to wait longer than ``max_wait``, or
+    whose daily quota is used up, gets RateLimitExceeded (QuotaExceeded) right away so
+    it can fall back to cached data or another provider.
+
+    Args:
+        limits: RateLimit per provider; providers without one are not limited
+        store: MemoryBucketStore (one process) or SQLiteBucketStore (all processes)
+        max_wait: Longest time in seconds a caller queues for a token
+        clock: Time source, for tests
+        sleep: Sleep function, for tests
+    """
+
+    def __init__(self, limits: Dict[str, RateLimit], store: Optional[Any] = None, max_wait: float = MAX_WAIT,
+                 clock: Callable[[], float] = time.time, sleep: Callable[[float], None] = time.sleep):
+        self.limits = limits
+        self.store = store if store is not None else MemoryBucketStore()
+        self.max_wait = max_wait
+        self.clock = clock
+        self.sleep = sleep
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def acquire(self, provider: str, api_key: Optional[str] = None) -> float:
+        """
+        Wait for a request slot.
+
+        Args:
+            provider: Provider name, e.g. "google"
+            api_key: API key the request is sent with; each key has its own budget
+
+        Returns:
+            Seconds spent waiting
+
+        Raises:
+            QuotaExceeded: If today's quota is used up
+            RateLimitExceeded: If the next token is more than ``max_wait`` away
+        """
+        limit = self.limits.get(provider)
+        if limit is None:
+            return 0.0
+        key = bucket_key(provider, api_key)
+        now = self.clock()
+        day = datetime.fromtimestamp(now, timezone.utc).strftime("%Y-%m-%d")
+
+        def reserve(bucket: Optional[Tuple[float, float]], used: int) -> Tuple[Any, Optional[Tuple[float, float]], bool]:
+            if limit.daily is not None and used >= limit.daily:
+                return ("quota", _seconds_to_midnight(now)), None, False
+            tokens, updated_at = bucket if bucket is not None else (limit.burst, now)
+            tokens = min(limit.burst, tokens + max(0.0, now - updated_at) * limit.rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / limit.rate
+            if wait > self.max_wait:
+                return ("limited", wait), None, False
+            # Tokens may go negative: the deficit is the queue of callers already waiting
+            return ("ok", wait), (tokens - 1, now), True
+
+        outcome, wait = self.store.update(key, day, reserve)
+        if outcome == "quota":
+            self._count(provider, "quota_exceeded")
+            raise QuotaExceeded(f"{provider} daily quota of {limit.daily} requests used up", retry_after=wait)
+        if outcome == "limited":
+            self._count(provider, "refused")
+            raise RateLimitExceeded(f"{provider} rate limit reached, next slot in {wait:.1f} s", retry_after=wait)
+        self._count(provider, "acquired", waited=wait)
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+    def quota_used(self, provider: str, api_key: Optional[str] = None) -> int:
+        """Requests counted against today's quota."""
+        day = datetime.fromtimestamp(self.clock(), timezone.utc).strftime("%Y-%m-%d")
+        return self.store.used(bucket_key(provider, api_key), day)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Acquired, queued and refused requests and total wait per provider."""
+        with self._stats_lock:
+            return {provider: dict(values) for provider, values in self._stats.items()}
+
+    def _count(self, provider: str, counter: str, waited: float = 0.0) -> None:
+        with self._stats_lock:
+            values = self._stats.setdefault(
+                provider, {"acquired": 0, "queued": 0, "refused": 0, "quota_exceeded": 0, "wait_seconds": 0.0}
+            )
+            values[counter] += 1
+            if waited > 0:
+                values["queued"] += 1
+                values["wait_seconds"] = round(values["wait_seconds"] + waited, 3)
+
+def bucket_key(provider: str, api_key: Optional[str]) -> str:
+    """Bucket name for a provider and key; the key itself is never stored."""
+    if not api_key:
+        return provider
+    return f"{provider}:{hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:12]}"
+
+def _seconds_to_midnight(now: float) -> float:
+    """Seconds until the next UTC midnight, when daily quotas reset."""
+    return 86400 - now % 86400
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+def get_rate_limiter() -> RateLimiter:
+    """Get the shared limiter, backed by TRIPWEATHER_RATELIMIT_DB when it is set."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            store = SQLiteBucketStore(RATELIMIT_DB_PATH) if RATELIMIT_DB_PATH else MemoryBucketStore()
+            _limiter = RateLimiter(PROVIDER_LIMITS, store)
+        return _limiter
+
+def configure_rate_limit(provider: str, rate: float, burst: Optional[float] = None,
+                         daily: Optional[int] = None) -> None:
+    """
+    Set or replace a provider's limit.
+
+    Args:
+        provider: Provider name, e.g. "google"
+        rate: Requests per second
+        burst: Bucket size; defaults to one second's worth of requests
+        daily: Requests per UTC day, or None for no cap
+    """
+    PROVIDER_LIMITS[provider] = RateLimit(rate, burst if burst is not None else max(1.0, rate), daily)
+
+def _ratelimit_metrics():
+    """Requests queued, refused and over quota per provider, for /metrics."""
+    stats = get_rate_limiter().stats()
+    families = [
+        (f"tripweather_ratelimit_{counter}_total", "counter", f"Rate limiter {counter.replace('_', ' ')} requests.",
+         [({"provider": name}, values[counter]) for name, values in sorted(stats.items())])
+        for counter in ("acquired", "queued", "refused", "quota_exceeded")
+    ]
+    families.append(("tripweather_ratelimit_wait_seconds_total", "counter", "Time spent queueing for a token.",
+                     [({"provider": name}, values["wait_seconds"]) for name, values in sorted(stats.items())]))
+    return families
+
+telemetry.register_collector(_ratelimit_metrics)
@@ -0,0 +1,278 @@
+import logging
+import math
+from array import array
+from dataclasses import dataclass
+from typing import Optional, Dict, List, Tuple, Union, Any
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Number of sample points per trip when nothing else is requested, and the hard cap
+DEFAULT_SAMPLES = 10
+MAX_SAMPLES = 50
+
+def decode_polyline(encoded: str, precision: int = 5) -> np.ndarray:
+    """
+    Decode a Google encoded polyline straight into a NumPy array.
+
+    Every character is processed with vectorized operations: the 5-bit chunks are
+    grouped into values by their continuation bit, zigzag decoded, and the deltas
+    are accumulated with a cumulative sum.
+
+    Args:
+        encoded: Encoded polyline string
+        precision: Number of decimals encoded in the polyline
+
+    Returns:
+        Array of shape (n, 2) with latitude and longitude columns
+
+    Raises:
+        ValueError: If the string is not a valid encoded polyline
+    """
+    if not encoded:
+        return np.empty((0, 2))
+
+    chunks = np.frombuffer(encoded.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    if chunks.min() < 0 or chunks.max() > 0x3f:
+        raise ValueError("Invalid character in encoded polyline")
+
+    ends = chunks < 0x20
+    if not ends[-1] or np.count_nonzero(ends) % 2:
+        raise ValueError("Truncated encoded polyline")
+
+    # Index of the value each chunk belongs to and the chunk's position within it
+    value_ids = np.concatenate(([0], np.cumsum(ends)[:-1]))
+    positions = np.arange(len(chunks))
+    starts = np.concatenate(([True], ends[:-1]))
+    first_chunk = np.maximum.accumulate(np.where(starts, positions, 0))
+    parts = (chunks & 0x1f) << (5 * (positions - first_chunk))
+
+    values = np.bincount(value_ids, weights=parts).astype(np.int64)
+    values = np.where(values & 1, ~(values >> 1), values >> 1)
+    return np.cumsum(values.reshape(-1, 2), axis=0) / 10 ** precision
+
+def segment_lengths_km(waypoints: ArrayLike) -> np.ndarray:
+    """
+    Great-circle length of every polyline segment.
+
+    Args:
+        waypoints: Array of shape (n, 2) or sequence of (latitude, longitude) tuples
+
+    Returns:
+        Array of n - 1 segment lengths in kilometres
+    """
+    points = np.radians(np.asarray(waypoints, dtype=float).reshape(-1, 2))
+    lat, lng = points[:, 0], points[:, 1]
+    a = (np.sin(np.diff(lat) / 2) ** 2
+         + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lng) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def cumulative_distances_km(waypoints: ArrayLike) -> np.ndarray:
+    """
+    Cumulative along-route distance for every vertex of a decoded polyline.
+
+    Args:
+        waypoints: Array of shape (n, 2) or sequence of (latitude, longitude) tuples
+
+    Returns:
+        Array with the distance in kilometres from the first vertex, starting at 0.0
+    """
+    if len(waypoints) == 0:
+        return np.empty(0)
+    return np.concatenate(([0.0], np.cumsum(segment_lengths_km(waypoints))))
+
+def step_profile(steps: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Walk the Directions API steps once and accumulate distance and duration.
+
+    Args:
+        steps: Route steps from the Directions API response
+
+    Returns:
+        Tuple containing:
+        - Cumulative distance in metres at each step boundary, starting at 0.0
+        - Cumulative duration in seconds at each step boundary, starting at 0.0
+    """
+    values = np.zeros((len(steps) + 1, 2))
+    for i, step in enumerate(steps, start=1):
+        values[i] = (step.get('distance', {}).get('value', 0), step.get('duration', {}).get('value', 0))
+    cumulative = np.cumsum(values, axis=0)
+    return cumulative[:, 0], cumulative[:, 1]
+
+@dataclass(frozen=True, slots=True)
+class CompactRoute:
+    """
+    The parts of a Directions response the trip pipeline needs, stored compactly.
+
+    The geometry stays an encoded polyline string (decoded on use by ``decode_polyline``)
+    and only the distance and duration of every step are kept, as float32 arrays.
+    """
+    polyline: str
+    step_distances: array   # metres
+    step_durations: array   # seconds
+
+    @classmethod
+    def from_directions(cls, polyline: str, steps: List[Dict[str, Any]]) -> "CompactRoute":
+        """Build from the overview polyline and steps of a Directions API route."""
+        return cls(
+            polyline,
+            array("f", (step.get('distance', {}).get('value', 0) for step in steps)),
+            array("f", (step.get('duration', {}).get('value', 0) for step in steps))
+        )
+
+    def steps(self) -> List[Dict[str, Any]]:
+        """Steps shaped like the Directions API's, with only distance and duration."""
+        return [
+            {'distance': {'value': distance}, 'duration': {'value': duration}}
+            for distance, duration in zip(self.step_distances, self.step_durations)
+        ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain values suitable for JSON serialisation."""
+        return {
+            "polyline": self.polyline,
+            "step_distances": self.step_distances.tolist(),
+            "step_durations": self.step_durations.tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CompactRoute":
+        """Rebuild a route from ``to_dict`` output."""
+        return cls(data["polyline"], array("f", data["step_distances"]), array("f", data["step_durations"]))
+
+def interpolate(x: ArrayLike, xs: ArrayLike, ys: ArrayLike) -> Union[float, np.ndarray]:
+    """
+    Piecewise-linear interpolation of ``x`` over the ascending breakpoints ``xs``.
+
+    ``x`` may be a scalar or an array. Values outside the breakpoints are clamped to
+    the first or last ``ys`` value.
+    """
+    if len(xs) == 0:
+        return np.zeros_like(np.asarray(x, dtype=float)) if np.ndim(x) else 0.0
+    result = np.interp(x, xs, ys)
+    return float(result) if np.ndim(result) == 0 else result
+
+class RouteProfile:
+    """
+    Distance and duration profile of one route, built from a single Directions response.
+
+    The overview polyline and the step list describe the same route, so a position's
+    share of the total polyline length is mapped onto the cumulative step distances and
+    the duration is interpolated inside the step that contains it (and vice versa).
+    All methods accept scalars or arrays of positions.
+    """
+
+    def __init__(self, waypoints: ArrayLike, steps: List[Dict[str, Any]]):
+        points = np.asarray(waypoints, dtype=float).reshape(-1, 2)
+        self.lats = points[:, 0]
+        self.lngs = points[:, 1]
+        self.polyline_km = cumulative_distances_km(points)
+        self.step_distances, self.step_durations = step_profile(steps)
+        self.total_km = float(self.polyline_km[-1]) if len(self.polyline_km) else 0.0
+        self.total_m = float(self.step_distances[-1])
+        self.total_seconds = float(self.step_durations[-1])
+
+    def offset_at_km(self, km: ArrayLike) -> Union[float, np.ndarray]:
+        """Seconds from departure to the point ``km`` along the polyline."""
+        if self.total_km <= 0:
+            return km * 0.0
+        if self.total_m <= 0:
+            return np.asarray(km) / self.total_km * self.total_seconds
+        along_m = np.asarray(km) / self.total_km * self.total_m
+        return interpolate(along_m, self.step_distances, self.step_durations)
+
+    def km_at_offset(self, seconds: ArrayLike) -> Union[float, np.ndarray]:
+        """Polyline distance reached ``seconds`` after departure."""
+        if self.total_seconds <= 0 or self.total_m <= 0:
+            return seconds * 0.0
+        along_m = interpolate(seconds, self.step_durations, self.step_distances)
+        return along_m / self.total_m * self.total_km
+
+    def point_at_km(self, km: ArrayLike) -> Tuple[Union[float, np.ndarray], Union[float, np.ndarray]]:
+        """Position ``km`` along the polyline, interpolated between vertices."""
+        return interpolate(km, self.polyline_km, self.lats), interpolate(km, self.polyline_km, self.lngs)
+
+def sample_route(waypoints: ArrayLike,
+                 steps: List[Dict[str, Any]],
+                 count: Optional[int] = None,
+                 spacing_km: Optional[float] = None,
+                 spacing_minutes: Optional[float] = None,
+                 max_samples: int = MAX_SAMPLES) -> List[Tuple[float, float, float]]:
+    """
+    Sample points evenly along a route by distance or by travel time.
+
+    Exactly one of ``count``, ``spacing_km`` or ``spacing_minutes`` selects the
+    sampling; without any of them ``DEFAULT_SAMPLES`` points are spread evenly by
+    distance. The first and last point of the route are always included (so
+    ``count=1`` still returns both), and a count or spacing that would produce more
+    than ``max_samples`` points falls back to ``max_samples`` evenly spaced points,
+    so API spend per trip stays bounded.
+
+    Args:
+        waypoints: Decoded overview polyline as (latitude, longitude) tuples
+        steps: Route steps from the same Directions API response
+        count: Number of points spread evenly by distance
+        spacing_km: Distance between consecutive points
+        spacing_minutes: Driving time between consecutive points
+        max_samples: Upper bound on the number of points
+
+    Returns:
+        List of (latitude, longitude, seconds from departure) tuples
+
+    Raises:
+        ValueError: If more than one sampling option is given or a value is not a positive number
+    """
+    options = [option for option in (count, spacing_km, spacing_minutes) if option is not None]
+    if len(options) > 1:
+        raise ValueError("Use only one of count, spacing_km or spacing_minutes")
+    if any(not math.isfinite(option) or option <= 0 for option in options):
+        raise ValueError("Sampling count and spacing must be positive and finite")
+    if len(waypoints) == 0:
+        return []
+
+    profile = RouteProfile(waypoints, steps)
+    if profile.total_km <= 0:
+        return [(float(profile.lats[0]), float(profile.lngs[0]), 0.0)]
+
+    # Count the points before building any array, so a huge count or a tiny spacing
+    # costs no more than max_samples points
+    by_time = spacing_minutes is not None and profile.total_seconds > 0
+    if spacing_km is not None:
+        planned = _spaced_count(profile.total_km, spacing_km)
+    elif by_time:
+        planned = _spaced_count(profile.total_seconds, spacing_minutes * 60)
+    else:
+        planned = max(2, count or DEFAULT_SAMPLES)
+
+    if planned > max_samples:
+        logger.warning(f"Sampling would produce up to {planned:.0f} points, limiting to {max_samples}")
+        targets = _evenly(profile.total_km, max_samples)
+    elif spacing_km is not None:
+        targets = _spaced(profile.total_km, spacing_km)
+    elif by_time:
+        targets = profile.km_at_offset(_spaced(profile.total_seconds, spacing_minutes * 60))
+    else:
+        targets = _evenly(profile.total_km, planned)
+
+    lats, lngs = profile.point_at_km(targets)
+    offsets = profile.offset_at_km(targets)
+    return list(zip(lats.tolist(), lngs.tolist(), offsets.tolist()))
+
+def _evenly(total: float, count: int) -> np.ndarray:
+    """``count`` positions spread evenly over [0, total]; at least the two ends."""
+    return np.linspace(0.0, total, max(2, count))
+
+def _spaced_count(total: float, spacing: float) -> float:
+    """Upper bound on the number of positions ``_spaced`` returns, without building them."""
+    return total // spacing + 2
+
+def _spaced(total: float, spacing: float) -> np.ndarray:
+    """Positions every ``spacing`` over [0, total], always ending at ``total``."""
+    positions = np.arange(int(total // spacing) + 1) * spacing
+    if total - positions[-1] > 1e-9:
+        positions = np.append(positions, total)
+    return positions
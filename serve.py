@@ -0,0 +1,34 @@
+"""
+Production server entry point for the TripWeather web app.
+
+Runs the Flask app under waitress instead of the Flask development server. Each
+trip request awaits its route, geocode and forecast calls concurrently, and the
+server's thread pool lets one process handle many trip requests at the same time.
+
+Environment variables:
+    HOST: Interface to bind (default 0.0.0.0)
+    PORT: Port to listen on (default 5001)
+    SERVER_THREADS: Number of request threads (default 32)
+
+The process also rebuilds the corridor tiles in the background when
+TRIPWEATHER_CORRIDORS is set (see corridors.py).
+"""
+import os
+import logging
+from waitress import serve
+from app import app
+from corridors import start_corridor_warmer
+
+logger = logging.getLogger(__name__)
+
+def main() -> None:
+    """Start the production server."""
+    host = os.getenv('HOST', '0.0.0.0')
+    port = int(os.getenv('PORT', '5001'))
+    threads = int(os.getenv('SERVER_THREADS', '32'))
+    start_corridor_warmer()
+    logger.info(f"Serving TripWeather on {host}:{port} with {threads} threads")
+    serve(app, host=host, port=port, threads=threads, channel_timeout=120)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import weakref
+import logging
+from concurrent.futures import Future
+from typing import Optional, Dict, Tuple, Any, Callable, Hashable
+
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent calls into one.
+
+    The first caller of a key runs the function; callers arriving with the same key
+    while it runs wait for it and get its result, or its exception. Threads wait on
+    the shared future with ``do``, async tasks await it with ``do_async`` without
+    holding a worker thread, and both kinds of caller share the same in-flight calls.
+    Nothing is kept once the call finishes; caching is left to the caller.
+
+    Args:
+        name: Name used in stats and metrics
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self.calls = 0
+        self.shared = 0
+        _flights.add(self)
+
+    def do(self, key: Hashable, func: Callable[..., Any], *args: Any) -> Tuple[Any, bool]:
+        """
+        Call ``func(*args)``, or wait for the identical call already in flight.
+
+        Args:
+            key: Identity of the call
+            func: Function to run if no call with the key is in flight
+
+        Returns:
+            The result and whether it was shared with an earlier caller
+
+        Raises:
+            Exception: Whatever ``func`` raised, for every caller sharing the call
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return future.result(), True
+        try:
+            result = func(*args)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result, False
+
+    async def do_async(self, key: Hashable, func: Callable[..., Any], *args: Any) -> Tuple[Any, bool]:
+        """
+        Awaitable ``do``; the blocking ``func`` runs in a worker thread.
+
+        Returns:
+            The result and whether it was shared with an earlier caller
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future), True
+        try:
+            result = await asyncio.to_thread(func, *args)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result, False
+
+    def stats(self) -> Dict[str, int]:
+        """Calls made, calls answered by another caller's call, and calls in flight."""
+        with self._lock:
+            return {"calls": self.calls, "shared": self.shared, "in_flight": len(self._calls)}
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.shared += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self.calls += 1
+            return future, True
+
+    def _finish(self, key: Hashable, future: Future, result: Any = None,
+                error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+# Every live SingleFlight, for stats and metrics
+_flights: "weakref.WeakSet[SingleFlight]" = weakref.WeakSet()
+
+def get_singleflight_stats() -> Dict[str, Dict[str, int]]:
+    """Call and duplicate-suppression counters of every SingleFlight."""
+    return {flight.name: flight.stats() for flight in list(_flights)}
+
+def _singleflight_metrics():
+    """Duplicate-suppression counters, for /metrics."""
+    stats = get_singleflight_stats()
+    return [
+        ("tripweather_singleflight_calls_total", "counter", "Calls made on behalf of all identical callers.",
+         [({"flight": name}, values["calls"]) for name, values in sorted(stats.items())]),
+        ("tripweather_singleflight_shared_total", "counter", "Duplicate calls answered by a call already in flight.",
+         [({"flight": name}, values["shared"]) for name, values in sorted(stats.items())]),
+    ]
+
+telemetry.register_collector(_singleflight_metrics)
@@ -0,0 +1,159 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List, Tuple, Any
+
+from hazards import NEAR_ZERO_RANGE, STRONG_WIND
+from models import RoutePoint, Stop
+from telemetry import in_context
+from tripweather import (
+    DEFAULT_MAX_WORKERS,
+    APIError,
+    build_stop,
+    call_limited,
+    forecast_key,
+    get_city_name,
+    get_forecast_days,
+    plan_forecast_requests,
+    plan_route_points
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_CANDIDATES = 24
+
+# Penalty weights used to rank departures; higher scores mean worse driving conditions
+PRECIPITATION_WEIGHT = 1.0      # per mm
+WIND_WEIGHT = 0.5               # per m/s above STRONG_WIND
+NEAR_ZERO_PENALTY = 2.0         # per stop within NEAR_ZERO_RANGE
+MISSING_FORECAST_PENALTY = 1.0  # per stop without a forecast
+
+def departure_candidates(window_start: datetime, window_end: datetime, step: timedelta) -> List[datetime]:
+    """
+    Departure times from ``window_start`` to ``window_end`` (inclusive) every ``step``.
+
+    Raises:
+        ValueError: If the window is empty, the step is not positive or there would be
+            more than MAX_CANDIDATES departures
+    """
+    if step <= timedelta(0):
+        raise ValueError("Departure step must be positive")
+    if window_end < window_start:
+        raise ValueError("Departure window ends before it starts")
+
+    count = int((window_end - window_start) / step) + 1
+    if count > MAX_CANDIDATES:
+        raise ValueError(f"Departure window has {count} candidates, the maximum is {MAX_CANDIDATES}")
+    return [window_start + i * step for i in range(count)]
+
+def score_stops(stops: List[Stop]) -> float:
+    """
+    Penalty score for the weather along one departure; lower is better.
+
+    Precipitation, wind above STRONG_WIND and temperatures near 0 °C add to the
+    score, as do stops without a forecast.
+    """
+    score = 0.0
+    for stop in stops:
+        if stop.temperature is None:
+            score += MISSING_FORECAST_PENALTY
+            continue
+        score += PRECIPITATION_WEIGHT * (stop.precipitation or 0.0)
+        score += WIND_WEIGHT * max(0.0, (stop.wind_speed or 0.0) - STRONG_WIND)
+        if NEAR_ZERO_RANGE[0] <= stop.temperature <= NEAR_ZERO_RANGE[1]:
+            score += NEAR_ZERO_PENALTY
+    return round(score, 2)
+
+def sweep_departures(origin: str, destination: str, window_start: datetime, window_end: datetime,
+                     step: timedelta = timedelta(hours=1),
+                     stops: Optional[int] = None,
+                     spacing_km: Optional[float] = None,
+                     spacing_minutes: Optional[float] = None,
+                     max_workers: int = DEFAULT_MAX_WORKERS) -> Dict[str, Any]:
+    """
+    Compare departure times for one trip.
+
+    The route and the sample points' travel offsets are computed once, every point is
+    geocoded once, and each grid cell is fetched once for all the days any candidate
+    needs there; each candidate departure then only shifts the arrival times.
+
+    Args:
+        origin: Starting location
+        destination: Destination location
+        window_start: Earliest departure
+        window_end: Latest departure
+        step: Time between candidate departures
+        stops: Number of evenly spaced stops
+        spacing_km: Distance between stops, instead of a stop count
+        spacing_minutes: Driving time between stops, instead of a stop count
+        max_workers: Number of concurrent geocode and forecast lookups
+
+    Returns:
+        Dictionary with a "departures" comparison table (one row per candidate with its
+        score, summary values and Stop objects) and the "best" departure time
+
+    Raises:
+        ValueError: If the departure window is invalid
+        APIError: If the route cannot be fetched
+    """
+    departures = departure_candidates(window_start, window_end, step)
+    points = plan_route_points(origin, destination, window_start, stops, spacing_km, spacing_minutes)
+    if not points:
+        return {"departures": [], "best": None}
+
+    offsets = [point.arrival_time - window_start for point in points]
+    cells = plan_forecast_requests(
+        RoutePoint(lat, lng, departure + offset)
+        for departure in departures
+        for (lat, lng, _), offset in zip(points, offsets)
+    )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        city_futures = [executor.submit(in_context(call_limited), "google", get_city_name, lat, lng) for lat, lng, _ in points]
+        days_futures = {
+            cell: executor.submit(in_context(get_forecast_days), cell[0], cell[1], dates)
+            for cell, dates in cells.items()
+        }
+        cities = [_result_or(future, "Unknown Location") for future in city_futures]
+        series = {
+            (*cell, date_str): days_series
+            for cell, future in days_futures.items()
+            for date_str, days_series in (_result_or(future, None) or {}).items()
+        }
+
+    rows = [
+        _departure_row(departure, points, offsets, cities, series)
+        for departure in departures
+    ]
+    best = min(rows, key=lambda row: (row["score"], row["departure"]))
+    return {"departures": rows, "best": best["departure"]}
+
+def _departure_row(departure: datetime, points: List[RoutePoint],
+                   offsets: List[timedelta], cities: List[str],
+                   series: Dict[Tuple[float, float, str], Any]) -> Dict[str, Any]:
+    """Build one row of the comparison table."""
+    stops = []
+    for (lat, lng, _), offset, city in zip(points, offsets, cities):
+        arrival_time = departure + offset
+        day_series = series.get(forecast_key(lat, lng, arrival_time.strftime("%Y-%m-%d")))
+        weather = day_series.at(arrival_time) if day_series is not None else None
+        stops.append(build_stop(arrival_time, city, weather, None if weather else "Forecast unavailable"))
+
+    temperatures = [stop.temperature for stop in stops if stop.temperature is not None]
+    return {
+        "departure": departure.strftime("%Y-%m-%d %H:%M"),
+        "arrival": (departure + offsets[-1]).strftime("%Y-%m-%d %H:%M"),
+        "score": score_stops(stops),
+        "min_temperature": min(temperatures) if temperatures else None,
+        "total_precipitation": round(sum(stop.precipitation or 0.0 for stop in stops), 1),
+        "max_wind_speed": max((stop.wind_speed or 0.0 for stop in stops), default=None),
+        "stops": stops
+    }
+
+def _result_or(future, default: Any) -> Any:
+    """Return a lookup result, or ``default`` if it failed."""
+    try:
+        return future.result()
+    except APIError as e:
+        logger.error(f"Lookup failed during departure sweep: {e}")
+        return default
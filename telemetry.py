@@ -0,0 +1,407 @@
+"""
+Tracing, metrics and sampling profiler for the trip pipeline.
+
+- Spans: ``trace("trip")`` starts a per-request span tree and ``span("geocode")``
+  records a stage inside it. Every span also feeds the ``tripweather_stage_seconds``
+  histogram, so stages are measured even outside a trace (batch, sweeps).
+- Metrics: counters and histograms rendered in the Prometheus text format by
+  ``render_metrics`` for the ``/metrics`` endpoint. Values owned elsewhere, such as
+  cache hit counters, are exported through collectors (``register_collector``).
+- Profiling: ``SamplingProfiler`` samples the stacks of all threads and reports them
+  in the collapsed format read by flamegraph tools.
+
+Worker threads do not inherit the current span; submit work with
+``executor.submit(in_context(func), ...)`` to keep it in the request's tree.
+"""
+import contextvars
+import os
+import sys
+import threading
+import time
+import logging
+from collections import Counter as TallyCounter, deque
+from contextlib import contextmanager
+from typing import Optional, Dict, List, Tuple, Any, Callable, Iterable, Iterator, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Root spans slower than this are logged with their full tree
+SLOW_TRACE_SECONDS = float(os.getenv("TRIPWEATHER_SLOW_TRACE_MS", "5000")) / 1000
+
+# Upper bounds in seconds, from a cached lookup to a slow LLM call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        """Add ``amount`` to the counter for the given label values."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        """Current value for the given label values."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    """Histogram with cumulative buckets, a sum and a count per label set."""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket..., count above the last bucket, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        """Record one observation for the given label values."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            row[index] += 1
+            row[-1] += value
+
+    def count(self, **labels: Any) -> int:
+        """Number of observations for the given label values."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            row = self._values.get(key)
+            return int(sum(row[:-1])) if row else 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(row)) for key, row in self._values.items())
+        names = self.labelnames + ("le",)
+        for key, row in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), row[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(names, key + (le,))} {_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(row[-1])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(cumulative)}")
+        return lines
+
+# A collector returns (name, type, help, [(labels, value), ...]) families at scrape time
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]]
+
+_metrics: List[Any] = []
+_collectors: List[Collector] = []
+
+def counter(name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+    """Create and register a counter."""
+    metric = Counter(name, help, labelnames)
+    _metrics.append(metric)
+    return metric
+
+def histogram(name: str, help: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    """Create and register a histogram."""
+    metric = Histogram(name, help, labelnames, buckets)
+    _metrics.append(metric)
+    return metric
+
+def register_collector(collector: Collector) -> None:
+    """Export values kept elsewhere, read each time the metrics are rendered."""
+    _collectors.append(collector)
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            families = list(collector())
+        except Exception as e:
+            logger.error(f"Metrics collector failed: {e}")
+            continue
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+STAGE_SECONDS = histogram(
+    "tripweather_stage_seconds", "Duration of pipeline stages (route, geocode, forecast, comment).", ["stage"]
+)
+OUTBOUND_REQUESTS = counter(
+    "tripweather_outbound_requests_total", "Requests sent to external providers, including retries.",
+    ["provider", "status"]
+)
+OUTBOUND_BYTES = counter(
+    "tripweather_outbound_response_bytes_total", "Response body bytes received from external providers.",
+    ["provider"]
+)
+OUTBOUND_SECONDS = histogram(
+    "tripweather_outbound_request_seconds", "Latency of single requests to external providers.", ["provider"]
+)
+
+def record_outbound(provider: str, status: Any, seconds: float, size: Optional[int] = None) -> None:
+    """
+    Count one request to an external provider.
+
+    Args:
+        provider: Provider name, e.g. "google" or "openai"
+        status: HTTP status code, or "error" when no response was received
+        seconds: Time until the response (or failure)
+        size: Response body size in bytes, if known
+    """
+    OUTBOUND_REQUESTS.inc(provider=provider, status=status)
+    OUTBOUND_SECONDS.observe(seconds, provider=provider)
+    if size is not None:
+        OUTBOUND_BYTES.inc(size, provider=provider)
+
+class Span:
+    """One timed stage of a request, with the stages it started as children."""
+    __slots__ = ("name", "attributes", "start", "duration", "children", "parent", "root")
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, root: bool = False, **attributes: Any):
+        self.name = name
+        self.root = root
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.children: List["Span"] = []
+        self.parent = parent
+        if parent is not None:
+            parent.children.append(self)
+
+    def set(self, **attributes: Any) -> None:
+        """Add attributes, e.g. whether a lookup was served from cache."""
+        self.attributes.update(attributes)
+
+    def end(self) -> None:
+        """Stop the clock and record the stage duration."""
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self.start
+        STAGE_SECONDS.observe(self.duration, stage=self.name)
+        if self.root:
+            _finish_trace(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The span tree with offsets and durations in milliseconds."""
+        return self._to_dict(self.start)
+
+    def format(self, indent: int = 0) -> str:
+        """Human-readable tree, one span per line."""
+        duration = "running" if self.duration is None else f"{self.duration * 1000:.1f} ms"
+        attributes = " ".join(f"{key}={value}" for key, value in self.attributes.items())
+        lines = [f"{'  ' * indent}{self.name} {duration} {attributes}".rstrip()]
+        lines.extend(child.format(indent + 1) for child in list(self.children))
+        return "\n".join(lines)
+
+    def stage_totals(self) -> Dict[str, float]:
+        """Summed duration in seconds per span name below this span."""
+        totals: Dict[str, float] = {}
+        stack = list(self.children)
+        while stack:
+            span = stack.pop()
+            if span.duration is not None:
+                totals[span.name] = totals.get(span.name, 0.0) + span.duration
+            stack.extend(span.children)
+        return totals
+
+    def _to_dict(self, origin: float) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 2),
+            "duration_ms": None if self.duration is None else round(self.duration * 1000, 2),
+            "attributes": dict(self.attributes),
+            "children": [child._to_dict(origin) for child in list(self.children)],
+        }
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("tripweather_span", default=None)
+recent_traces: "deque[Span]" = deque(maxlen=50)
+
+def current_span() -> Optional[Span]:
+    """The innermost active span of this context, if any."""
+    return _current_span.get()
+
+def begin(name: str, **attributes: Any) -> Span:
+    """
+    Start a child of the current span without making it current; call ``end`` on it.
+
+    For work that spans generator yields, where a context manager would leak the
+    span into the caller's context.
+    """
+    return Span(name, _current_span.get(), **attributes)
+
+@contextmanager
+def trace(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Start a span tree, or a child span when a trace is already active.
+
+    Finished root spans are kept in ``recent_traces`` and logged when slower than
+    ``SLOW_TRACE_SECONDS``.
+    """
+    parent = _current_span.get()
+    root = Span(name, parent, root=parent is None, **attributes)
+    token = _current_span.set(root)
+    try:
+        yield root
+    finally:
+        _current_span.reset(token)
+        root.end()
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Time one stage as a child of the current span.
+
+    Outside a trace the span is not kept, but its duration still feeds the stage
+    histogram.
+    """
+    child = Span(name, _current_span.get(), **attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    finally:
+        _current_span.reset(token)
+        child.end()
+
+def annotate(**attributes: Any) -> None:
+    """Add attributes to the current span, if any."""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attributes)
+
+def in_context(func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Wrap ``func`` to run under the caller's current span, e.g. in a worker thread.
+
+    The wrapper may be called from several threads at once.
+    """
+    parent = _current_span.get()
+
+    def run(*args: Any, **kwargs: Any) -> Any:
+        token = _current_span.set(parent)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current_span.reset(token)
+    return run
+
+def _finish_trace(root: Span) -> None:
+    recent_traces.append(root)
+    if root.duration is not None and root.duration > SLOW_TRACE_SECONDS:
+        logger.warning(f"Slow {root.name} ({root.duration:.2f} s):\n{root.format()}")
+
+def server_timing(root: Span) -> str:
+    """
+    Server-Timing header value with the summed time per stage of a trace.
+
+    Stages run concurrently, so their totals can exceed the request time.
+    """
+    totals = sorted(root.stage_totals().items())
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals]
+    if root.duration is not None:
+        entries.append(f"total;dur={root.duration * 1000:.1f}")
+    return ", ".join(entries)
+
+class SamplingProfiler:
+    """
+    Low-overhead statistical profiler.
+
+    A background thread records the stack of every other thread each ``interval``
+    seconds. Stacks are counted in the collapsed format ("a;b;c 12") used by
+    flamegraph tools, so hot paths show up without instrumenting them.
+
+    Args:
+        interval: Seconds between samples
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: TallyCounter = TallyCounter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "SamplingProfiler":
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "SamplingProfiler":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def collapsed(self, limit: Optional[int] = None) -> str:
+        """Sampled stacks, most frequent first, one "frame;frame;frame count" per line."""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common(limit))
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+def profile(seconds: float, interval: float = 0.005) -> SamplingProfiler:
+    """Sample all threads for ``seconds`` and return the profiler with its samples."""
+    with SamplingProfiler(interval) as profiler:
+        time.sleep(seconds)
+    return profiler
@@ -0,0 +1,182 @@
+import json
+import threading
+import time
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+from models import Forecast
+from forecast_index import HourlySeries
+from tripweather import APIError
+from app import app, job_manager, TRIP_ERROR
+
+WAYPOINTS = [(59.33, 18.06), (59.86, 17.64)]
+STEPS = [{'distance': {'value': 70000}, 'duration': {'value': 3600}}]
+TRIP = {'origin': 'Stockholm', 'destination': 'Uppsala', 'starttime': '2024-01-01T12:00'}
+
+def forecast_days(lat, lng, dates):
+    """get_forecast_days replacement answering every day with mild, dry weather."""
+    weather = Forecast(5.0, 0.0, 2.0, '//cdn/sun.png')
+    return {date_str: HourlySeries.from_rows([(datetime(2024, 1, 1, 12, 0), weather)]) for date_str in dates}
+
+def parse_events(body):
+    """Split a Server-Sent Events body into (event, data) pairs."""
+    events = []
+    for block in body.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+class TestApp(unittest.TestCase):
+    """Test cases for the Flask endpoints, with the route, geocode, forecast and LLM providers mocked."""
+
+    def setUp(self):
+        """Mock the providers and create a test client."""
+        patch('tripweather.get_config').start()
+        self.route = patch('tripweather.get_route_data_detailed', return_value=(WAYPOINTS, STEPS)).start()
+        patch('tripweather.get_forecast_days', side_effect=forecast_days).start()
+        patch('tripweather.get_city_name', side_effect=lambda lat, lng, use_tiles=True: f'City {lat:.2f}').start()
+        self.comment = patch('tripweather.stream_weather_comment', return_value=iter(['Dry ', 'roads.'])).start()
+        self.addCleanup(patch.stopall)
+        self.client = app.test_client()
+
+    def wait(self, job_id):
+        """Poll a job until it has finished and return its status body."""
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            data = self.client.get(f'/jobs/{job_id}').get_json()
+            if data['status'] in ('done', 'failed'):
+                return data
+            time.sleep(0.01)
+        self.fail(f'job {job_id} did not finish')
+
+    def test_index_get(self):
+        """Test that the form is served without a trip or timing header."""
+        response = self.client.get('/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Server-Timing', response.headers)
+
+    def test_index_post(self):
+        """Test that a posted trip is rendered with its stops and timed."""
+        response = self.client.post('/', data={**TRIP, 'stops': '3'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('City 59.33', response.get_data(as_text=True))
+        self.assertIn('total;dur=', response.headers['Server-Timing'])
+        self.assertEqual(self.route.call_count, 1)
+
+    def test_index_post_invalid_sampling(self):
+        """Test that a non-positive stop count is reported as a bad request without fetching the route."""
+        for data in ({'stops': '0'}, {'stops': 'three'}, {'stops': '3', 'spacing_km': '10'},
+                     {'spacing_km': 'nan'}, {'spacing_minutes': 'inf'}):
+            with self.subTest(data=data):
+                response = self.client.post('/', data={**TRIP, **data})
+
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('Invalid trip request', response.get_data(as_text=True))
+        self.assertIn('stops must be a positive number', self.client.post('/', data={**TRIP, 'stops': '0'}).get_data(as_text=True))
+        self.route.assert_not_called()
+
+    def test_index_post_provider_failure(self):
+        """Test that a failed route lookup shows the generic error instead of the provider's."""
+        self.route.side_effect = APIError('Failed to fetch route data: key=SECRET')
+
+        response = self.client.post('/', data=TRIP)
+
+        self.assertEqual(response.status_code, 502)
+        self.assertIn(TRIP_ERROR, response.get_data(as_text=True))
+        self.assertNotIn('SECRET', response.get_data(as_text=True))
+
+    def test_stream_event_order(self):
+        """Test that every stop is sent before the comment deltas, the full comment and done."""
+        response = self.client.get('/stream', query_string={**TRIP, 'stops': '3', 'ai_comment': '1'})
+
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        events = parse_events(response.get_data(as_text=True))
+        self.assertEqual([event for event, _ in events],
+                         ['stop', 'stop', 'stop', 'comment_delta', 'comment_delta', 'comment', 'done'])
+        self.assertEqual(sorted(data['index'] for _, data in events[:3]), [0, 1, 2])
+        self.assertEqual(events[5][1], {'ai_comment': 'Dry roads.'})
+        self.assertEqual(events[6][1], {'stops': 3})
+
+    def test_stream_invalid_request(self):
+        """Test that a bad stop count is rejected before the stream starts."""
+        response = self.client.get('/stream', query_string={**TRIP, 'stops': '-1'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('stops must be a positive number', response.get_json()['error'])
+
+    def test_job_submit_and_poll(self):
+        """Test that a job is accepted with a Location to poll, and its result appears there."""
+        response = self.client.post('/jobs', json={**TRIP, 'stops': 2})
+
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()['job_id']
+        self.assertTrue(response.headers['Location'].endswith(f'/jobs/{job_id}'))
+        data = self.wait(job_id)
+        self.assertEqual(data['status'], 'done')
+        self.assertEqual(len(data['result']['weather_data']), 2)
+
+    def test_failed_job_hides_provider_error(self):
+        """Test that a failed job reports the generic error instead of the provider's."""
+        self.route.side_effect = APIError('Failed to fetch route data: key=SECRET')
+
+        data = self.wait(self.client.post('/jobs', json={**TRIP, 'origin': 'Nowhere'}).get_json()['job_id'])
+
+        self.assertEqual(data, {'job_id': data['job_id'], 'status': 'failed', 'error': TRIP_ERROR})
+
+    def test_job_invalid_and_unknown(self):
+        """Test that an invalid submission is a bad request and an unknown job is not found."""
+        self.assertEqual(self.client.post('/jobs', json={**TRIP, 'stops': 0}).status_code, 400)
+        self.assertEqual(self.client.post('/jobs', json={'origin': 'Stockholm'}).status_code, 400)
+        self.assertEqual(self.client.get('/jobs/unknown').status_code, 404)
+
+    def test_job_malformed_json(self):
+        """Test that a JSON body that is not an object, or a starttime that is not text, is a bad request."""
+        for body in (['Stockholm', 'Uppsala'], 'Stockholm', {**TRIP, 'starttime': 5}, {**TRIP, 'origin': 5}):
+            with self.subTest(body=body):
+                response = self.client.post('/jobs', json=body)
+
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('Invalid trip request', response.get_json()['error'])
+        self.route.assert_not_called()
+
+    def test_identical_jobs_are_coalesced(self):
+        """Test that an identical submission while the first is running returns the same job."""
+        release = threading.Event()
+
+        def slow_route(origin, destination, mode='driving'):
+            release.wait(5)
+            return WAYPOINTS, STEPS
+
+        self.route.side_effect = slow_route
+        coalesced = job_manager.coalesced
+
+        first = self.client.post('/jobs', json={**TRIP, 'origin': 'Lund'}).get_json()
+        second = self.client.post('/jobs', json={**TRIP, 'origin': ' lund '}).get_json()
+        release.set()
+
+        self.assertEqual(first['job_id'], second['job_id'])
+        self.assertEqual(job_manager.coalesced, coalesced + 1)
+        self.assertEqual(self.wait(first['job_id'])['status'], 'done')
+        self.assertEqual(self.route.call_count, 1)
+
+    def test_metrics_format(self):
+        """Test that /metrics serves the Prometheus text format, including the request counter."""
+        self.client.get('/')
+
+        response = self.client.get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        body = response.get_data(as_text=True)
+        self.assertIn('# HELP tripweather_http_requests_total HTTP requests served.', body)
+        self.assertIn('# TYPE tripweather_http_requests_total counter', body)
+        self.assertIn('# TYPE tripweather_http_request_seconds histogram', body)
+        self.assertIn('tripweather_http_requests_total{endpoint="index",method="GET",status="200"}', body)
+        for line in body.splitlines():
+            if line and not line.startswith('#'):
+                float(line.rsplit(' ', 1)[1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+import io
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from datetime import datetime
+from forecast_index import HourlySeries
+from models import Forecast, RoutePoint
+from tripweather import APIError
+from batch import Trip, main, read_trips, run_batch, write_jsonl
+
+def series(temperature):
+    """Build a one hour forecast series."""
+    return HourlySeries.from_rows([(datetime(2024, 1, 1, 12, 0), Forecast(temperature, 0.0, 3.0, 'icon.png'))])
+
+class TestReadTrips(unittest.TestCase):
+    """Test cases for reading batch input files."""
+    
+    def write(self, suffix, content):
+        """Write a temporary input file and return its path."""
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w') as file:
+            file.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+    
+    def test_read_csv(self):
+        """Test reading trips from CSV with optional columns."""
+        path = self.write('.csv', 'origin,destination,start_time,stops\nSundsvall,Stockholm,2024-01-01T08:00,5\n')
+        
+        trips = read_trips(path)
+        
+        self.assertEqual(trips[0].origin, 'Sundsvall')
+        self.assertEqual(trips[0].start_time, datetime(2024, 1, 1, 8, 0))
+        self.assertEqual(trips[0].stops, 5)
+        self.assertIsNone(trips[0].spacing_km)
+    
+    def test_read_jsonl(self):
+        """Test reading trips from JSONL."""
+        path = self.write('.jsonl', '{"id": "a", "origin": "Gävle", "destination": "Uppsala", "start_time": "2024-01-01T09:00"}\n')
+        self.assertEqual(read_trips(path)[0].id, 'a')
+    
+    def test_malformed_rows_become_trip_errors(self):
+        """Test that unreadable rows are kept as trips with an error instead of failing the file."""
+        path = self.write('.csv', 'id,origin,destination,start_time,stops\n'
+                                  'ok,Sundsvall,Stockholm,2024-01-01T08:00,5\n'
+                                  'bad-time,Sundsvall,Stockholm,tomorrow,\n'
+                                  'bad-stops,Sundsvall,Stockholm,2024-01-01T08:00,five\n')
+        jsonl = self.write('.jsonl', '{"id": "x", "origin": "Gävle"}\nnot json\n')
+        
+        trips = read_trips(path) + read_trips(jsonl)
+        
+        self.assertEqual([trip.id for trip in trips], ['ok', 'bad-time', 'bad-stops', 'x', '1'])
+        self.assertIsNone(trips[0].error)
+        self.assertTrue(all(trip.error for trip in trips[1:]))
+        self.assertIn('destination', trips[3].error)
+
+class TestRunBatch(unittest.TestCase):
+    """Test cases for the batch runner."""
+    
+    @patch('batch.get_forecast_days')
+    @patch('batch.get_city_name')
+    @patch('batch.plan_route_points')
+    def test_shared_lookups_are_deduplicated(self, mock_plan, mock_city, mock_series):
+        """Test that trips sharing cells trigger one lookup per distinct key."""
+        start = datetime(2024, 1, 1, 12, 0)
+        mock_plan.return_value = [RoutePoint(59.0, 18.0, start), RoutePoint(60.0, 18.0, start)]
+        mock_city.side_effect = lambda lat, lng: f"City {lat}"
+        mock_series.side_effect = lambda lat, lng, dates: {date_str: series(1.5) for date_str in dates}
+        trips = [Trip(str(i), 'A', 'B', start) for i in range(5)]
+        stats = {}
+        
+        results = list(run_batch(trips, max_workers=4, stats=stats))
+        
+        self.assertEqual(len(results), 5)
+        self.assertEqual(results[0]['stops'][1]['City'], 'City 60.0')
+        self.assertEqual(results[0]['stops'][0]['Temperature'], 1.5)
+        self.assertEqual(mock_city.call_count, 2)
+        self.assertEqual(mock_series.call_count, 2)
+        self.assertEqual(stats['points'], 10)
+        self.assertEqual(stats['geocode_lookups'], 2)
+        self.assertEqual(stats['forecast_requests'], 2)
+    
+    @patch('batch.get_forecast_days')
+    @patch('batch.get_city_name')
+    @patch('batch.plan_route_points')
+    def test_days_of_a_cell_share_one_request(self, mock_plan, mock_city, mock_series):
+        """Test that a trip crossing midnight asks once for both days of a cell."""
+        mock_plan.return_value = [RoutePoint(59.0, 18.0, datetime(2024, 1, 1, 23, 0)),
+                                  RoutePoint(59.01, 18.0, datetime(2024, 1, 2, 0, 30))]
+        mock_city.return_value = 'Test City'
+        mock_series.side_effect = lambda lat, lng, dates: {date_str: series(1.0) for date_str in dates}
+        stats = {}
+        
+        results = list(run_batch([Trip('night', 'A', 'B', datetime(2024, 1, 1, 23, 0))], stats=stats))
+        
+        mock_series.assert_called_once_with(59.0, 18.0, ['2024-01-01', '2024-01-02'])
+        self.assertEqual(len(results[0]['stops']), 2)
+        self.assertEqual(stats['forecast_lookups'], 2)
+        self.assertEqual(stats['forecast_requests'], 1)
+    
+    @patch('batch.get_forecast_days')
+    @patch('batch.get_city_name')
+    @patch('batch.plan_route_points')
+    def test_failed_route_is_reported_per_trip(self, mock_plan, mock_city, mock_series):
+        """Test that one failing route does not stop the rest of the batch."""
+        start = datetime(2024, 1, 1, 12, 0)
+        def plan(origin, *args):
+            if origin != 'A':
+                raise APIError('no route')
+            return [RoutePoint(59.0, 18.0, start)]
+        mock_plan.side_effect = plan
+        mock_city.return_value = 'Test City'
+        mock_series.side_effect = lambda lat, lng, dates: {date_str: series(2.0) for date_str in dates}
+        
+        results = {result['id']: result for result in run_batch([Trip('ok', 'A', 'B', start), Trip('bad', 'X', 'Y', start)])}
+        
+        self.assertEqual(results['bad']['error'], 'no route')
+        self.assertEqual(len(results['ok']['stops']), 1)
+    
+    @patch('batch.plan_route_points')
+    def test_invalid_trip_is_reported_per_trip(self, mock_plan):
+        """Test that a trip read with an error is reported without being routed."""
+        mock_plan.return_value = []
+        trips = [Trip('bad', 'A', '', None, error='Missing field destination'),
+                 Trip('ok', 'A', 'B', datetime(2024, 1, 1, 12, 0))]
+        stats = {}
+        
+        results = {result['id']: result for result in run_batch(trips, stats=stats)}
+        
+        self.assertEqual(results['bad']['error'], 'Missing field destination')
+        self.assertIsNone(results['bad']['start_time'])
+        self.assertEqual(results['ok']['stops'], [])
+        mock_plan.assert_called_once()
+        self.assertEqual((stats['trips'], stats['failed_trips']), (2, 1))
+    
+    @patch('batch.get_forecast_days')
+    @patch('batch.get_city_name')
+    @patch('batch.plan_route_points')
+    def test_geocodes_use_all_workers(self, mock_plan, mock_city, mock_series):
+        """Test that geocode lookups are not capped below max_workers."""
+        start = datetime(2024, 1, 1, 12, 0)
+        mock_plan.return_value = [RoutePoint(59.0 + i / 10, 18.0, start) for i in range(6)]
+        barrier = threading.Barrier(6, timeout=5)
+        def city(lat, lng):
+            barrier.wait()
+            return 'Test City'
+        mock_city.side_effect = city
+        mock_series.side_effect = lambda lat, lng, dates: {date_str: series(1.0) for date_str in dates}
+        
+        results = list(run_batch([Trip('wide', 'A', 'B', start)], max_workers=16))
+        
+        self.assertFalse(barrier.broken)
+        self.assertEqual([stop['City'] for stop in results[0]['stops']], ['Test City'] * 6)
+    
+    def test_write_jsonl(self):
+        """Test that each result becomes one JSON line."""
+        output = io.StringIO()
+        write_jsonl([{'id': '1'}, {'id': '2'}], output)
+        self.assertEqual([json.loads(line)['id'] for line in output.getvalue().splitlines()], ['1', '2'])
+    
+    @patch('batch.read_trips')
+    def test_workers_must_be_positive(self, mock_read):
+        """Test that -w below 1 is a usage error rather than a failure inside the thread pool."""
+        with patch('sys.stderr', io.StringIO()) as stderr:
+            with self.assertRaises(SystemExit) as raised:
+                main(['trips.csv', '-w', '0'])
+        
+        self.assertEqual(raised.exception.code, 2)
+        self.assertIn('--workers must be at least 1', stderr.getvalue())
+        mock_read.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
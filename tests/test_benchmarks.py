@@ -0,0 +1,55 @@
+import json
+import unittest
+from benchmarks.run import compare
+from benchmarks.stub_server import StubServer
+
+class TestStubServer(unittest.TestCase):
+    """Test cases for the recorded-response stub server."""
+
+    def setUp(self):
+        """Create a stub server without starting it."""
+        self.stub = StubServer()
+
+    def tearDown(self):
+        """Release the listening socket."""
+        self.stub._server.server_close()
+
+    def test_forecast_moved_to_requested_day(self):
+        """Test that the recorded weatherapi day is replayed as the requested one."""
+        endpoint, status, body = self.stub.respond('GET', '/weatherapi/v1/forecast.json', {'dt': '2030-06-01'})
+
+        self.assertEqual((endpoint, status), ('weatherapi.forecast', 200))
+        hours = json.loads(body)['forecast']['forecastday'][0]['hour']
+        self.assertTrue(all(hour['time'].startswith('2030-06-01') for hour in hours))
+
+    def test_forecast_days_from_today(self):
+        """Test that a days= request returns that many consecutive days."""
+        _, _, body = self.stub.respond('GET', '/weatherapi/v1/forecast.json', {'days': '3'})
+
+        self.assertEqual(len(json.loads(body)['forecast']['forecastday']), 3)
+
+    def test_geocode_nearest_town(self):
+        """Test that reverse geocoding answers with the closest recorded town."""
+        _, _, body = self.stub.respond('GET', '/google/maps/api/geocode/json', {'latlng': '59.33,18.06'})
+
+        self.assertIn('Stockholm', body)
+
+    def test_unknown_path(self):
+        """Test that paths without a fixture return 404."""
+        self.assertEqual(self.stub.respond('GET', '/google/nothing', {})[1], 404)
+
+class TestCompare(unittest.TestCase):
+    """Test cases for comparing results against a baseline."""
+
+    def test_regression_detected(self):
+        """Test that only changes in the bad direction beyond the tolerance are reported."""
+        baseline = {'trip': {'latency_ms': {'p50': 100.0}}, 'load': {'requests_per_second': 50.0}}
+        slower = {'trip': {'latency_ms': {'p50': 130.0}}, 'load': {'requests_per_second': 60.0}}
+        faster = {'trip': {'latency_ms': {'p50': 70.0}}, 'load': {'requests_per_second': 30.0}}
+
+        self.assertEqual(len(compare(slower, baseline, tolerance=0.2)), 1)
+        self.assertIn('requests_per_second', compare(faster, baseline, tolerance=0.2)[0])
+        self.assertEqual(compare(baseline, baseline), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from cache import TTLCache, SQLiteStore, quantize_coordinate
+
+class TestQuantize(unittest.TestCase):
+    """Test cases for coordinate quantization."""
+    
+    def test_nearby_points_share_a_cell(self):
+        """Test that points a few metres apart map to the same cell."""
+        self.assertEqual(quantize_coordinate(59.33258, 18.06290), quantize_coordinate(59.33312, 18.06411))
+    
+    def test_precision(self):
+        """Test that the precision controls the cell size."""
+        self.assertEqual(quantize_coordinate(59.33258, 18.06490, 1), (59.3, 18.1))
+
+class TestTTLCache(unittest.TestCase):
+    """Test cases for the in-memory TTL/LRU cache."""
+    
+    def test_hit_and_miss_counters(self):
+        """Test hits, misses and hit rate."""
+        cache = TTLCache("test")
+        self.assertIsNone(cache.get("a"))
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+    
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first."""
+        cache = TTLCache("test", maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+    
+    @patch('cache.time.time')
+    def test_ttl_expiry(self, mock_time):
+        """Test that entries expire after their TTL."""
+        mock_time.return_value = 1000.0
+        cache = TTLCache("test", ttl=10)
+        cache.set("a", 1)
+        
+        mock_time.return_value = 1011.0
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["expirations"], 1)
+    
+    @patch('cache.time.time')
+    def test_stale_entries_kept_for_fallback(self, mock_time):
+        """Test that an expired entry is a miss for get but still served by get_stale."""
+        mock_time.return_value = 1000.0
+        cache = TTLCache("test", ttl=10, stale_ttl=60)
+        cache.set("a", 1)
+        
+        mock_time.return_value = 1030.0
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get_stale("a"), 1)
+        self.assertEqual(cache.stats()["stale_hits"], 1)
+        
+        mock_time.return_value = 1071.0
+        self.assertIsNone(cache.get_stale("a"))
+
+class TestSQLiteStore(unittest.TestCase):
+    """Test cases for the persistent cache tier."""
+    
+    def setUp(self):
+        """Create a temporary database file."""
+        handle, self.path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+    
+    def tearDown(self):
+        """Remove the temporary database file."""
+        os.remove(self.path)
+    
+    def test_survives_restart(self):
+        """Test that a new cache instance reads entries written by an earlier one."""
+        TTLCache("test", store=SQLiteStore(self.path, "geocode")).set((59.33, 18.06), "Stockholm")
+        
+        cache = TTLCache("test", store=SQLiteStore(self.path, "geocode"))
+        self.assertEqual(cache.get((59.33, 18.06)), "Stockholm")
+        self.assertEqual(cache.stats()["hits"], 1)
+    
+    def test_store_is_bounded(self):
+        """Test that the store keeps at most maxsize rows."""
+        store = SQLiteStore(self.path, "geocode", maxsize=2)
+        for key in ("a", "b", "c"):
+            store.set(key, key, expires_at=2e9)
+        
+        rows = store._conn.execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+        self.assertEqual(rows, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import threading
+import time
+import traceback
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+from cache import TTLCache
+from cache_policy import CachedLookup
+
+class ImmediateExecutor:
+    """Executor running submitted calls at once, in the caller's thread."""
+
+    def __init__(self):
+        self.submitted = 0
+
+    def submit(self, func, *args):
+        self.submitted += 1
+        func(*args)
+
+class DeferredExecutor:
+    """Executor holding submitted calls until run() is called."""
+
+    def __init__(self):
+        self.calls = []
+
+    def submit(self, func, *args):
+        self.calls.append((func, args))
+
+    def run(self):
+        for func, args in self.calls:
+            func(*args)
+        self.calls = []
+
+class LookupError_(Exception):
+    """Failure raised by the test fetches."""
+    pass
+
+class TestCachedLookup(unittest.TestCase):
+    """Test cases for stale-while-revalidate and negative caching."""
+
+    def setUp(self):
+        """Create a cache whose entries can be served for 100 s after expiry."""
+        self.cache = TTLCache('test', ttl=10, stale_ttl=100)
+        self.executor = ImmediateExecutor()
+        self.lookup = CachedLookup(self.cache, serve_stale_for=20, negative_ttl=5,
+                                   errors=(LookupError_,), executor=self.executor)
+
+    def test_fetch_then_hit(self):
+        """Test that a miss is fetched and cached, and the next lookup is a hit."""
+        fetch = MagicMock(return_value='value')
+
+        self.assertEqual(self.lookup.get('a', fetch), ('value', 'fetched'))
+        self.assertEqual(self.lookup.get('a', fetch), ('value', 'hit'))
+        fetch.assert_called_once()
+
+    @patch('cache.time.time')
+    def test_recently_expired_entry_served_and_refreshed(self, mock_time):
+        """Test that a recently expired entry is returned at once and refreshed in the background."""
+        mock_time.return_value = 1000.0
+        self.cache.set('a', 'old')
+        mock_time.return_value = 1015.0
+        executor = DeferredExecutor()
+        self.lookup.executor = executor
+
+        value = self.lookup.get('a', lambda: 'new')
+        self.lookup.get('a', lambda: 'new')
+
+        self.assertEqual(value, ('old', 'stale'))
+        self.assertEqual(len(executor.calls), 1)
+        executor.run()
+        self.assertEqual(self.lookup.get('a', lambda: 'newer'), ('new', 'hit'))
+
+    @patch('cache.time.time')
+    def test_old_entry_is_fallback_only(self, mock_time):
+        """Test that an entry past serve_stale_for is refetched and only used when the fetch fails."""
+        mock_time.return_value = 1000.0
+        self.cache.set('a', 'old')
+        self.cache.set('b', 'old')
+        mock_time.return_value = 1050.0
+
+        self.assertEqual(self.lookup.get('a', lambda: 'new'), ('new', 'fetched'))
+        self.assertEqual(self.lookup.get('b', MagicMock(side_effect=LookupError_('down'))), ('old', 'fallback'))
+        self.assertEqual(self.executor.submitted, 0)
+
+    def test_failures_are_remembered(self):
+        """Test that a failed lookup is not retried within negative_ttl."""
+        fetch = MagicMock(side_effect=LookupError_('down'))
+
+        for _ in range(3):
+            with self.assertRaises(LookupError_):
+                self.lookup.get('a', fetch)
+
+        fetch.assert_called_once()
+        self.assertEqual(self.cache.stats()['negative_hits'], 2)
+
+    def test_remembered_failure_raised_fresh(self):
+        """Test that each negative-cache hit raises a new exception with the stored message."""
+        with self.assertRaises(LookupError_) as first:
+            self.lookup.get('a', MagicMock(side_effect=LookupError_('down')))
+        raised = []
+        for _ in range(3):
+            with self.assertRaises(LookupError_) as hit:
+                self.lookup.get('a', MagicMock())
+            raised.append(hit.exception)
+
+        self.assertEqual([str(error) for error in raised], ['down'] * 3)
+        self.assertEqual(len({id(error) for error in raised + [first.exception]}), 4)
+        depth = [len(traceback.extract_tb(error.__traceback__)) for error in raised]
+        self.assertEqual(depth[0], depth[-1])
+
+    @patch('cache.time.time')
+    def test_failed_refresh_keeps_stale_value(self, mock_time):
+        """Test that a failing background refresh keeps the entry and is not retried at once."""
+        mock_time.return_value = 1000.0
+        self.cache.set('a', 'old')
+        mock_time.return_value = 1015.0
+        fetch = MagicMock(side_effect=LookupError_('down'))
+
+        self.assertEqual(self.lookup.get('a', fetch), ('old', 'stale'))
+        self.assertEqual(self.lookup.get('a', fetch), ('old', 'stale'))
+
+        fetch.assert_called_once()
+        self.assertEqual(self.lookup.stats()['refresh_failures'], 1)
+
+    def test_concurrent_misses_share_one_fetch(self):
+        """Test that identical lookups arriving together make a single fetch."""
+        release = threading.Event()
+        fetch = MagicMock(side_effect=lambda: release.wait(5) and 'value')
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [executor.submit(self.lookup.get, 'a', fetch) for _ in range(3)]
+            deadline = time.monotonic() + 5
+            while self.lookup.stats()['shared'] < 2 and time.monotonic() < deadline:
+                time.sleep(0.005)
+            release.set()
+            results = sorted(future.result() for future in futures)
+
+        fetch.assert_called_once()
+        self.assertEqual(results, [('value', 'fetched'), ('value', 'shared'), ('value', 'shared')])
+        self.assertEqual(self.lookup.get('a', fetch), ('value', 'hit'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+import numpy as np
+from forecast_index import HourlySeries, wall_clock_epoch
+from tiles import TileStore
+import tripweather
+from tripweather import APIError, forecast_cell, geocode_key, get_city_name, get_forecast_days
+from corridors import Corridor, CorridorWarmer, build_tile, cell_spacing_km, corridor_cells, load_corridors
+
+# Straight line from Stockholm to Uppsala, about 70 km
+WAYPOINTS = np.array([[59.33, 18.06], [59.86, 17.64]])
+
+def fake_forecast_days(lat, lng, dates):
+    """Hourly series whose temperature encodes the latitude."""
+    result = {}
+    for date_str in dates:
+        day = wall_clock_epoch(datetime.strptime(date_str, '%Y-%m-%d'))
+        result[date_str] = HourlySeries([day + hour * 3600 for hour in range(24)], [lat] * 24,
+                                        [0.0] * 24, [3.0] * 24, ['icon.png'] * 24)
+    return result
+
+class TestLoadCorridors(unittest.TestCase):
+    """Test cases for reading the corridors file."""
+
+    def write(self, records):
+        """Write a temporary corridors file and return its path."""
+        handle, path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(handle, 'w') as file:
+            json.dump(records, file)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_load(self):
+        """Test that corridors are read with a default mode and a file-safe name."""
+        path = self.write([{'name': 'E4 north', 'origin': 'Stockholm', 'destination': 'Uppsala'},
+                           {'origin': 'Malmö', 'destination': 'Lund', 'mode': 'bicycling'}])
+
+        corridors = load_corridors(path)
+
+        self.assertEqual(corridors[0], Corridor('E4_north', 'Stockholm', 'Uppsala', 'driving'))
+        self.assertEqual(corridors[1].mode, 'bicycling')
+        self.assertEqual(corridors[1].name, 'Malmö-Lund')
+
+    def test_invalid(self):
+        """Test that an entry without a destination is rejected."""
+        with self.assertRaises(ValueError):
+            load_corridors(self.write([{'origin': 'Stockholm'}]))
+
+@patch('corridors.get_city_name', side_effect=lambda lat, lng, use_tiles=True: f'City {lat:.2f}')
+@patch('corridors.fetch_forecast_days', side_effect=fake_forecast_days)
+@patch('corridors.get_route_data_detailed', return_value=(WAYPOINTS, []))
+class TestCorridorWarmer(unittest.TestCase):
+    """Test cases for precomputing tiles along a corridor."""
+
+    def setUp(self):
+        """Create a tile store on a temporary directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = TileStore(self.directory.name, check_interval=0)
+        self.corridor = Corridor('e4', 'Stockholm', 'Uppsala')
+        self.now = datetime(2026, 10, 16, 14, 30)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_build_tile_covers_every_cell(self, mock_route, mock_forecast, mock_city):
+        """Test that every forecast cell along the route is fetched once, and cities bypass the tiles."""
+        tile = build_tile(self.corridor, days=2, now=self.now)
+
+        self.assertEqual(len(tile.cells), mock_forecast.call_count)
+        self.assertIn(forecast_cell(59.33, 18.06), tile.cells)
+        self.assertIn(forecast_cell(59.86, 17.64), tile.cells)
+        self.assertEqual(mock_forecast.call_args[0][2], ['2026-10-16', '2026-10-17'])
+        self.assertFalse(mock_city.call_args[0][-1])
+        self.assertEqual(len(tile.cities), mock_city.call_count)
+        self.assertTrue(tile.covers('2026-10-16'))
+        self.assertFalse(tile.covers('2026-10-18'))
+
+    def test_failed_cells_are_left_out(self, mock_route, mock_forecast, mock_city):
+        """Test that a cell whose lookup fails is left out of the tile."""
+        failing = forecast_cell(59.86, 17.64)
+
+        def forecast_days(lat, lng, dates):
+            if forecast_cell(lat, lng) == failing:
+                raise APIError('down')
+            return fake_forecast_days(lat, lng, dates)
+
+        mock_forecast.side_effect = forecast_days
+
+        tile = build_tile(self.corridor, days=1, now=self.now)
+
+        self.assertNotIn(failing, tile.cells)
+        self.assertIn(forecast_cell(59.33, 18.06), tile.cells)
+
+    def test_run_once_and_failures(self, mock_route, mock_forecast, mock_city):
+        """Test that each corridor is written and a failing route does not stop the others."""
+        failing = Corridor('broken', 'Nowhere', 'Elsewhere')
+
+        def route(origin, destination, mode):
+            if origin != 'Stockholm':
+                raise APIError('NOT_FOUND')
+            return WAYPOINTS, []
+
+        mock_route.side_effect = route
+        warmer = CorridorWarmer([failing, self.corridor], self.store, days=1)
+
+        self.assertEqual(warmer.run_once(), 1)
+
+        stats = warmer.stats()
+        self.assertEqual((stats['runs'], stats['failures']), (1, 1))
+        self.assertEqual(list(stats['tiles']), ['e4'])
+
+    def test_lookups_answered_from_tiles(self, mock_route, mock_forecast, mock_city):
+        """Test that forecast and city lookups on the corridor skip the providers and caches."""
+        warmer = CorridorWarmer([self.corridor], self.store, days=2)
+        with patch('corridors.datetime') as mock_datetime:
+            mock_datetime.now.return_value = self.now
+            warmer.run_once()
+
+        with patch('tripweather.corridor_tiles', self.store), \
+             patch('tripweather.get_weather_router') as mock_router, \
+             patch('tripweather.geocode_lookup') as mock_geocode:
+            days = get_forecast_days(59.33, 18.06, ['2026-10-16', '2026-10-17'])
+            city = get_city_name(59.33, 18.06)
+
+        mock_router.assert_not_called()
+        mock_geocode.get.assert_not_called()
+        self.assertEqual(sorted(days), ['2026-10-16', '2026-10-17'])
+        self.assertAlmostEqual(days['2026-10-17'].at(datetime(2026, 10, 17, 9)).temperature, 59.33, places=5)
+        self.assertEqual(city, 'City 59.33')
+
+class TestCellSpacing(unittest.TestCase):
+    """Test cases for sampling a corridor densely enough to reach every grid cell."""
+
+    def test_spacing_narrows_with_latitude(self):
+        """Test that the spacing is half the geocode cell width at the route's highest latitude."""
+        equator = cell_spacing_km(np.array([[0.0, 18.0], [0.1, 18.0]]))
+        north = cell_spacing_km(np.array([[59.0, 18.0], [66.0, 18.0]]))
+
+        self.assertAlmostEqual(equator, 0.5566, places=3)
+        self.assertAlmostEqual(north, equator * np.cos(np.radians(66.0)), places=6)
+
+    def test_every_geocode_cell_far_north(self):
+        """Test that an east-west route at 66°N reaches every geocode cell it crosses."""
+        waypoints = np.array([[66.0, 22.0], [66.0, 22.5]])
+        expected = {geocode_key(66.0, lng) for lng in np.linspace(22.0, 22.5, 5001)}
+
+        with patch('corridors.get_route_data_detailed', return_value=(waypoints, [])):
+            _, geocode_cells = corridor_cells(Corridor('lulea', 'A', 'B'))
+
+        self.assertEqual(set(geocode_cells), expected)
+
+class TestTileDirectory(unittest.TestCase):
+    """Test cases for the tile directory setting."""
+
+    def test_tile_dir_is_absolute(self):
+        """Test that the default tile directory does not depend on the working directory."""
+        self.assertTrue(os.path.isabs(tripweather.TILE_DIR))
+        self.assertEqual(os.path.dirname(tripweather.TILE_DIR), os.path.dirname(os.path.abspath(tripweather.__file__)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+from datetime import datetime
+from forecast_index import HourlySeries
+from models import Forecast
+
+def details(temperature, precipitation=0.0, wind_speed=5.0, icon='icon.png'):
+    """Build the forecast of one hour."""
+    return Forecast(temperature, precipitation, wind_speed, icon)
+
+class TestHourlySeries(unittest.TestCase):
+    """Test cases for the parsed hourly forecast index."""
+    
+    def setUp(self):
+        """Build a three hour series given out of order."""
+        self.series = HourlySeries.from_rows([
+            (datetime(2024, 1, 1, 14, 0), details(4.0, icon='c.png')),
+            (datetime(2024, 1, 1, 12, 0), details(0.0, wind_speed=2.0, icon='a.png')),
+            (datetime(2024, 1, 1, 13, 0), details(2.0, wind_speed=4.0, icon='b.png'))
+        ])
+    
+    def test_closest_hour(self):
+        """Test that lookups pick the closest hour, earlier on ties."""
+        self.assertEqual(self.series.at(datetime(2024, 1, 1, 12, 20)).icon_url, 'a.png')
+        self.assertEqual(self.series.at(datetime(2024, 1, 1, 12, 30)).icon_url, 'a.png')
+        self.assertEqual(self.series.at(datetime(2024, 1, 1, 12, 40)).icon_url, 'b.png')
+    
+    def test_clamps_outside_series(self):
+        """Test that times outside the series use the first or last hour."""
+        self.assertEqual(self.series.at(datetime(2024, 1, 1, 3, 0)).temperature, 0.0)
+        self.assertEqual(self.series.at(datetime(2024, 1, 1, 23, 0)).temperature, 4.0)
+    
+    def test_interpolation(self):
+        """Test linear interpolation between neighbouring hours."""
+        row = self.series.at(datetime(2024, 1, 1, 12, 15), interpolate=True)
+        self.assertEqual(row.temperature, 0.5)
+        self.assertEqual(row.wind_speed, 2.5)
+        self.assertEqual(row.icon_url, 'a.png')
+        self.assertEqual(row.precipitation, 0.0)
+    
+    def test_missing_values(self):
+        """Test that missing values survive as None."""
+        series = HourlySeries.from_rows([(datetime(2024, 1, 1, 12, 0), details(None))])
+        self.assertIsNone(series.at(datetime(2024, 1, 1, 12, 0)).temperature)
+    
+    def test_empty_series(self):
+        """Test that an empty series has no forecast."""
+        self.assertIsNone(HourlySeries.from_rows([]).at(datetime(2024, 1, 1)))
+    
+    def test_dict_round_trip(self):
+        """Test that the JSON form rebuilds an equivalent series."""
+        rebuilt = HourlySeries.from_dict(self.series.to_dict())
+        self.assertEqual(rebuilt.at(datetime(2024, 1, 1, 13, 0)), self.series.at(datetime(2024, 1, 1, 13, 0)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+from datetime import datetime
+from hazards import ICE, RAIN, SNOW, WIND, assess_trip, classify_hazards
+from models import Forecast, Stop
+
+def details(temperature, precipitation=0.0, wind_speed=3.0, icon_url=None):
+    """Build the forecast of one hour."""
+    return Forecast(temperature, precipitation, wind_speed, icon_url)
+
+def stop(city, temperature, precipitation=0.0, wind_speed=3.0):
+    """Build a stop, without a forecast when temperature is None."""
+    forecast = details(temperature, precipitation, wind_speed) if temperature is not None else None
+    return Stop(city, datetime(2024, 1, 1, 12, 0), forecast)
+
+class TestClassifyHazards(unittest.TestCase):
+    """Test cases for the per-forecast hazard rules."""
+    
+    def test_benign_weather(self):
+        """Test that dry, calm, mild weather has no hazards."""
+        self.assertEqual(classify_hazards(details(12.0)), [])
+    
+    def test_precipitation_near_freezing_is_snow(self):
+        """Test that precipitation at low temperatures counts as snow and ice risk."""
+        self.assertEqual(classify_hazards(details(0.5, precipitation=1.2)), [SNOW, ICE])
+    
+    def test_snow_icon(self):
+        """Test that a weatherapi snow icon is a snow hazard regardless of temperature."""
+        hazards = classify_hazards(details(3.0, icon_url='//cdn.weatherapi.com/weather/64x64/day/338.png'))
+        self.assertEqual(hazards, [SNOW])
+    
+    def test_wind_and_heavy_rain(self):
+        """Test the wind and heavy rain thresholds."""
+        self.assertEqual(classify_hazards(details(14.0, precipitation=6.0, wind_speed=12.0)), [WIND, RAIN])
+    
+    def test_missing_values(self):
+        """Test that missing values are not hazards."""
+        self.assertEqual(classify_hazards(details(None, None, None)), [])
+
+class TestAssessTrip(unittest.TestCase):
+    """Test cases for the trip assessment and templated summary."""
+    
+    def test_benign_summary(self):
+        """Test the summary of a trip without hazards."""
+        assessment = assess_trip([
+            stop('Gävle', 8.2),
+            stop('Uppsala', 11.4, wind_speed=4.0)
+        ])
+        
+        self.assertTrue(assessment.benign)
+        self.assertIn('between 8°C and 11°C', assessment.summary)
+    
+    def test_hazards_list_cities(self):
+        """Test that hazards record the cities where they occur, ignoring stops without a forecast."""
+        assessment = assess_trip([
+            stop('Sundsvall', -1.0),
+            stop('Hudiksvall', None),
+            stop('Gävle', 1.5, wind_speed=11.0)
+        ])
+        
+        self.assertFalse(assessment.benign)
+        self.assertEqual(assessment.hazards, {ICE: ['Sundsvall', 'Gävle'], WIND: ['Gävle']})
+        self.assertTrue(assessment.summary.startswith('Drive carefully'))
+    
+    def test_no_forecast(self):
+        """Test the summary when no stop has a forecast."""
+        assessment = assess_trip([stop('Gävle', None)])
+        self.assertEqual(assessment.summary, 'No forecast is available for this trip.')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import threading
+import time
+import unittest
+from jobs import Job, JobManager, DONE, FAILED
+
+class TestJobManager(unittest.TestCase):
+    """Test cases for the in-process job queue."""
+    
+    def setUp(self):
+        """Create a job manager with two workers."""
+        self.manager = JobManager(max_workers=2)
+    
+    def tearDown(self):
+        """Stop the worker pool."""
+        self.manager.shutdown()
+    
+    def wait(self, job):
+        """Poll until a job has finished."""
+        deadline = time.time() + 5
+        while not job.finished and time.time() < deadline:
+            time.sleep(0.01)
+        return self.manager.get(job.id)
+    
+    def test_job_result(self):
+        """Test that a finished job carries its result."""
+        job = self.manager.submit('a', lambda x: x * 2, 21)
+        
+        job = self.wait(job)
+        
+        self.assertEqual(job.status, DONE)
+        self.assertEqual(job.to_dict(), {'job_id': job.id, 'status': DONE, 'result': 42})
+    
+    def test_failed_job(self):
+        """Test that exceptions are reported on the job."""
+        def fail():
+            raise ValueError('bad trip')
+        
+        job = self.wait(self.manager.submit('a', fail))
+        
+        self.assertEqual(job.status, FAILED)
+        self.assertEqual(job.error, 'bad trip')
+    
+    def test_identical_in_flight_jobs_are_coalesced(self):
+        """Test that the same key shares one running job."""
+        release = threading.Event()
+        calls = []
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return 'done'
+        
+        first = self.manager.submit('trip', compute)
+        second = self.manager.submit('trip', compute)
+        release.set()
+        self.wait(first)
+        
+        self.assertIs(first, second)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.manager.stats()['coalesced'], 1)
+    
+    def test_finished_job_is_not_coalesced(self):
+        """Test that a new submission after completion starts a new job."""
+        first = self.wait(self.manager.submit('trip', lambda: 1))
+        
+        second = self.wait(self.manager.submit('trip', lambda: 2))
+        
+        self.assertIsNot(first, second)
+        self.assertEqual(second.result, 2)
+    
+    def test_finished_job_has_finish_time(self):
+        """Test that a job reads as finished only once its finish time is set."""
+        job = self.wait(self.manager.submit('trip', lambda: 1))
+        
+        self.assertTrue(job.finished)
+        self.assertIsNotNone(job.finished_at)
+    
+    def test_purge_skips_jobs_without_finish_time(self):
+        """Test that polling does not fail on a finished job whose finish time is not set."""
+        job = Job(id='half', key='trip', status=DONE)
+        self.manager._jobs[job.id] = job
+        
+        self.assertIs(self.manager.get('half'), job)
+    
+    def test_unknown_job(self):
+        """Test that unknown ids return None."""
+        self.assertIsNone(self.manager.get('missing'))
+
+if __name__ == '__main__':
+    unittest.main()
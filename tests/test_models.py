@@ -0,0 +1,40 @@
+import unittest
+from datetime import datetime
+from models import Forecast, RoutePoint, Stop
+
+class TestStop(unittest.TestCase):
+    """Test cases for the stop model and its serialisation."""
+    
+    def test_to_dict(self):
+        """Test that a stop serialises to the keys used by the template and JSON results."""
+        stop = Stop('Gävle', datetime(2024, 1, 1, 12, 30), Forecast(2.5, 0.4, 6.1, 'https://icon.png'))
+        
+        self.assertEqual(stop.to_dict(), {
+            'City': 'Gävle',
+            'Time': '2024-01-01 12:30:00',
+            'Temperature': 2.5,
+            'Precipitation': 0.4,
+            'WindSpeed': 6.1,
+            'IconURL': 'https://icon.png'
+        })
+    
+    def test_stop_without_forecast(self):
+        """Test that a failed lookup serialises with empty values and its error."""
+        stop = Stop('Unknown Location', datetime(2024, 1, 1, 12, 0), error='boom')
+        
+        data = stop.to_dict()
+        
+        self.assertIsNone(stop.temperature)
+        self.assertIsNone(data['Temperature'])
+        self.assertEqual(data['Error'], 'boom')
+    
+    def test_slotted(self):
+        """Test that the models carry no per-instance dictionary."""
+        stop = Stop('Gävle', datetime(2024, 1, 1), Forecast(1.0))
+        
+        self.assertFalse(hasattr(stop, '__dict__'))
+        self.assertFalse(hasattr(stop.forecast, '__dict__'))
+        self.assertEqual(RoutePoint(59.0, 18.0, datetime(2024, 1, 1)).lat, 59.0)
+
+if __name__ == '__main__':
+    unittest.main()
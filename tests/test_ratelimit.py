@@ -0,0 +1,142 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import requests_mock
+from ratelimit import (
+    QuotaExceeded,
+    RateLimit,
+    RateLimitExceeded,
+    RateLimiter,
+    SQLiteBucketStore,
+    bucket_key,
+    parse_provider_values
+)
+from transport import ProviderTransport, TransportSettings
+
+class FakeClock:
+    """Clock whose sleep advances the time instead of waiting."""
+
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+def limiter(store=None, max_wait=2.0, clock=None, **limits):
+    """Build a limiter on a fake clock."""
+    clock = clock or FakeClock()
+    return RateLimiter(limits, store, max_wait=max_wait, clock=clock, sleep=clock.sleep), clock
+
+class TestRateLimiter(unittest.TestCase):
+    """Test cases for the token buckets and daily quotas."""
+
+    def test_burst_then_smooth_pacing(self):
+        """Test that a full bucket passes a burst and later callers are spaced 1/rate apart."""
+        rate_limiter, clock = limiter(google=RateLimit(rate=10, burst=2))
+
+        waits = [rate_limiter.acquire('google') for _ in range(4)]
+
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertAlmostEqual(waits[2], 0.1, places=5)
+        self.assertAlmostEqual(waits[3], 0.1, places=5)
+        self.assertEqual(rate_limiter.stats()['google']['queued'], 2)
+
+    def test_refuses_when_queue_is_too_long(self):
+        """Test that a caller is refused instead of waiting longer than max_wait."""
+        rate_limiter, clock = limiter(max_wait=0.5, weatherapi=RateLimit(rate=1, burst=1))
+        rate_limiter.acquire('weatherapi')
+
+        with self.assertRaises(RateLimitExceeded) as raised:
+            rate_limiter.acquire('weatherapi')
+
+        self.assertAlmostEqual(raised.exception.retry_after, 1.0)
+        self.assertEqual(rate_limiter.stats()['weatherapi']['refused'], 1)
+
+    def test_daily_quota(self):
+        """Test that the quota is counted per UTC day and resets at midnight."""
+        clock = FakeClock(now=1_700_000_000.0 - 1_700_000_000.0 % 86400 + 86399.0)
+        rate_limiter, _ = limiter(clock=clock, google=RateLimit(rate=100, burst=100, daily=2))
+        rate_limiter.acquire('google', 'key-a')
+        rate_limiter.acquire('google', 'key-a')
+
+        with self.assertRaises(QuotaExceeded) as raised:
+            rate_limiter.acquire('google', 'key-a')
+        rate_limiter.acquire('google', 'key-b')
+        self.assertAlmostEqual(raised.exception.retry_after, 1.0)
+
+        clock.now += 1.0
+        rate_limiter.acquire('google', 'key-a')
+        self.assertEqual(rate_limiter.quota_used('google', 'key-a'), 1)
+
+    def test_unlimited_provider(self):
+        """Test that providers without a limit are never delayed."""
+        rate_limiter, clock = limiter()
+
+        self.assertEqual(rate_limiter.acquire('openai'), 0.0)
+        self.assertEqual(clock.sleeps, [])
+
+    def test_bucket_key_hides_api_key(self):
+        """Test that the API key is hashed and different keys get different buckets."""
+        self.assertEqual(bucket_key('metno', None), 'metno')
+        self.assertNotIn('secret', bucket_key('google', 'secret'))
+        self.assertNotEqual(bucket_key('google', 'a'), bucket_key('google', 'b'))
+
+    def test_parse_provider_values(self):
+        """Test parsing of the environment settings, skipping invalid items."""
+        self.assertEqual(parse_provider_values('google=50, weatherapi=2.5,,bad=x'),
+                         {'google': 50.0, 'weatherapi': 2.5})
+
+class TestSQLiteBucketStore(unittest.TestCase):
+    """Test cases for buckets shared between processes."""
+
+    def setUp(self):
+        """Create a temporary database file."""
+        handle, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(handle)
+
+    def tearDown(self):
+        """Remove the temporary database file."""
+        os.remove(self.path)
+
+    def test_limiters_share_tokens(self):
+        """Test that two limiters on the same file (as in two workers) draw from one bucket."""
+        clock = FakeClock()
+        limits = {'google': RateLimit(rate=1, burst=2, daily=3)}
+        first = RateLimiter(limits, SQLiteBucketStore(self.path), max_wait=0.1, clock=clock, sleep=clock.sleep)
+        second = RateLimiter(limits, SQLiteBucketStore(self.path), max_wait=0.1, clock=clock, sleep=clock.sleep)
+
+        first.acquire('google', 'key')
+        second.acquire('google', 'key')
+        with self.assertRaises(RateLimitExceeded):
+            first.acquire('google', 'key')
+
+        clock.now += 1.0
+        second.acquire('google', 'key')
+        with self.assertRaises(QuotaExceeded):
+            first.acquire('google', 'key')
+        self.assertEqual(first.quota_used('google', 'key'), 3)
+
+class TestTransportIntegration(unittest.TestCase):
+    """Test cases for the limiter in front of the pooled transport."""
+
+    def test_refused_request_is_not_sent(self):
+        """Test that a request refused by the limiter never reaches the provider."""
+        rate_limiter, _ = limiter(max_wait=0.0, test=RateLimit(rate=1, burst=1))
+        transport = ProviderTransport('test', TransportSettings())
+        with patch('transport.get_rate_limiter', return_value=rate_limiter), requests_mock.Mocker() as m:
+            m.get('https://example.com/a', json={})
+            transport.get('https://example.com/a', params={'key': 'k'})
+            with self.assertRaises(RateLimitExceeded):
+                transport.get('https://example.com/a', params={'key': 'k'})
+
+        self.assertEqual(m.call_count, 1)
+        self.assertEqual(rate_limiter.stats()['test']['refused'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
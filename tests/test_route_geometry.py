@@ -0,0 +1,177 @@
+import unittest
+from unittest.mock import patch
+import numpy as np
+import route_geometry
+from route_geometry import (
+    decode_polyline,
+    segment_lengths_km,
+    cumulative_distances_km,
+    step_profile,
+    interpolate,
+    RouteProfile,
+    sample_route,
+    CompactRoute
+)
+
+class TestDecodePolyline(unittest.TestCase):
+    """Test cases for the vectorized polyline decoder."""
+    
+    def test_decode_reference_polyline(self):
+        """Test the reference example from the encoded polyline format documentation."""
+        points = decode_polyline('_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+        
+        self.assertEqual(points.shape, (3, 2))
+        np.testing.assert_allclose(points, [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)])
+    
+    def test_decode_empty(self):
+        """Test that an empty polyline decodes to an empty array."""
+        self.assertEqual(decode_polyline('').shape, (0, 2))
+    
+    def test_decode_truncated(self):
+        """Test that a truncated polyline is rejected."""
+        with self.assertRaises(ValueError):
+            decode_polyline('_p~iF~ps|U_ulL')
+
+class TestDistances(unittest.TestCase):
+    """Test cases for distance helpers."""
+    
+    def test_cumulative_distances(self):
+        """Test cumulative distance starts at zero and is monotonic."""
+        distances = cumulative_distances_km([(59.0, 18.0), (59.5, 18.0), (60.0, 18.0)])
+        self.assertEqual(distances[0], 0.0)
+        self.assertAlmostEqual(distances[1] * 2, distances[2], places=6)
+    
+    def test_cumulative_distances_empty(self):
+        """Test that an empty polyline has no distances."""
+        self.assertEqual(len(cumulative_distances_km([])), 0)
+    
+    def test_segment_lengths(self):
+        """Test that one degree of latitude is roughly 111 km and one of longitude shrinks with latitude."""
+        lengths = segment_lengths_km([(59.0, 18.0), (60.0, 18.0), (60.0, 19.0)])
+        self.assertAlmostEqual(lengths[0], 111.2, delta=0.2)
+        self.assertAlmostEqual(lengths[1], 55.6, delta=0.2)
+
+class TestArrivalOffsets(unittest.TestCase):
+    """Test cases for the single-response arrival time engine."""
+    
+    def setUp(self):
+        """Build a straight route with a slow first step and a fast second step."""
+        self.waypoints = [(59.0, 18.0), (59.5, 18.0), (60.0, 18.0)]
+        self.steps = [
+            {'distance': {'value': 50000}, 'duration': {'value': 3600}},
+            {'distance': {'value': 50000}, 'duration': {'value': 1800}}
+        ]
+    
+    def test_step_profile(self):
+        """Test that step distances and durations are accumulated once."""
+        distances, durations = step_profile(self.steps)
+        self.assertEqual(distances.tolist(), [0.0, 50000, 100000])
+        self.assertEqual(durations.tolist(), [0.0, 3600, 5400])
+    
+    def test_interpolate_clamps(self):
+        """Test interpolation inside and outside the breakpoints."""
+        self.assertEqual(interpolate(5, [0, 10], [0, 100]), 50)
+        self.assertEqual(interpolate(-1, [0, 10], [0, 100]), 0)
+        self.assertEqual(interpolate(11, [0, 10], [0, 100]), 100)
+    
+    def test_offsets_follow_step_durations(self):
+        """Test that each vertex gets the duration of the steps before it."""
+        profile = RouteProfile(self.waypoints, self.steps)
+        offsets = profile.offset_at_km(profile.polyline_km)
+        self.assertAlmostEqual(offsets[0], 0.0)
+        self.assertAlmostEqual(offsets[1], 3600, delta=1)
+        self.assertAlmostEqual(offsets[2], 5400, delta=1)
+    
+    def test_offsets_without_steps(self):
+        """Test that a route without steps yields zero offsets."""
+        profile = RouteProfile(self.waypoints, [])
+        self.assertEqual(profile.offset_at_km(profile.polyline_km).tolist(), [0.0, 0.0, 0.0])
+
+class TestSampleRoute(unittest.TestCase):
+    """Test cases for distance and time uniform sampling."""
+    
+    def setUp(self):
+        """Build a route with dense vertices at the start and a slow first half."""
+        self.waypoints = [(59.0, 18.0), (59.01, 18.0), (59.02, 18.0), (59.5, 18.0), (60.0, 18.0)]
+        self.steps = [
+            {'distance': {'value': 55000}, 'duration': {'value': 3600}},
+            {'distance': {'value': 55000}, 'duration': {'value': 1800}}
+        ]
+    
+    def test_count_is_exact_and_uniform(self):
+        """Test that a target count gives evenly spaced points regardless of vertex density."""
+        samples = sample_route(self.waypoints, self.steps, count=5)
+        
+        self.assertEqual(len(samples), 5)
+        latitudes = [lat for lat, _, _ in samples]
+        for expected, actual in zip([59.0, 59.25, 59.5, 59.75, 60.0], latitudes):
+            self.assertAlmostEqual(actual, expected, places=6)
+    
+    def test_spacing_km(self):
+        """Test fixed distance spacing always ends at the destination."""
+        samples = sample_route(self.waypoints, self.steps, spacing_km=50)
+        
+        self.assertEqual(len(samples), 4)
+        self.assertAlmostEqual(samples[-1][0], 60.0)
+    
+    def test_spacing_minutes(self):
+        """Test fixed time spacing follows the step durations."""
+        samples = sample_route(self.waypoints, self.steps, spacing_minutes=30)
+        
+        self.assertEqual([round(offset) for _, _, offset in samples], [0, 1800, 3600, 5400])
+        self.assertAlmostEqual(samples[1][0], 59.25, places=3)
+        self.assertAlmostEqual(samples[2][0], 59.5, places=3)
+    
+    def test_max_samples(self):
+        """Test that a tiny spacing is capped to max_samples points."""
+        self.assertEqual(len(sample_route(self.waypoints, self.steps, spacing_km=0.1, max_samples=20)), 20)
+    
+    @patch('route_geometry._spaced', wraps=route_geometry._spaced)
+    @patch('route_geometry._evenly', wraps=route_geometry._evenly)
+    def test_oversized_sampling_builds_only_max_samples(self, mock_evenly, mock_spaced):
+        """Test that a huge count or a tiny spacing never builds more than max_samples positions."""
+        for options in ({'count': 10 ** 9}, {'spacing_km': 1e-9}, {'spacing_minutes': 1e-9}):
+            with self.subTest(options=options):
+                samples = sample_route(self.waypoints, self.steps, max_samples=20, **options)
+                
+                self.assertEqual(len(samples), 20)
+                self.assertEqual(mock_evenly.call_args[0][1], 20)
+        self.assertEqual(mock_evenly.call_count, 3)
+        mock_spaced.assert_not_called()
+    
+    def test_non_finite_options(self):
+        """Test that NaN and infinite spacings are rejected."""
+        for options in ({'spacing_km': float('nan')}, {'spacing_minutes': float('inf')}):
+            with self.subTest(options=options):
+                with self.assertRaises(ValueError):
+                    sample_route(self.waypoints, self.steps, **options)
+    
+    def test_single_stop_keeps_both_ends(self):
+        """Test that count=1 still returns the start and the destination."""
+        samples = sample_route(self.waypoints, self.steps, count=1)
+        
+        self.assertEqual([(lat, lng) for lat, lng, _ in samples], [(59.0, 18.0), (60.0, 18.0)])
+    
+    def test_conflicting_options(self):
+        """Test that only one sampling option may be given."""
+        with self.assertRaises(ValueError):
+            sample_route(self.waypoints, self.steps, count=5, spacing_km=10)
+
+class TestCompactRoute(unittest.TestCase):
+    """Test cases for the cached route representation."""
+    
+    def test_round_trip(self):
+        """Test that steps keep their distance and duration through the JSON form."""
+        steps = [{'distance': {'value': 1200}, 'duration': {'value': 90}, 'html_instructions': 'Turn left'},
+                 {'distance': {'value': 30500}, 'duration': {'value': 1260}}]
+        route = CompactRoute.from_directions('_p~iF~ps|U_ulLnnqC', steps)
+        
+        rebuilt = CompactRoute.from_dict(route.to_dict())
+        
+        self.assertEqual(rebuilt.polyline, '_p~iF~ps|U_ulLnnqC')
+        self.assertEqual(rebuilt.steps(), [{'distance': {'value': 1200.0}, 'duration': {'value': 90.0}},
+                                           {'distance': {'value': 30500.0}, 'duration': {'value': 1260.0}}])
+        np.testing.assert_allclose(step_profile(rebuilt.steps())[1], step_profile(steps)[1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from singleflight import SingleFlight, get_singleflight_stats
+
+class TestSingleFlight(unittest.TestCase):
+    """Test cases for coalescing identical concurrent calls."""
+
+    def setUp(self):
+        """Create a flight and a call that blocks until released."""
+        self.flight = SingleFlight('test')
+        self.release = threading.Event()
+        self.calls = 0
+
+    def slow_call(self, value):
+        """Count the call and wait until the test releases it."""
+        self.calls += 1
+        self.release.wait(5)
+        return value
+
+    def wait_for_followers(self, count):
+        """Wait until ``count`` callers are waiting on the call in flight."""
+        deadline = time.monotonic() + 5
+        while self.flight.stats()['shared'] < count and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+    def test_threads_share_one_call(self):
+        """Test that concurrent threads with the same key get the result of a single call."""
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(self.flight.do, 'a', self.slow_call, 42) for _ in range(4)]
+            self.wait_for_followers(3)
+            self.release.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True, True])
+        self.assertTrue(all(value == 42 for value, _ in results))
+        self.assertEqual(self.flight.stats(), {'calls': 1, 'shared': 3, 'in_flight': 0})
+
+    def test_error_is_shared_and_not_kept(self):
+        """Test that waiting callers get the leader's exception and the next call runs again."""
+        def failing():
+            self.release.wait(5)
+            raise ValueError('down')
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(self.flight.do, 'a', failing)]
+            time.sleep(0.01)
+            futures.append(executor.submit(self.flight.do, 'a', failing))
+            self.wait_for_followers(1)
+            self.release.set()
+            for future in futures:
+                with self.assertRaises(ValueError):
+                    future.result()
+
+        self.assertEqual(self.flight.do('a', lambda: 'ok'), ('ok', False))
+
+    def test_async_tasks_share_one_call(self):
+        """Test that async tasks await the same call and that a thread can join it too."""
+        async def run():
+            tasks = [asyncio.create_task(self.flight.do_async('a', self.slow_call, 7)) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            thread_result = asyncio.create_task(asyncio.to_thread(self.flight.do, 'a', self.slow_call, 7))
+            await asyncio.to_thread(self.wait_for_followers, 3)
+            self.release.set()
+            return await asyncio.gather(*tasks, thread_result)
+
+        results = asyncio.run(run())
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual([value for value, _ in results], [7, 7, 7, 7])
+        self.assertEqual(self.flight.stats()['shared'], 3)
+        self.assertIn('test', get_singleflight_stats())
+
+if __name__ == '__main__':
+    unittest.main()
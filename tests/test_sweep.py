@@ -0,0 +1,86 @@
+import unittest
+from unittest.mock import patch
+from datetime import datetime, timedelta
+from forecast_index import HourlySeries
+from models import Forecast, RoutePoint, Stop
+from sweep import departure_candidates, score_stops, sweep_departures
+
+def stop(temperature, precipitation=0.0, wind_speed=3.0):
+    """Build a stop as produced by build_stop."""
+    return Stop('Test City', datetime(2024, 1, 1, 12, 0), Forecast(temperature, precipitation, wind_speed))
+
+class TestDepartureCandidates(unittest.TestCase):
+    """Test cases for candidate departure generation."""
+    
+    def test_inclusive_window(self):
+        """Test that both ends of the window are candidates."""
+        candidates = departure_candidates(datetime(2024, 1, 1, 6), datetime(2024, 1, 1, 10), timedelta(hours=2))
+        self.assertEqual([c.hour for c in candidates], [6, 8, 10])
+    
+    def test_too_many_candidates(self):
+        """Test that oversized windows are rejected."""
+        with self.assertRaises(ValueError):
+            departure_candidates(datetime(2024, 1, 1), datetime(2024, 1, 3), timedelta(minutes=15))
+
+class TestScoreStops(unittest.TestCase):
+    """Test cases for departure scoring."""
+    
+    def test_benign_weather_scores_zero(self):
+        """Test that dry, calm, mild weather has no penalty."""
+        self.assertEqual(score_stops([stop(10.0)]), 0.0)
+    
+    def test_hazards_add_penalty(self):
+        """Test that rain, wind and near-zero temperatures are penalised."""
+        self.assertGreater(score_stops([stop(0.5)]), 0.0)
+        self.assertGreater(score_stops([stop(10.0, precipitation=3.0)]), 0.0)
+        self.assertGreater(score_stops([stop(10.0, wind_speed=15.0)]), 0.0)
+
+class TestSweepDepartures(unittest.TestCase):
+    """Test cases for the departure sweep."""
+    
+    @patch('sweep.get_forecast_days')
+    @patch('sweep.get_city_name')
+    @patch('sweep.plan_route_points')
+    def test_route_and_forecasts_fetched_once(self, mock_plan, mock_city, mock_series):
+        """Test that all candidates share one route and one series per cell and day."""
+        start = datetime(2024, 1, 1, 6, 0)
+        mock_plan.return_value = [RoutePoint(59.0, 18.0, start), RoutePoint(60.0, 18.0, start + timedelta(hours=1))]
+        mock_city.return_value = 'Test City'
+        day = HourlySeries.from_rows([
+            (datetime(2024, 1, 1, hour, 0), Forecast(5.0, 4.0 if hour < 9 else 0.0, 3.0, 'icon.png'))
+            for hour in range(24)
+        ])
+        mock_series.side_effect = lambda lat, lng, dates: {date_str: day for date_str in dates}
+        
+        result = sweep_departures('A', 'B', start, datetime(2024, 1, 1, 10, 0), timedelta(hours=2))
+        
+        mock_plan.assert_called_once()
+        self.assertEqual(mock_city.call_count, 2)
+        self.assertEqual(mock_series.call_count, 2)
+        self.assertEqual([row['departure'] for row in result['departures']],
+                         ['2024-01-01 06:00', '2024-01-01 08:00', '2024-01-01 10:00'])
+        self.assertEqual(result['departures'][1]['arrival'], '2024-01-01 09:00')
+        self.assertEqual(result['best'], '2024-01-01 10:00')
+    
+    @patch('sweep.get_forecast_days')
+    @patch('sweep.get_city_name')
+    @patch('sweep.plan_route_points')
+    def test_days_fetched_per_cell(self, mock_plan, mock_city, mock_series):
+        """Test that a window crossing midnight costs one forecast request per cell, not per day."""
+        start = datetime(2024, 1, 1, 20, 0)
+        mock_plan.return_value = [RoutePoint(59.0, 18.0, start), RoutePoint(60.0, 18.0, start + timedelta(hours=2))]
+        mock_city.return_value = 'Test City'
+        mock_series.side_effect = lambda lat, lng, dates: {
+            date_str: HourlySeries.from_rows([(datetime.strptime(date_str, '%Y-%m-%d'), Forecast(1.0, 0.0, 3.0))])
+            for date_str in dates
+        }
+        
+        result = sweep_departures('A', 'B', start, datetime(2024, 1, 2, 4, 0), timedelta(hours=2))
+        
+        self.assertEqual(mock_series.call_count, 2)
+        self.assertEqual(sorted(call.args[2] for call in mock_series.call_args_list),
+                         [['2024-01-01', '2024-01-02'], ['2024-01-01', '2024-01-02']])
+        self.assertEqual(len(result['departures']), 5)
+
+if __name__ == '__main__':
+    unittest.main()
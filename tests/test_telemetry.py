@@ -0,0 +1,95 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import telemetry
+
+class TestMetrics(unittest.TestCase):
+    """Test cases for counters, histograms and the Prometheus rendering."""
+
+    def test_counter_render(self):
+        """Test that labelled counter values are rendered with escaped labels."""
+        counter = telemetry.Counter('test_calls_total', 'Calls.', ['provider'])
+        counter.inc(provider='google')
+        counter.inc(2, provider='we"ird')
+
+        lines = counter.render()
+
+        self.assertIn('# TYPE test_calls_total counter', lines)
+        self.assertIn('test_calls_total{provider="google"} 1', lines)
+        self.assertIn('test_calls_total{provider="we\\"ird"} 2', lines)
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test that bucket counts accumulate and the sum and count are exported."""
+        histogram = telemetry.Histogram('test_seconds', 'Latency.', ['stage'], buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value, stage='route')
+
+        lines = histogram.render()
+
+        self.assertIn('test_seconds_bucket{stage="route",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{stage="route",le="1.0"} 2', lines)
+        self.assertIn('test_seconds_bucket{stage="route",le="+Inf"} 3', lines)
+        self.assertIn('test_seconds_sum{stage="route"} 5.55', lines)
+        self.assertIn('test_seconds_count{stage="route"} 3', lines)
+        self.assertEqual(histogram.count(stage='route'), 3)
+
+    def test_collectors_are_rendered(self):
+        """Test that registered collectors are included in the metrics output."""
+        self.assertIn('tripweather_stage_seconds', telemetry.render_metrics())
+
+class TestTracing(unittest.TestCase):
+    """Test cases for span trees."""
+
+    def test_span_tree_across_threads(self):
+        """Test that work submitted with in_context is recorded under the request's trace."""
+        def lookup(name):
+            with telemetry.span(name, cached=False):
+                time.sleep(0.001)
+
+        with telemetry.trace('trip') as root:
+            with telemetry.span('route'):
+                pass
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                list(executor.map(telemetry.in_context(lookup), ['geocode', 'forecast']))
+
+        self.assertEqual(sorted(child.name for child in root.children), ['forecast', 'geocode', 'route'])
+        self.assertIs(telemetry.recent_traces[-1], root)
+        self.assertIsNone(telemetry.current_span())
+        self.assertIn('geocode', telemetry.server_timing(root))
+
+    def test_span_outside_trace_is_measured(self):
+        """Test that stages outside a trace still feed the stage histogram."""
+        before = telemetry.STAGE_SECONDS.count(stage='test-orphan')
+        traces = len(telemetry.recent_traces)
+
+        with telemetry.span('test-orphan'):
+            pass
+
+        self.assertEqual(telemetry.STAGE_SECONDS.count(stage='test-orphan'), before + 1)
+        self.assertEqual(len(telemetry.recent_traces), traces)
+
+class TestSamplingProfiler(unittest.TestCase):
+    """Test cases for the sampling profiler."""
+
+    def test_samples_busy_thread(self):
+        """Test that a busy function shows up in the collapsed stacks."""
+        stop = threading.Event()
+
+        def busy_loop():
+            while not stop.is_set():
+                sum(range(1000))
+
+        worker = threading.Thread(target=busy_loop)
+        worker.start()
+        try:
+            with telemetry.SamplingProfiler(interval=0.001) as profiler:
+                time.sleep(0.05)
+        finally:
+            stop.set()
+            worker.join()
+
+        self.assertIn('busy_loop', profiler.collapsed())
+
+if __name__ == '__main__':
+    unittest.main()
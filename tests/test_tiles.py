@@ -0,0 +1,143 @@
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+import numpy as np
+from forecast_index import HourlySeries, wall_clock_epoch
+from tiles import Tile, TileStore
+
+def day_series(date_str, step=1, icon='//cdn/sun.png'):
+    """A series with every ``step``-th hour of a day."""
+    day = wall_clock_epoch(datetime.strptime(date_str, '%Y-%m-%d'))
+    hours = list(range(0, 24, step))
+    return HourlySeries(
+        [day + hour * 3600 for hour in hours],
+        [float(hour) for hour in hours],
+        [0.1 * hour for hour in hours],
+        [2.0] * len(hours),
+        [icon if hour % 2 else None for hour in hours]
+    )
+
+def build(name='e4', ttl=3600, cell=(59.3, 18.1)):
+    """A two-day tile with an hourly cell and a 6-hourly cell."""
+    forecasts = {
+        cell: {'2026-10-16': day_series('2026-10-16'), '2026-10-17': day_series('2026-10-17')},
+        (59.4, 18.0): {'2026-10-16': day_series('2026-10-16', step=6)},
+    }
+    return Tile.build(name, datetime(2026, 10, 16), 48, forecasts, {(59.33, 18.07): 'Stockholm'}, ttl)
+
+class TestTile(unittest.TestCase):
+    """Test cases for building and reading corridor tiles."""
+
+    def test_series_round_trip(self):
+        """Test that a day read from a tile equals the series it was built from."""
+        tile = build()
+
+        for date_str in ('2026-10-16', '2026-10-17'):
+            series = tile.series(0, date_str)
+            expected = day_series(date_str)
+            self.assertEqual(list(series.epochs), list(expected.epochs))
+            self.assertEqual(list(series.temperature), list(expected.temperature))
+            self.assertEqual(list(series.precipitation), list(expected.precipitation))
+            self.assertEqual(series.icons, expected.icons)
+
+    def test_missing_hours_are_left_out(self):
+        """Test that hours the forecast does not have are not returned as values."""
+        tile = build()
+
+        self.assertEqual(len(tile.series(1, '2026-10-16')), 4)
+        self.assertEqual(len(tile.series(1, '2026-10-17')), 0)
+
+    def test_covers(self):
+        """Test that only days completely inside the tile are covered."""
+        tile = build()
+
+        self.assertTrue(tile.covers('2026-10-16'))
+        self.assertTrue(tile.covers('2026-10-17'))
+        self.assertFalse(tile.covers('2026-10-15'))
+        self.assertFalse(tile.covers('2026-10-18'))
+
+    def test_save_and_load_memory_maps(self):
+        """Test that a saved tile loads with memory-mapped arrays and the same contents."""
+        tile = build()
+        with tempfile.TemporaryDirectory() as directory:
+            path = tile.save(directory)
+            loaded = Tile.load(path)
+
+            self.assertIsInstance(loaded.values, np.memmap)
+            self.assertEqual(loaded.cells, tile.cells)
+            self.assertEqual(loaded.cities, tile.cities)
+            self.assertEqual(list(loaded.series(0, '2026-10-17').temperature),
+                             list(tile.series(0, '2026-10-17').temperature))
+
+class TestTileStore(unittest.TestCase):
+    """Test cases for serving tiles from a directory."""
+
+    def setUp(self):
+        """Create a store on a temporary directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = TileStore(self.directory.name, check_interval=0)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_lookup(self):
+        """Test that covered cells and days are answered and others are not."""
+        self.store.save(build())
+
+        days = self.store.forecast_days((59.3, 18.1), ['2026-10-16', '2026-10-17'])
+        self.assertEqual(sorted(days), ['2026-10-16', '2026-10-17'])
+        self.assertIsNone(self.store.forecast_days((59.3, 18.1), ['2026-10-18']))
+        self.assertIsNone(self.store.forecast_days((60.0, 18.1), ['2026-10-16']))
+        self.assertEqual(self.store.city((59.33, 18.07)), 'Stockholm')
+        self.assertIsNone(self.store.city((59.34, 18.07)))
+        self.assertEqual((self.store.hits, self.store.misses), (2, 3))
+
+    @patch('tiles.time.time')
+    def test_expired_tile_is_not_served(self, mock_time):
+        """Test that a tile is not used after it expires."""
+        mock_time.return_value = 1000.0
+        self.store.save(build(ttl=60))
+        mock_time.return_value = 1061.0
+
+        self.assertIsNone(self.store.forecast_days((59.3, 18.1), ['2026-10-16']))
+        self.assertIsNone(self.store.city((59.33, 18.07)))
+
+    def test_tiles_written_by_another_process_are_picked_up(self):
+        """Test that a reader loads new and rebuilt tiles from the directory."""
+        reader = TileStore(self.directory.name, check_interval=0)
+        self.assertIsNone(reader.city((59.33, 18.07)))
+
+        self.store.save(build())
+        self.assertEqual(reader.city((59.33, 18.07)), 'Stockholm')
+
+        time.sleep(0.01)
+        self.store.save(build(cell=(59.5, 18.1)))
+        self.assertIsNotNone(reader.forecast_days((59.5, 18.1), ['2026-10-16']))
+        self.assertIsNone(reader.forecast_days((59.3, 18.1), ['2026-10-16']))
+        self.assertEqual(len([name for name in os.listdir(self.directory.name) if name.endswith('.npy')]), 2)
+
+    def test_corridor_names_sharing_a_prefix(self):
+        """Test that saving a corridor keeps the arrays of a corridor whose name starts with the same text."""
+        self.store.save(build(name='E4-north', cell=(59.5, 18.1)))
+        time.sleep(0.01)
+        self.store.save(build(name='E4'))
+        time.sleep(0.01)
+        self.store.save(build(name='E4'))
+
+        reader = TileStore(self.directory.name, check_interval=0)
+        self.assertIsNotNone(reader.forecast_days((59.5, 18.1), ['2026-10-16']))
+        self.assertIsNotNone(reader.forecast_days((59.3, 18.1), ['2026-10-16']))
+        self.assertEqual(len([name for name in os.listdir(self.directory.name) if name.endswith('.npy')]), 4)
+
+    def test_disabled_store(self):
+        """Test that a store without a directory answers nothing."""
+        store = TileStore(None)
+
+        self.assertIsNone(store.forecast_days((59.3, 18.1), ['2026-10-16']))
+        self.assertIsNone(store.city((59.33, 18.07)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import unittest
+from unittest.mock import patch
+import requests
+import requests_mock
+from transport import CircuitOpenError, ProviderTransport, TransportSettings, _retry_after_seconds
+
+class TestProviderTransport(unittest.TestCase):
+    """Test cases for the pooled provider transport."""
+    
+    def setUp(self):
+        """Create a transport without backoff delays."""
+        self.transport = ProviderTransport("test", TransportSettings(max_retries=2, backoff_factor=0))
+    
+    def test_get_success(self):
+        """Test a successful request is returned without retries."""
+        with requests_mock.Mocker() as m:
+            m.get("https://example.com/a", json={"ok": True})
+            response = self.transport.get("https://example.com/a", params={"q": "1"})
+        
+        self.assertEqual(response.json(), {"ok": True})
+        self.assertEqual(m.last_request.qs, {"q": ["1"]})
+        self.assertEqual(self.transport.stats()["retries"], 0)
+    
+    @patch('transport.time.sleep')
+    def test_retries_on_server_error(self, mock_sleep):
+        """Test that 503 responses are retried until a success."""
+        with requests_mock.Mocker() as m:
+            m.get("https://example.com/a", [{"status_code": 503}, {"status_code": 200, "json": {}}])
+            response = self.transport.get("https://example.com/a")
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.transport.stats()["requests"], 2)
+        self.assertEqual(self.transport.stats()["retries"], 1)
+    
+    @patch('transport.time.sleep')
+    def test_returns_last_response_after_retries(self, mock_sleep):
+        """Test that the final 429 is returned once retries are exhausted."""
+        with requests_mock.Mocker() as m:
+            m.get("https://example.com/a", status_code=429, headers={"Retry-After": "1"})
+            response = self.transport.get("https://example.com/a")
+        
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(self.transport.stats()["requests"], 3)
+        mock_sleep.assert_called_with(1.0)
+    
+    @patch('transport.time.sleep')
+    def test_connection_error_raises_after_retries(self, mock_sleep):
+        """Test that connection errors propagate once retries are exhausted."""
+        with requests_mock.Mocker() as m:
+            m.get("https://example.com/a", exc=requests.exceptions.ConnectionError)
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                self.transport.get("https://example.com/a")
+        
+        self.assertEqual(self.transport.stats()["failures"], 1)
+    
+    def test_base_url_redirects_requests(self):
+        """Test that a base_url sends the provider's paths to another host."""
+        transport = ProviderTransport("test", TransportSettings(base_url="http://127.0.0.1:9000/stub/"))
+        with requests_mock.Mocker() as m:
+            m.get("http://127.0.0.1:9000/stub/maps/api/geocode/json", json={"status": "OK"})
+            response = transport.get("https://maps.googleapis.com/maps/api/geocode/json", params={"latlng": "1,2"})
+        
+        self.assertEqual(response.json(), {"status": "OK"})
+        self.assertEqual(m.last_request.qs, {"latlng": ["1,2"]})
+    
+    @patch('transport.time.monotonic')
+    def test_circuit_opens_after_repeated_failures(self, mock_monotonic):
+        """Test that the circuit refuses calls after repeated 5xx and closes after a good trial call."""
+        mock_monotonic.return_value = 100.0
+        transport = ProviderTransport("test", TransportSettings(max_retries=0, failure_threshold=2, reset_timeout=30))
+        with requests_mock.Mocker() as m:
+            m.get("https://example.com/a", [{"status_code": 503}, {"status_code": 503}, {"status_code": 200}])
+            transport.get("https://example.com/a")
+            transport.get("https://example.com/a")
+            with self.assertRaises(CircuitOpenError) as raised:
+                transport.get("https://example.com/a")
+            self.assertEqual(m.call_count, 2)
+            self.assertEqual(raised.exception.retry_after, 30.0)
+            
+            mock_monotonic.return_value = 131.0
+            response = transport.get("https://example.com/a")
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(transport.stats()["circuit"], {"state": "closed", "trips": 1, "rejected": 1})
+    
+    @patch('transport.time.monotonic')
+    def test_failed_trial_call_reopens_circuit(self, mock_monotonic):
+        """Test that a half-open trial failing with a non-retried error does not leave the circuit stuck."""
+        mock_monotonic.return_value = 100.0
+        transport = ProviderTransport("test", TransportSettings(max_retries=0, failure_threshold=1, reset_timeout=30))
+        with requests_mock.Mocker() as m:
+            m.get("https://example.com/a", [
+                {"status_code": 503},
+                {"exc": requests.exceptions.ChunkedEncodingError("connection broken")},
+                {"status_code": 200},
+            ])
+            transport.get("https://example.com/a")
+            
+            mock_monotonic.return_value = 131.0
+            with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+                transport.get("https://example.com/a")
+            self.assertEqual(transport.stats()["circuit"]["state"], "open")
+            
+            mock_monotonic.return_value = 162.0
+            response = transport.get("https://example.com/a")
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(transport.stats()["circuit"]["state"], "closed")
+    
+    @patch('transport.time.monotonic')
+    def test_unsettled_trial_expires(self, mock_monotonic):
+        """Test that a trial call whose outcome was never recorded stops blocking after the cooldown."""
+        mock_monotonic.return_value = 100.0
+        transport = ProviderTransport("test", TransportSettings(failure_threshold=1, reset_timeout=30))
+        transport.breaker.record_failure()
+        mock_monotonic.return_value = 131.0
+        transport.breaker.allow()
+        
+        with self.assertRaises(CircuitOpenError):
+            transport.breaker.allow()
+        mock_monotonic.return_value = 162.0
+        transport.breaker.allow()
+        self.assertEqual(transport.breaker.state, "half_open")
+    
+    def test_retry_after_parsing(self):
+        """Test Retry-After header parsing."""
+        response = requests.Response()
+        self.assertIsNone(_retry_after_seconds(response))
+        response.headers["Retry-After"] = "2"
+        self.assertEqual(_retry_after_seconds(response), 2.0)
+
+if __name__ == '__main__':
+    unittest.main()
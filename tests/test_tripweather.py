@@ -1,18 +1,55 @@
+import asyncio
+import threading
 import unittest
+import numpy as np
+import requests
 from unittest.mock import patch, MagicMock
 from datetime import datetime, timedelta
+from forecast_index import HourlySeries
+from models import Forecast, RoutePoint, Stop
+from ratelimit import QuotaExceeded, RateLimitExceeded
+from route_geometry import CompactRoute
+from weather_providers import ProviderRouter, WeatherAPIProvider
 from tripweather import (
     Config,
     APIError,
+    STOP_LOOKUP_ERROR,
     get_route_data_detailed,
     get_weather_comment,
-    get_route_data,
     get_city_name,
     get_weatherAPI_forecast,
+    get_forecast_days,
+    fetch_forecast_days,
+    build_weather_provider,
+    get_weather_router,
     extract_weatherAPI_details,
-    find_weather_along_route
+    find_weather_along_route,
+    find_weather_along_route_async,
+    iter_weather_along_route,
+    lookup_points,
+    geocode_cache,
+    forecast_cache,
+    route_cache,
+    route_key,
+    comment_cache,
+    summarize_stops,
+    stream_weather_comment,
+    get_trip_comment,
+    plan_forecast_requests
 )
 
+def stop(city, temperature, precipitation=0.0, wind_speed=3.0):
+    """Build a stop, without a forecast when temperature is None."""
+    forecast = Forecast(temperature, precipitation, wind_speed) if temperature is not None else None
+    return Stop(city, datetime(2024, 1, 1, 12, 0), forecast)
+
+def forecast_days(forecast):
+    """Build a get_forecast_days replacement answering every day with one forecast."""
+    def days(lat, lng, dates):
+        weather = forecast(lat) if callable(forecast) else forecast
+        return {date_str: HourlySeries.from_rows([(datetime(2024, 1, 1, 12, 0), weather)]) for date_str in dates}
+    return days
+
 class TestConfig(unittest.TestCase):
     """Test cases for the Config class."""
     
@@ -44,7 +81,11 @@ class TestConfig(unittest.TestCase):
 class TestRouteData(unittest.TestCase):
     """Test cases for route data functions."""
     
-    @patch('requests.get')
+    def setUp(self):
+        """Start every test with an empty route cache."""
+        route_cache.clear()
+    
+    @patch('tripweather.http_get')
     def test_get_route_data_detailed_success(self, mock_get):
         """Test successful route data retrieval."""
         mock_response = MagicMock()
@@ -52,17 +93,41 @@ class TestRouteData(unittest.TestCase):
             'status': 'OK',
             'routes': [{
                 'overview_polyline': {'points': 'test_points'},
-                'legs': [{'steps': ['step1', 'step2']}]
+                'legs': [{'steps': [self.step(1000, 60), self.step(2500, 120)]}]
             }]
         }
         mock_get.return_value = mock_response
         
-        with patch('polyline.decode', return_value=[(1.0, 2.0), (3.0, 4.0)]):
+        with patch('tripweather.decode_polyline', return_value=np.array([(1.0, 2.0), (3.0, 4.0)])):
             waypoints, steps = get_route_data_detailed('origin', 'destination')
             self.assertEqual(len(waypoints), 2)
-            self.assertEqual(steps, ['step1', 'step2'])
+            self.assertEqual(steps, [self.step(1000, 60), self.step(2500, 120)])
+    
+    def step(self, distance, duration):
+        """Build a Directions API step with only distance and duration."""
+        return {'distance': {'value': distance}, 'duration': {'value': duration}}
+    
+    @patch('tripweather.get_config')
+    @patch('tripweather.http_get')
+    def test_route_cached_on_normalised_places(self, mock_get, mock_config):
+        """Test that the same trip written differently is served from the route cache."""
+        mock_get.return_value.json.return_value = {
+            'status': 'OK',
+            'routes': [{
+                'overview_polyline': {'points': '_p~iF~ps|U_ulLnnqC'},
+                'legs': [{'steps': [self.step(1000, 60)]}]
+            }]
+        }
+        
+        first = get_route_data_detailed('Sundsvall, Sweden', 'Stockholm')
+        second = get_route_data_detailed('  sundsvall,sweden ', 'STOCKHOLM')
+        
+        mock_get.assert_called_once()
+        np.testing.assert_allclose(second[0], first[0])
+        self.assertEqual(second[1], first[1])
+        self.assertEqual(route_cache.stats()['hits'], 1)
     
-    @patch('requests.get')
+    @patch('tripweather.http_get')
     def test_get_route_data_detailed_error(self, mock_get):
         """Test error handling in route data retrieval."""
         mock_response = MagicMock()
@@ -71,11 +136,33 @@ class TestRouteData(unittest.TestCase):
         
         with self.assertRaises(APIError):
             get_route_data_detailed('origin', 'destination')
+    
+    @patch('tripweather.get_config')
+    @patch('tripweather.http_get')
+    def test_expired_route_served_when_rate_limited(self, mock_get, mock_config):
+        """Test that an expired route is used when the rate limiter refuses the request."""
+        mock_get.side_effect = QuotaExceeded('google daily quota used up', retry_after=60)
+        route_cache.set(route_key('origin', 'destination'),
+                        CompactRoute.from_directions('_p~iF~ps|U_ulLnnqC', [self.step(1000, 60)]), ttl=-24 * 3600)
+        
+        waypoints, steps = get_route_data_detailed('origin', 'destination')
+        
+        self.assertEqual(len(waypoints), 2)
+        self.assertEqual(steps[0]['distance']['value'], 1000)
+        with self.assertRaises(APIError):
+            get_route_data_detailed('origin', 'elsewhere')
 
 class TestWeatherAPI(unittest.TestCase):
     """Test cases for weather API functions."""
     
-    @patch('requests.get')
+    def setUp(self):
+        """Start every test with an empty forecast cache and weatherapi.com as the only provider."""
+        forecast_cache.clear()
+        router = patch('tripweather._weather_router', ProviderRouter([WeatherAPIProvider(lambda: 'key')]))
+        router.start()
+        self.addCleanup(router.stop)
+    
+    @patch('weather_providers.http_get')
     def test_get_weatherAPI_forecast_success(self, mock_get):
         """Test successful weather forecast retrieval."""
         mock_response = MagicMock()
@@ -92,7 +179,99 @@ class TestWeatherAPI(unittest.TestCase):
         
         weather = get_weatherAPI_forecast(1.0, 2.0, datetime(2024, 1, 1, 12, 0))
         self.assertIsNotNone(weather)
-        self.assertEqual(weather['temperature'], 20)
+        self.assertEqual(weather.temperature, 20)
+    
+    @patch('weather_providers.http_get')
+    def test_get_weatherAPI_forecast_cached_per_cell_and_day(self, mock_get):
+        """Test that other hours and nearby points in the same cell reuse the cached series."""
+        mock_response = MagicMock()
+        mock_response.json.return_value = {
+            'forecast': {
+                'forecastday': [{
+                    'hour': [
+                        {'time': '2024-01-01 12:00', 'temp_c': 20, 'precip_mm': 0, 'wind_kph': 10, 'condition': {'icon': 'a.png'}},
+                        {'time': '2024-01-01 13:00', 'temp_c': 22, 'precip_mm': 0, 'wind_kph': 10, 'condition': {'icon': 'b.png'}}
+                    ]
+                }]
+            }
+        }
+        mock_get.return_value = mock_response
+        
+        first = get_weatherAPI_forecast(59.31, 18.02, datetime(2024, 1, 1, 12, 0))
+        second = get_weatherAPI_forecast(59.32, 18.04, datetime(2024, 1, 1, 13, 0))
+        
+        self.assertEqual(first.temperature, 20)
+        self.assertEqual(second.temperature, 22)
+        mock_get.assert_called_once()
+        self.assertEqual(forecast_cache.stats()['hits'], 1)
+    
+    @patch('weather_providers.date')
+    @patch('weather_providers.http_get')
+    def test_several_days_in_one_request(self, mock_get, mock_date):
+        """Test that the days of one cell are fetched with a single days= request and cached per day."""
+        mock_date.today.return_value = datetime(2024, 1, 1).date()
+        mock_response = MagicMock()
+        mock_response.json.return_value = {
+            'forecast': {
+                'forecastday': [
+                    {'date': f'2024-01-0{day}', 'hour': [
+                        {'time': f'2024-01-0{day} 12:00', 'temp_c': day, 'precip_mm': 0, 'wind_kph': 10, 'condition': {'icon': 'a.png'}}
+                    ]}
+                    for day in (1, 2, 3, 4)
+                ]
+            }
+        }
+        mock_get.return_value = mock_response
+        
+        days = get_forecast_days(59.31, 18.02, ['2024-01-02', '2024-01-03'])
+        
+        mock_get.assert_called_once()
+        self.assertEqual(mock_get.call_args.kwargs['params']['days'], 4)
+        self.assertNotIn('dt', mock_get.call_args.kwargs['params'])
+        self.assertEqual(days['2024-01-03'].at(datetime(2024, 1, 3, 12, 0)).temperature, 3)
+        self.assertEqual(sorted(days), ['2024-01-02', '2024-01-03'])
+        self.assertEqual(get_weatherAPI_forecast(59.3, 18.0, datetime(2024, 1, 4, 12, 0)).temperature, 4)
+        mock_get.assert_called_once()
+    
+    @patch('weather_providers.http_get')
+    def test_failed_cell_is_remembered_and_stale_series_served(self, mock_get):
+        """Test that a failing cell is not asked again at once and an expired series is served."""
+        mock_get.side_effect = requests.exceptions.ConnectionError('down')
+        series = HourlySeries.from_rows([(datetime(2024, 1, 1, 12, 0), Forecast(5.0))])
+        forecast_cache.set((59.3, 18.0, '2024-01-01'), series, ttl=-3600)
+        
+        stale = get_weatherAPI_forecast(59.31, 18.02, datetime(2024, 1, 1, 12, 0))
+        with self.assertRaises(APIError):
+            get_weatherAPI_forecast(59.31, 18.02, datetime(2024, 1, 2, 12, 0))
+        
+        self.assertEqual(stale.temperature, 5.0)
+        mock_get.assert_called_once()
+    
+    @patch('weather_providers.http_get')
+    def test_fetch_forecast_days_bypasses_stale_entries_and_failures(self, mock_get):
+        """Test that fetch_forecast_days neither serves expired series nor remembered failures."""
+        series = HourlySeries.from_rows([(datetime(2024, 1, 1, 12, 0), Forecast(5.0))])
+        forecast_cache.set((59.3, 18.0, '2024-01-01'), series, ttl=-60)
+        forecast_cache.set_failure((59.3, 18.0), APIError('down'), 30)
+        mock_get.side_effect = requests.exceptions.ConnectionError('down')
+        
+        with self.assertRaises(APIError):
+            fetch_forecast_days(59.31, 18.02, ['2024-01-01'])
+        mock_get.assert_called()
+    
+    def test_plan_forecast_requests(self):
+        """Test that points are grouped per grid cell with the days each cell needs."""
+        points = [
+            RoutePoint(59.31, 18.02, datetime(2024, 1, 1, 23, 0)),
+            RoutePoint(59.32, 18.04, datetime(2024, 1, 2, 0, 30)),
+            RoutePoint(60.00, 18.00, datetime(2024, 1, 2, 1, 0)),
+            RoutePoint(59.30, 18.01, datetime(2024, 1, 1, 22, 0))
+        ]
+        
+        self.assertEqual(plan_forecast_requests(points), {
+            (59.3, 18.0): ['2024-01-01', '2024-01-02'],
+            (60.0, 18.0): ['2024-01-02']
+        })
     
     def test_extract_weatherAPI_details(self):
         """Test weather data extraction and conversion."""
@@ -104,15 +283,41 @@ class TestWeatherAPI(unittest.TestCase):
         }
         
         result = extract_weatherAPI_details(test_data)
-        self.assertEqual(result['temperature'], 20)
-        self.assertEqual(result['precipitation'], 5)
-        self.assertEqual(result['wind_speed'], 10.0)  # 36 kph = 10 m/s
-        self.assertEqual(result['icon_url'], 'https://test.png')
+        self.assertEqual(result.temperature, 20)
+        self.assertEqual(result.precipitation, 5)
+        self.assertEqual(result.wind_speed, 10.0)  # 36 kph = 10 m/s
+        self.assertEqual(result.icon_url, 'https://test.png')
+
+class TestWeatherProviders(unittest.TestCase):
+    """Test cases for choosing the forecast providers."""
+    
+    @patch('tripweather.YR_USER_AGENT', None)
+    @patch('tripweather.WEATHER_PROVIDERS', ['metno', 'weatherapi'])
+    @patch('tripweather._weather_router', None)
+    def test_metno_needs_user_agent(self):
+        """Test that met.no is not used without an identifying User-Agent."""
+        with self.assertRaises(ValueError):
+            build_weather_provider('metno')
+        
+        router = get_weather_router()
+        
+        self.assertEqual([provider.name for provider in router.providers], ['weatherapi'])
+    
+    @patch('tripweather.YR_USER_AGENT', 'tripweather/1.0 ops@example.com')
+    def test_metno_with_user_agent(self):
+        """Test that met.no is built with the configured User-Agent."""
+        provider = build_weather_provider('metno')
+        
+        self.assertEqual(provider.user_agent, 'tripweather/1.0 ops@example.com')
 
 class TestCityName(unittest.TestCase):
     """Test cases for city name retrieval."""
     
-    @patch('requests.get')
+    def setUp(self):
+        """Start every test with an empty geocode cache."""
+        geocode_cache.clear()
+    
+    @patch('tripweather.http_get')
     def test_get_city_name_success(self, mock_get):
         """Test successful city name retrieval."""
         mock_response = MagicMock()
@@ -128,7 +333,7 @@ class TestCityName(unittest.TestCase):
         city = get_city_name(1.0, 2.0)
         self.assertEqual(city, 'Test City')
     
-    @patch('requests.get')
+    @patch('tripweather.http_get')
     def test_get_city_name_not_found(self, mock_get):
         """Test city name retrieval when city is not found."""
         mock_response = MagicMock()
@@ -137,46 +342,271 @@ class TestCityName(unittest.TestCase):
         
         city = get_city_name(1.0, 2.0)
         self.assertEqual(city, 'Unknown Location')
+    
+    @patch('tripweather.get_config')
+    @patch('tripweather.http_get')
+    def test_get_city_name_cached_per_grid_cell(self, mock_get, mock_config):
+        """Test that nearby coordinates are served from the geocode cache."""
+        mock_response = MagicMock()
+        mock_response.json.return_value = {
+            'results': [{
+                'address_components': [
+                    {'types': ['postal_town'], 'long_name': 'Gävle'}
+                ]
+            }]
+        }
+        mock_get.return_value = mock_response
+        
+        self.assertEqual(get_city_name(60.6749, 17.1413), 'Gävle')
+        self.assertEqual(get_city_name(60.6721, 17.1389), 'Gävle')
+        
+        mock_get.assert_called_once()
+        self.assertEqual(geocode_cache.stats()['hits'], 1)
+    
+    @patch('tripweather.get_config')
+    @patch('tripweather.http_get')
+    def test_expired_city_served_when_rate_limited(self, mock_get, mock_config):
+        """Test that an expired city name is used when the rate limiter refuses the request."""
+        mock_get.side_effect = RateLimitExceeded('google rate limit reached', retry_after=3)
+        geocode_cache.set((60.67, 17.14), 'Gävle', ttl=-2 * 24 * 3600)
+        
+        self.assertEqual(get_city_name(60.6749, 17.1413), 'Gävle')
+        self.assertEqual(geocode_cache.stats()['stale_hits'], 1)
 
 class TestWeatherComment(unittest.TestCase):
     """Test cases for weather comment generation."""
     
-    @patch('openai.chat.completions.create')
-    def test_get_weather_comment_success(self, mock_create):
+    def setUp(self):
+        """Start every test with an empty comment cache."""
+        comment_cache.clear()
+    
+    @patch('tripweather.get_openai_client')
+    def test_get_weather_comment_success(self, mock_client):
         """Test successful weather comment generation."""
         mock_response = MagicMock()
         mock_response.choices = [MagicMock(message=MagicMock(content='Test comment'))]
-        mock_create.return_value = mock_response
+        mock_client.return_value.chat.completions.create.return_value = mock_response
         
-        comment = get_weather_comment([{'temperature': 20}])
+        comment = get_weather_comment([stop('Gävle', 20)])
         self.assertEqual(comment, 'Test comment')
+    
+    @patch('tripweather.get_openai_client')
+    def test_similar_forecasts_reuse_comment(self, mock_client):
+        """Test that forecasts in the same bands are served from the comment cache."""
+        mock_response = MagicMock()
+        mock_response.choices = [MagicMock(message=MagicMock(content='Dry and mild'))]
+        mock_client.return_value.chat.completions.create.return_value = mock_response
+        first = [stop('Gävle', 10.2, 0.0, 3.1)]
+        second = [stop('Gävle', 10.6, 0.05, 3.9)]
+        
+        self.assertEqual(get_weather_comment(first), 'Dry and mild')
+        self.assertEqual(get_weather_comment(second), 'Dry and mild')
+        
+        mock_client.return_value.chat.completions.create.assert_called_once()
+        self.assertEqual(comment_cache.stats()['hits'], 1)
+    
+    def test_summary_bands(self):
+        """Test the bucketing used for the prompt and cache key."""
+        summary = summarize_stops([
+            stop('Sundsvall', -0.7, 5.0, 16.0),
+            stop('Gävle', None)
+        ])
+        
+        self.assertEqual(summary, (('Sundsvall', 0, 'heavy', 'storm'), ('Gävle', None, None, None)))
+    
+    @patch('tripweather.get_openai_client')
+    def test_stream_weather_comment(self, mock_client):
+        """Test that streamed chunks are yielded and the full comment is cached."""
+        chunks = [MagicMock(choices=[MagicMock(delta=MagicMock(content=text))]) for text in ('Icy ', 'roads', None)]
+        mock_client.return_value.chat.completions.create.return_value = iter(chunks)
+        weather_data = [stop('Sundsvall', 0.2, 2.0, 4.0)]
+        
+        self.assertEqual(list(stream_weather_comment(weather_data)), ['Icy ', 'roads'])
+        self.assertEqual(list(stream_weather_comment(weather_data)), ['Icy roads'])
+        mock_client.return_value.chat.completions.create.assert_called_once()
+    
+    @patch('tripweather.get_weather_comment')
+    def test_benign_trip_skips_llm(self, mock_comment):
+        """Test that trips without hazards get the templated summary under the default policy."""
+        weather_data = [stop('Gävle', 10.0, 0.0, 3.0)]
+        
+        comment = get_trip_comment(weather_data, policy='hazards')
+        
+        self.assertTrue(comment.startswith('Good driving conditions'))
+        mock_comment.assert_not_called()
+        get_trip_comment(weather_data, policy='hazards', use_llm=True)
+        mock_comment.assert_called_once()
+    
+    @patch('tripweather.get_weather_comment')
+    def test_hazardous_trip_uses_llm(self, mock_comment):
+        """Test that hazards send the trip to the LLM, falling back to the summary on errors."""
+        weather_data = [stop('Sundsvall', 0.2, 2.0, 4.0)]
+        mock_comment.return_value = 'Icy roads'
+        
+        self.assertEqual(get_trip_comment(weather_data, policy='hazards'), 'Icy roads')
+        mock_comment.side_effect = APIError('Failed to generate weather comment')
+        self.assertTrue(get_trip_comment(weather_data, policy='hazards').startswith('Drive carefully'))
+        self.assertTrue(get_trip_comment(weather_data, policy='never').startswith('Drive carefully'))
+        self.assertEqual(mock_comment.call_count, 2)
 
 class TestFindWeatherAlongRoute(unittest.TestCase):
     """Test cases for finding weather along a route."""
     
     @patch('tripweather.get_route_data_detailed')
-    @patch('tripweather.get_route_data')
     @patch('tripweather.get_city_name')
-    @patch('tripweather.get_weatherAPI_forecast')
-    def test_find_weather_along_route_success(self, mock_forecast, mock_city, mock_route, mock_route_detailed):
+    @patch('tripweather.get_forecast_days')
+    def test_find_weather_along_route_success(self, mock_forecast, mock_city, mock_route_detailed):
         """Test successful weather data retrieval along a route."""
         # Setup mocks
         mock_route_detailed.return_value = ([(1.0, 2.0), (3.0, 4.0)], [])
-        mock_route.return_value = [{'duration': {'value': 3600}}]
         mock_city.return_value = 'Test City'
-        mock_forecast.return_value = {
-            'temperature': 20,
-            'precipitation': 0,
-            'wind_speed': 10,
-            'icon_url': 'test.png'
-        }
+        mock_forecast.side_effect = forecast_days(Forecast(20, 0, 10, 'test.png'))
         
         start_time = datetime(2024, 1, 1, 12, 0)
         weather_data = find_weather_along_route('origin', 'destination', start_time)
         
-        self.assertEqual(len(weather_data), 2)
-        self.assertEqual(weather_data[0]['City'], 'Test City')
-        self.assertEqual(weather_data[0]['Temperature'], 20)
+        self.assertEqual(len(weather_data), 10)
+        self.assertEqual(weather_data[0].city, 'Test City')
+        self.assertEqual(weather_data[0].temperature, 20)
+        mock_route_detailed.assert_called_once()
+    
+    @patch('tripweather.get_route_data_detailed')
+    @patch('tripweather.get_city_name')
+    @patch('tripweather.get_forecast_days')
+    def test_find_weather_along_route_arrival_times(self, mock_forecast, mock_city, mock_route_detailed):
+        """Test that arrival times come from the steps of the single route response."""
+        mock_route_detailed.return_value = (
+            [(59.0, 18.0), (60.0, 18.0)],
+            [{'distance': {'value': 100000}, 'duration': {'value': 3600}}]
+        )
+        mock_city.return_value = 'Test City'
+        mock_forecast.side_effect = forecast_days(Forecast(20, 0, 10, 'test.png'))
+        
+        start_time = datetime(2024, 1, 1, 12, 0)
+        weather_data = find_weather_along_route('origin', 'destination', start_time, stops=3)
+        
+        self.assertEqual([stop.to_dict()['Time'] for stop in weather_data], [
+            '2024-01-01 12:00:00', '2024-01-01 12:30:00', '2024-01-01 13:00:00'
+        ])
+
+class TestFindWeatherAlongRouteAsync(unittest.TestCase):
+    """Test cases for the awaitable trip pipeline."""
+    
+    @patch('tripweather.get_route_data_detailed')
+    @patch('tripweather.get_city_name')
+    @patch('tripweather.get_forecast_days')
+    def test_matches_sync_pipeline(self, mock_forecast, mock_city, mock_route_detailed):
+        """Test that the async pipeline returns the same stops as the sync one."""
+        mock_route_detailed.return_value = (
+            [(59.0, 18.0), (60.0, 18.0)],
+            [{'distance': {'value': 100000}, 'duration': {'value': 3600}}]
+        )
+        mock_city.side_effect = lambda lat, lng: f"City {round(lat, 2)}"
+        mock_forecast.side_effect = forecast_days(Forecast(5, 0, 2, 'i.png'))
+        start_time = datetime(2024, 1, 1, 12, 0)
+        
+        result = asyncio.run(find_weather_along_route_async('origin', 'destination', start_time, stops=4))
+        
+        self.assertEqual(result, find_weather_along_route('origin', 'destination', start_time, stops=4))
+    
+    @patch('tripweather.get_route_data_detailed')
+    def test_route_failure_raises_api_error(self, mock_route_detailed):
+        """Test that a failed route surfaces as APIError."""
+        mock_route_detailed.side_effect = APIError('no route')
+        with self.assertRaises(APIError):
+            asyncio.run(find_weather_along_route_async('origin', 'destination', datetime(2024, 1, 1)))
+
+class TestIterWeatherAlongRoute(unittest.TestCase):
+    """Test cases for the streaming trip pipeline."""
+    
+    @patch('tripweather.get_route_data_detailed')
+    @patch('tripweather.get_city_name')
+    @patch('tripweather.get_forecast_days')
+    def test_yields_stops_as_they_resolve(self, mock_forecast, mock_city, mock_route_detailed):
+        """Test that a slow first stop does not hold back the others."""
+        first_stop_released = threading.Event()
+        mock_route_detailed.return_value = (
+            [(59.0, 18.0), (60.0, 18.0)],
+            [{'distance': {'value': 100000}, 'duration': {'value': 3600}}]
+        )
+        def city(lat, lng):
+            if lat == 59.0:
+                first_stop_released.wait(5)
+            return 'Test City'
+        mock_city.side_effect = city
+        mock_forecast.side_effect = forecast_days(Forecast(5, 0, 2, 'i.png'))
+        
+        stream = iter_weather_along_route('origin', 'destination', datetime(2024, 1, 1, 12, 0), stops=3)
+        early = [next(stream)[0], next(stream)[0]]
+        first_stop_released.set()
+        late = [index for index, _ in stream]
+        
+        self.assertEqual(sorted(early), [1, 2])
+        self.assertEqual(late, [0])
+
+class TestLookupPoints(unittest.TestCase):
+    """Test cases for the concurrent per-stop lookup fan-out."""
+    
+    @patch('tripweather.get_city_name')
+    @patch('tripweather.get_forecast_days')
+    def test_lookup_points_keeps_order(self, mock_forecast, mock_city):
+        """Test that results come back in the order of the input points."""
+        mock_city.side_effect = lambda lat, lng: f"City {lat}"
+        mock_forecast.side_effect = forecast_days(lambda lat: Forecast(lat))
+        points = [RoutePoint(float(i), 0.0, datetime(2024, 1, 1, 12, 0)) for i in range(6)]
+        
+        results = lookup_points(points, max_workers=4)
+        
+        self.assertEqual([city for city, _, _ in results], [f"City {float(i)}" for i in range(6)])
+        self.assertEqual([weather.temperature for _, weather, _ in results], [float(i) for i in range(6)])
+    
+    @patch('tripweather.get_city_name')
+    @patch('tripweather.get_forecast_days')
+    def test_lookup_points_partial_failure(self, mock_forecast, mock_city):
+        """Test that one failing forecast is reported for that point only."""
+        mock_city.return_value = 'Test City'
+        def forecast(lat, lng, dates):
+            if lat == 0.0:
+                raise APIError('boom')
+            return forecast_days(Forecast(1))(lat, lng, dates)
+        mock_forecast.side_effect = forecast
+        points = [RoutePoint(0.0, 0.0, datetime(2024, 1, 1)), RoutePoint(1.0, 0.0, datetime(2024, 1, 1))]
+        
+        results = lookup_points(points)
+        
+        self.assertEqual(results[0], ('Test City', None, STOP_LOOKUP_ERROR))
+        self.assertEqual(results[1], ('Test City', Forecast(1), None))
+    
+    @patch('tripweather.get_route_data_detailed')
+    @patch('tripweather.get_forecast_days')
+    @patch('tripweather.http_get')
+    @patch('tripweather.get_config')
+    def test_api_key_never_in_stop_error(self, mock_config, mock_http_get, mock_forecast, mock_route_detailed):
+        """Test that a failed lookup whose exception contains the request URL does not expose the API key."""
+        geocode_cache.clear()
+        mock_config.return_value.GOOGLE_API_KEY = 'AIzaSECRETKEY'
+        mock_http_get.side_effect = requests.exceptions.HTTPError(
+            '403 Client Error: Forbidden for url: '
+            'https://maps.googleapis.com/maps/api/geocode/json?latlng=59.3%2C18.0&key=AIzaSECRETKEY'
+        )
+        mock_forecast.side_effect = forecast_days(Forecast(5, 0, 2, 'i.png'))
+        mock_route_detailed.return_value = (
+            [(59.3, 18.0), (59.8, 17.6)],
+            [{'distance': {'value': 60000}, 'duration': {'value': 3600}}]
+        )
+        start_time = datetime(2024, 1, 1, 12, 0)
+        
+        trips = [
+            find_weather_along_route('origin', 'destination', start_time, stops=3),
+            asyncio.run(find_weather_along_route_async('origin', 'destination', start_time, stops=3)),
+            [stop for _, stop in iter_weather_along_route('origin', 'destination', start_time, stops=3)]
+        ]
+        
+        for stops in trips:
+            self.assertEqual(len(stops), 3)
+            for stop in stops:
+                self.assertEqual(stop.to_dict()['Error'], STOP_LOOKUP_ERROR)
+                self.assertNotIn('AIzaSECRETKEY', str(stop.to_dict()))
 
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
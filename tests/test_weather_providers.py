@@ -0,0 +1,171 @@
+import unittest
+from unittest.mock import patch
+from datetime import datetime
+import requests_mock
+from forecast_index import HourlySeries
+from models import Forecast
+from ratelimit import RateLimitExceeded
+from weather_providers import (
+    MetNoProvider,
+    ProviderError,
+    ProviderRouter,
+    RateLimitedError,
+    WeatherAPIProvider,
+    WeatherProvider
+)
+
+METNO_RESPONSE = {
+    'properties': {
+        'timeseries': [
+            {'time': '2024-01-01T11:00:00Z', 'data': {
+                'instant': {'details': {'air_temperature': -1.5, 'wind_speed': 4.2}},
+                'next_1_hours': {'summary': {'symbol_code': 'lightsnow'}, 'details': {'precipitation_amount': 0.6}}
+            }},
+            {'time': '2024-01-01T23:00:00Z', 'data': {
+                'instant': {'details': {'air_temperature': -3.0, 'wind_speed': 2.0}},
+                'next_6_hours': {'summary': {'symbol_code': 'cloudy'}, 'details': {'precipitation_amount': 1.2}}
+            }}
+        ]
+    }
+}
+
+class StubProvider(WeatherProvider):
+    """Provider returning a fixed result or raising a fixed error."""
+
+    def __init__(self, name, cost=1.0, result=None, error=None):
+        super().__init__(cost)
+        self.name = name
+        self.result = result
+        self.error = error
+        self.calls = 0
+
+    def _fetch(self, lat, lng, date_str):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+def one_hour(temperature):
+    """Build a one hour series."""
+    return HourlySeries.from_rows([(datetime(2024, 1, 1, 12, 0), Forecast(temperature))])
+
+class TestMetNoProvider(unittest.TestCase):
+    """Test cases for the met.no locationforecast backend."""
+
+    def setUp(self):
+        """Create a provider reporting in Stockholm time."""
+        self.provider = MetNoProvider('tripweather-tests', timezone='Europe/Stockholm')
+
+    def test_parse_converts_to_local_time(self):
+        """Test that UTC steps become local hours and 6-hour precipitation is an hourly rate."""
+        series = self.provider.parse(METNO_RESPONSE)
+
+        first = series.at(datetime(2024, 1, 1, 12, 0))
+        self.assertEqual(first.temperature, -1.5)
+        self.assertEqual(first.precipitation, 0.6)
+        self.assertTrue(first.icon_url.endswith('/lightsnow.png'))
+        self.assertEqual(series.at(datetime(2024, 1, 2, 0, 0)).precipitation, 0.2)
+
+    def test_expires_and_conditional_revalidation(self):
+        """Test that a fresh response is reused and an expired one is revalidated with a 304."""
+        with requests_mock.Mocker() as m:
+            m.get(MetNoProvider.URL, [
+                {'json': METNO_RESPONSE, 'headers': {'Last-Modified': 'Mon, 01 Jan 2024 10:00:00 GMT',
+                                                     'Expires': 'Thu, 01 Jan 2099 00:00:00 GMT'}},
+                {'status_code': 304, 'headers': {'Expires': 'Thu, 01 Jan 2099 00:00:00 GMT'}}
+            ])
+            day = self.provider.fetch_series(62.4, 17.3, '2024-01-01')
+            next_day = self.provider.fetch_series(62.4, 17.3, '2024-01-02')
+            self.assertEqual(m.call_count, 1)
+            self.assertEqual(m.last_request.headers['User-Agent'], 'tripweather-tests')
+
+            self.provider.entries.get((62.4, 17.3)).expires = 0.0
+            revalidated = self.provider.fetch_series(62.4, 17.3, '2024-01-01')
+
+        self.assertEqual(len(day), 1)
+        self.assertEqual(len(next_day), 1)
+        self.assertEqual(m.call_count, 2)
+        self.assertEqual(m.last_request.headers['If-Modified-Since'], 'Mon, 01 Jan 2024 10:00:00 GMT')
+        self.assertEqual(revalidated.at(datetime(2024, 1, 1, 12, 0)).temperature, -1.5)
+
+    def test_expired_entry_served_when_rate_limited(self):
+        """Test that an expired response is reused while the local rate limiter refuses requests."""
+        with requests_mock.Mocker() as m:
+            m.get(MetNoProvider.URL, json=METNO_RESPONSE, headers={'Expires': 'Thu, 01 Jan 2099 00:00:00 GMT'})
+            self.provider.fetch_series(62.4, 17.3, '2024-01-01')
+        self.provider.entries.get((62.4, 17.3)).expires = 0.0
+
+        with patch('weather_providers.http_get', side_effect=RateLimitExceeded('metno rate limit reached', 1.0)):
+            series = self.provider.fetch_series(62.4, 17.3, '2024-01-01')
+            with self.assertRaises(RateLimitedError):
+                self.provider.fetch_series(59.3, 18.0, '2024-01-01')
+
+        self.assertEqual(series.at(datetime(2024, 1, 1, 12, 0)).temperature, -1.5)
+
+class TestWeatherAPIProvider(unittest.TestCase):
+    """Test cases for the weatherapi.com backend."""
+
+    @patch('transport.time.sleep')
+    def test_rate_limit(self, mock_sleep):
+        """Test that a 429 surfaces as RateLimitedError with its Retry-After."""
+        provider = WeatherAPIProvider(lambda: 'key')
+        with requests_mock.Mocker() as m:
+            m.get(WeatherAPIProvider.URL, status_code=429, headers={'Retry-After': '30'})
+            with self.assertRaises(RateLimitedError) as raised:
+                provider.fetch_series(59.3, 18.0, '2024-01-01')
+
+        self.assertEqual(raised.exception.retry_after, 30.0)
+
+class TestProviderRouter(unittest.TestCase):
+    """Test cases for provider selection and failover."""
+
+    def test_cheapest_provider_first(self):
+        """Test that the cheapest provider is used and the others are not called."""
+        paid = StubProvider('paid', cost=1.0, result=one_hour(1.0))
+        free = StubProvider('free', cost=0.0, result=one_hour(2.0))
+
+        series = ProviderRouter([paid, free]).fetch_series(59.3, 18.0, '2024-01-01')
+
+        self.assertEqual(series.at(datetime(2024, 1, 1, 12, 0)).temperature, 2.0)
+        self.assertEqual(paid.calls, 0)
+
+    def test_fails_over_and_skips_rate_limited_provider(self):
+        """Test that a rate-limited provider is skipped until its cooldown ends."""
+        limited = StubProvider('limited', cost=0.0, error=RateLimitedError('slow down', retry_after=60))
+        backup = StubProvider('backup', cost=1.0, result=one_hour(3.0))
+        router = ProviderRouter([limited, backup])
+
+        router.fetch_series(59.3, 18.0, '2024-01-01')
+        router.fetch_series(59.3, 18.0, '2024-01-01')
+
+        self.assertEqual(limited.calls, 1)
+        self.assertEqual(backup.calls, 2)
+        self.assertFalse(router.stats()['limited']['available'])
+
+    def test_empty_series_falls_through(self):
+        """Test that a provider without the requested day does not hide another one."""
+        short = StubProvider('short', cost=0.0, result=HourlySeries.from_rows([]))
+        long = StubProvider('long', cost=1.0, result=one_hour(4.0))
+
+        series = ProviderRouter([short, long]).fetch_series(59.3, 18.0, '2024-01-05')
+
+        self.assertEqual(len(series), 1)
+
+    def test_all_providers_failing(self):
+        """Test that ProviderError is raised when every provider fails."""
+        router = ProviderRouter([StubProvider('a', error=ProviderError('a down')),
+                                 StubProvider('b', error=ProviderError('b down'))])
+        with self.assertRaises(ProviderError):
+            router.fetch_series(59.3, 18.0, '2024-01-01')
+
+    def test_all_providers_rate_limited(self):
+        """Test that RateLimitedError with the shortest wait is raised when every provider is limited."""
+        router = ProviderRouter([StubProvider('a', error=RateLimitedError('a limited', retry_after=30)),
+                                 StubProvider('b', error=RateLimitedError('b limited', retry_after=5))])
+        with self.assertRaises(RateLimitedError) as raised:
+            router.fetch_series(59.3, 18.0, '2024-01-01')
+
+        self.assertEqual(raised.exception.retry_after, 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,310 @@
+import glob
+import json
+import os
+import re
+import threading
+import time
+import weakref
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional, Dict, List, Tuple, Iterable, Iterator
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single warmer per tile directory is assumed
+    fcntl = None
+
+import telemetry
+from forecast_index import HourlySeries, wall_clock_epoch
+
+logger = logging.getLogger(__name__)
+
+# Values kept per cell and hour, in this order
+FIELDS = ("temperature", "precipitation", "wind_speed")
+# Icon index of an hour the forecast does not have, and of an hour without an icon
+NO_HOUR = -2
+NO_ICON = -1
+
+Cell = Tuple[float, float]
+
+@dataclass
+class Tile:
+    """
+    Precomputed forecasts of every grid cell along one corridor.
+
+    ``values`` holds temperature, precipitation and wind speed per (cell, hour) and
+    ``icons`` an index into ``icon_table`` (NO_HOUR where the forecast has no such
+    hour, e.g. between met.no's 6-hourly steps), for ``hours`` consecutive hours from
+    the wall-clock epoch ``start``. Both are plain arrays so saved tiles can be
+    memory-mapped. ``cities`` holds the city names of the geocode cells along the way.
+    """
+    name: str
+    start: int
+    cells: List[Cell]
+    values: np.ndarray
+    icons: np.ndarray
+    icon_table: List[str]
+    cities: Dict[Cell, str] = field(default_factory=dict)
+    built_at: float = 0.0
+    expires_at: float = 0.0
+
+    @property
+    def hours(self) -> int:
+        return self.values.shape[1]
+
+    @classmethod
+    def build(cls, name: str, start: datetime, hours: int, forecasts: Dict[Cell, Dict[str, HourlySeries]],
+              cities: Dict[Cell, str], ttl: float) -> "Tile":
+        """
+        Build a tile from fetched forecasts.
+
+        Args:
+            name: Corridor name
+            start: First hour covered, in trip (wall-clock) time
+            hours: Number of hours covered
+            forecasts: Series per date for every forecast cell
+            cities: City name per geocode cell
+            ttl: Seconds the tile may be served
+
+        Returns:
+            The tile
+        """
+        start_epoch = wall_clock_epoch(start)
+        cells = list(forecasts)
+        values = np.full((len(cells), hours, len(FIELDS)), np.nan)
+        icons = np.full((len(cells), hours), NO_HOUR, dtype=np.int16)
+        icon_index: Dict[str, int] = {}
+        for row, cell in enumerate(cells):
+            for series in forecasts[cell].values():
+                for i, epoch in enumerate(series.epochs):
+                    hour = (epoch - start_epoch) // 3600
+                    if not 0 <= hour < hours:
+                        continue
+                    values[row, hour] = (series.temperature[i], series.precipitation[i], series.wind_speed[i])
+                    icon = series.icons[i]
+                    icons[row, hour] = NO_ICON if not icon else icon_index.setdefault(icon, len(icon_index))
+        built_at = time.time()
+        return cls(name, start_epoch, cells, values, icons, list(icon_index), dict(cities),
+                   built_at, built_at + ttl)
+
+    def covers(self, date_str: str) -> bool:
+        """Whether the whole day is inside the tile's hours."""
+        first = (wall_clock_epoch(datetime.strptime(date_str, "%Y-%m-%d")) - self.start) // 3600
+        return first >= 0 and first + 24 <= self.hours
+
+    def series(self, row: int, date_str: str) -> HourlySeries:
+        """The hours of one day of one cell as a HourlySeries."""
+        day = wall_clock_epoch(datetime.strptime(date_str, "%Y-%m-%d"))
+        first = (day - self.start) // 3600
+        lo, hi = max(0, first), min(self.hours, first + 24)
+        icons = np.asarray(self.icons[row, lo:hi])
+        present = np.flatnonzero(icons != NO_HOUR)
+        values = np.asarray(self.values[row, lo:hi])[present]
+        return HourlySeries(
+            [self.start + (lo + int(i)) * 3600 for i in present],
+            values[:, 0].tolist(),
+            values[:, 1].tolist(),
+            values[:, 2].tolist(),
+            [self.icon_table[index] if index >= 0 else None for index in icons[present].tolist()]
+        )
+
+    def save(self, directory: str) -> str:
+        """
+        Write the tile to ``directory``.
+
+        The arrays go to files named after the build time and the writing process,
+        and the JSON index is replaced last, so readers see either the old or the
+        new tile, never a mix. Writers of the same corridor take turns on a lock
+        file, so one writer's cleanup never removes the arrays of another's index.
+
+        Returns:
+            Path of the JSON index
+        """
+        os.makedirs(directory, exist_ok=True)
+        with _locked(os.path.join(directory, f".{self.name}.lock")):
+            return self._save(directory)
+
+    def _save(self, directory: str) -> str:
+        stamp = f"{self.name}-{int(self.built_at * 1000)}-{os.getpid()}"
+        np.save(os.path.join(directory, f"{stamp}.values.npy"), self.values)
+        np.save(os.path.join(directory, f"{stamp}.icons.npy"), self.icons)
+        index = {
+            "name": self.name,
+            "start": self.start,
+            "built_at": self.built_at,
+            "expires_at": self.expires_at,
+            "arrays": stamp,
+            "cells": self.cells,
+            "icon_table": self.icon_table,
+            "cities": [[lat, lng, city] for (lat, lng), city in self.cities.items()],
+        }
+        path = os.path.join(directory, f"{self.name}.json")
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(index, file, ensure_ascii=False)
+        os.replace(temporary, path)
+        # Only this corridor's arrays: "e4-123-7.values.npy", not "e4-north-123-7.values.npy"
+        pattern = re.compile(re.escape(self.name) + r"-\d+-\d+\.(values|icons)\.npy")
+        for old in os.listdir(directory):
+            if pattern.fullmatch(old) and not old.startswith(f"{stamp}."):
+                os.remove(os.path.join(directory, old))
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "Tile":
+        """Read a tile saved by ``save``; the arrays are memory-mapped, not read."""
+        with open(path, encoding="utf-8") as file:
+            index = json.load(file)
+        directory = os.path.dirname(path)
+        return cls(
+            index["name"],
+            index["start"],
+            [tuple(cell) for cell in index["cells"]],
+            np.load(os.path.join(directory, f"{index['arrays']}.values.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, f"{index['arrays']}.icons.npy"), mmap_mode="r"),
+            index["icon_table"],
+            {(lat, lng): city for lat, lng, city in index["cities"]},
+            index["built_at"],
+            index["expires_at"]
+        )
+
+@contextmanager
+def _locked(path: str) -> Iterator[None]:
+    """Hold an exclusive lock on ``path`` across processes (where fcntl is available)."""
+    with open(path, "a") as file:
+        if fcntl is not None:
+            fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+class TileStore:
+    """
+    Corridor tiles in a directory, shared by every process that reads it.
+
+    Tiles are written by the corridor warm-up (see corridors.py) and picked up by
+    readers when the directory changes, checked at most every ``check_interval``
+    seconds. Only tiles that have not expired are used.
+
+    Args:
+        directory: Directory holding the tiles; None disables the store
+        check_interval: Seconds between checks for new or changed tiles
+    """
+
+    def __init__(self, directory: Optional[str], check_interval: float = 30.0):
+        self.directory = directory
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._tiles: Dict[str, Tile] = {}
+        self._mtimes: Dict[str, float] = {}
+        self._cells: Dict[Cell, Tuple[Tile, int]] = {}
+        self._cities: Dict[Cell, Tuple[Tile, str]] = {}
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        _stores.add(self)
+
+    def forecast_days(self, cell: Cell, dates: Iterable[str]) -> Optional[Dict[str, HourlySeries]]:
+        """
+        Series per date for a forecast cell, if a fresh tile covers the cell and every date.
+
+        Returns:
+            Series per date, or None if the days have to be looked up elsewhere
+        """
+        if not self.directory:
+            return None
+        self._check()
+        now = time.time()
+        with self._lock:
+            entry = self._cells.get(cell)
+            dates = list(dates)
+            if entry is None or entry[0].expires_at <= now or not all(entry[0].covers(d) for d in dates):
+                self.misses += 1
+                return None
+            self.hits += 1
+        tile, row = entry
+        return {date_str: tile.series(row, date_str) for date_str in dates}
+
+    def city(self, cell: Cell) -> Optional[str]:
+        """City name of a geocode cell from a fresh tile, or None."""
+        if not self.directory:
+            return None
+        self._check()
+        with self._lock:
+            entry = self._cities.get(cell)
+            if entry is None or entry[0].expires_at <= time.time():
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def save(self, tile: Tile) -> None:
+        """Write a tile and start serving it in this process right away."""
+        path = tile.save(self.directory)
+        with self._lock:
+            self._add(tile, path, os.path.getmtime(path))
+
+    def stats(self) -> Dict[str, object]:
+        """Tiles served and lookups answered or missed."""
+        now = time.time()
+        with self._lock:
+            return {
+                "tiles": {
+                    name: {"cells": len(tile.cells), "fresh": tile.expires_at > now,
+                           "age": round(now - tile.built_at, 1)}
+                    for name, tile in self._tiles.items()
+                },
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _check(self) -> None:
+        """Load tiles written since the last check, by this or another process."""
+        now = time.time()
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                mtime = os.path.getmtime(path)
+                with self._lock:
+                    if self._mtimes.get(path) == mtime:
+                        continue
+                tile = Tile.load(path)
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Error loading corridor tile {path}: {e}")
+                continue
+            with self._lock:
+                self._add(tile, path, mtime)
+
+    def _add(self, tile: Tile, path: str, mtime: float) -> None:
+        """Index a tile under the lock, replacing an older tile of the same corridor."""
+        self._mtimes[path] = mtime
+        self._tiles[tile.name] = tile
+        self._cells = {}
+        self._cities = {}
+        for other in sorted(self._tiles.values(), key=lambda t: t.built_at):
+            for row, cell in enumerate(other.cells):
+                self._cells[cell] = (other, row)
+            for cell, city in other.cities.items():
+                self._cities[cell] = (other, city)
+
+# Every live TileStore, for metrics
+_stores: "weakref.WeakSet[TileStore]" = weakref.WeakSet()
+
+def _tile_metrics():
+    """Corridor tile lookups, for /metrics."""
+    stores = list(_stores)
+    hits = sum(store.hits for store in stores)
+    misses = sum(store.misses for store in stores)
+    return [("tripweather_tile_lookups_total", "counter", "Lookups answered from corridor tiles.",
+             [({"result": "hit"}, hits), ({"result": "miss"}, misses)])]
+
+telemetry.register_collector(_tile_metrics)
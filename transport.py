@@ -0,0 +1,331 @@
+import random
+import threading
+import time
+import logging
+from dataclasses import dataclass
+from typing import Optional, Dict, Any
+
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import telemetry
+from ratelimit import RateLimitExceeded, get_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+@dataclass
+class TransportSettings:
+    """Connection pool, timeout and retry settings for one provider."""
+    pool_size: int = 10
+    connect_timeout: float = 3.05
+    read_timeout: float = 10.0
+    max_retries: int = 2
+    backoff_factor: float = 0.5
+    max_backoff: float = 8.0
+    # Send requests to this scheme://host[/prefix] instead of the provider's own host,
+    # e.g. a local stub server in benchmarks
+    base_url: Optional[str] = None
+    # Open the circuit after this many failed calls in a row, for reset_timeout seconds
+    failure_threshold: int = 5
+    reset_timeout: float = 30.0
+
+# Per-provider overrides; providers not listed use the TransportSettings defaults
+PROVIDER_SETTINGS: Dict[str, TransportSettings] = {
+    "google": TransportSettings(),
+    "weatherapi": TransportSettings(),
+    "metno": TransportSettings(),
+}
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """The provider's circuit is open; the request was not sent."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """
+    Stop calling a provider that keeps failing.
+
+    After ``failure_threshold`` failed calls in a row the circuit opens and calls are
+    refused at once for ``reset_timeout`` seconds, so requests do not queue behind
+    connect and read timeouts during an upstream incident. Then one trial call is let
+    through (half-open): its success closes the circuit, its failure opens it again.
+    A trial whose outcome is never recorded stops blocking calls after another
+    ``reset_timeout``, when the next trial is let through.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_started = 0.0
+        self.trips = 0
+        self.rejected = 0
+
+    def allow(self) -> None:
+        """
+        Check that a call may be made.
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half-open with a trial call running
+        """
+        with self._lock:
+            if self.state == "closed":
+                return
+            now = time.monotonic()
+            if self.state == "half_open":
+                remaining = self.trial_started + self.reset_timeout - now
+            else:
+                remaining = self.opened_at + self.reset_timeout - now
+            if remaining <= 0:
+                self.state = "half_open"
+                self.trial_started = now
+                return
+            self.rejected += 1
+        raise CircuitOpenError(f"{self.name} circuit is open after repeated failures",
+                               retry_after=max(0.0, remaining))
+
+    def release(self) -> None:
+        """Give back a half-open trial call that was not made."""
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.trips += 1
+                    logger.warning(f"{self.name} circuit opened for {self.reset_timeout:.0f} s")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "trips": self.trips, "rejected": self.rejected}
+
+class ProviderTransport:
+    """
+    Pooled keep-alive HTTP session for a single provider.
+
+    Requests reuse connections from the session's pool, and 429/5xx responses as well
+    as connection errors are retried with jittered exponential backoff. Every attempt
+    first takes a token from the provider's rate limiter (see ratelimit.py). Calls that
+    still fail (connection errors, timeouts, 5xx) count towards the provider's circuit
+    breaker.
+    """
+
+    def __init__(self, name: str, settings: TransportSettings):
+        self.name = name
+        self.settings = settings
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=settings.pool_size, pool_maxsize=settings.pool_size)
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self.breaker = CircuitBreaker(name, settings.failure_threshold, settings.reset_timeout)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None,
+            headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        """
+        Send a GET request through the provider's session.
+
+        Every attempt waits for the provider's rate limiter, keyed by the request's
+        ``key`` parameter, and is counted in the outbound telemetry metrics; the call
+        as a whole is recorded as an "http" span of the current trace.
+
+        Args:
+            url: Request URL
+            params: Optional query parameters
+            headers: Optional request headers
+
+        Returns:
+            The final response; retryable statuses are returned once retries are exhausted
+
+        Raises:
+            CircuitOpenError: If the provider's circuit is open
+            ratelimit.RateLimitExceeded: If the rate limit or daily quota does not allow the request
+            requests.exceptions.RequestException: If the request still fails after all retries
+        """
+        timeout = (self.settings.connect_timeout, self.settings.read_timeout)
+        if self.settings.base_url:
+            url = self.settings.base_url.rstrip("/") + urlsplit(url).path
+        with telemetry.span("http", provider=self.name) as span:
+            try:
+                self.breaker.allow()
+            except CircuitOpenError:
+                span.set(status="circuit_open")
+                raise
+            attempt = 0
+            waited = 0.0
+            while True:
+                try:
+                    waited += get_rate_limiter().acquire(self.name, (params or {}).get("key"))
+                except RateLimitExceeded:
+                    self.breaker.release()
+                    span.set(status="rate_limited", attempts=attempt)
+                    raise
+                if waited:
+                    span.set(rate_limit_wait=round(waited, 3))
+                self._count("requests")
+                retry_after = None
+                started = time.perf_counter()
+                try:
+                    response = self.session.get(url, params=params, headers=headers, timeout=timeout)
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    telemetry.record_outbound(self.name, "error", time.perf_counter() - started)
+                    if attempt >= self.settings.max_retries:
+                        self._count("failures")
+                        self.breaker.record_failure()
+                        span.set(status="error", attempts=attempt + 1)
+                        raise
+                    logger.warning(f"{self.name} request failed ({e}), retrying")
+                except Exception:
+                    # Not retried, e.g. a connection dropped mid-body (ChunkedEncodingError),
+                    # but still a failed call that must settle a half-open trial
+                    telemetry.record_outbound(self.name, "error", time.perf_counter() - started)
+                    self._count("failures")
+                    self.breaker.record_failure()
+                    span.set(status="error", attempts=attempt + 1)
+                    raise
+                else:
+                    telemetry.record_outbound(self.name, response.status_code, time.perf_counter() - started,
+                                              len(response.content))
+                    if response.status_code not in RETRY_STATUSES or attempt >= self.settings.max_retries:
+                        if response.status_code >= 500:
+                            self.breaker.record_failure()
+                        else:
+                            self.breaker.record_success()
+                        span.set(status=response.status_code, attempts=attempt + 1, bytes=len(response.content))
+                        return response
+                    logger.warning(f"{self.name} returned {response.status_code}, retrying")
+                    retry_after = _retry_after_seconds(response)
+                self._sleep(retry_after, attempt)
+                attempt += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Request, retry and connection counters and the circuit state for this provider."""
+        opened = self.connections_opened()
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "connections_opened": opened,
+            "connections_reused": max(0, self.requests - opened),
+            "circuit": self.breaker.stats(),
+        }
+
+    def connections_opened(self) -> int:
+        """Number of new TCP/TLS connections (handshakes) made by the session's pools."""
+        pools = self.adapter.poolmanager.pools
+        opened = 0
+        for key in pools.keys():
+            try:
+                opened += pools[key].num_connections
+            except KeyError:
+                continue
+        return opened
+
+    def close(self) -> None:
+        """Close all pooled connections."""
+        self.session.close()
+
+    def _sleep(self, retry_after: Optional[float], attempt: int) -> None:
+        self._count("retries")
+        if retry_after is None:
+            delay = self.settings.backoff_factor * (2 ** attempt)
+            delay = min(self.settings.max_backoff, delay) * random.uniform(0.5, 1.5)
+        else:
+            delay = min(self.settings.max_backoff, retry_after)
+        time.sleep(delay)
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+def _retry_after_seconds(response: requests.Response) -> Optional[float]:
+    """Parse a numeric Retry-After header, if present."""
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+_transports: Dict[str, ProviderTransport] = {}
+_transports_lock = threading.Lock()
+
+def get_transport(provider: str) -> ProviderTransport:
+    """Get the shared transport for a provider, creating it on first use."""
+    with _transports_lock:
+        transport = _transports.get(provider)
+        if transport is None:
+            settings = PROVIDER_SETTINGS.get(provider, TransportSettings())
+            transport = ProviderTransport(provider, settings)
+            _transports[provider] = transport
+        return transport
+
+def configure_transport(provider: str, **settings: Any) -> None:
+    """
+    Override transport settings for a provider.
+
+    Any existing session for the provider is closed and rebuilt with the new settings
+    on next use.
+
+    Args:
+        provider: Provider name, e.g. "google" or "weatherapi"
+        **settings: TransportSettings fields to override
+    """
+    base = PROVIDER_SETTINGS.get(provider, TransportSettings())
+    PROVIDER_SETTINGS[provider] = TransportSettings(**{**base.__dict__, **settings})
+    with _transports_lock:
+        transport = _transports.pop(provider, None)
+    if transport is not None:
+        transport.close()
+
+def http_get(provider: str, url: str, params: Optional[Dict[str, Any]] = None,
+             headers: Optional[Dict[str, str]] = None) -> requests.Response:
+    """Send a GET request through the provider's pooled session."""
+    return get_transport(provider).get(url, params=params, headers=headers)
+
+def get_transport_stats() -> Dict[str, Dict[str, Any]]:
+    """Request, retry, connection reuse and circuit figures for every provider used so far."""
+    with _transports_lock:
+        transports = list(_transports.values())
+    return {transport.name: transport.stats() for transport in transports}
+
+def _transport_metrics():
+    """Retry and connection counters of the pooled sessions, for /metrics."""
+    stats = get_transport_stats()
+    families = [
+        (f"tripweather_transport_{counter}_total", "counter", f"Pooled session {counter.replace('_', ' ')}.",
+         [({"provider": name}, values[counter]) for name, values in sorted(stats.items())])
+        for counter in ("retries", "failures", "connections_opened")
+    ]
+    families.append(("tripweather_circuit_open", "gauge", "1 while the provider's circuit is open.",
+                     [({"provider": name}, int(values["circuit"]["state"] != "closed"))
+                      for name, values in sorted(stats.items())]))
+    families.append(("tripweather_circuit_rejected_total", "counter", "Calls refused by an open circuit.",
+                     [({"provider": name}, values["circuit"]["rejected"]) for name, values in sorted(stats.items())]))
+    return families
+
+telemetry.register_collector(_transport_metrics)
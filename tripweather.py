@@ -1,11 +1,33 @@
 import requests
-import polyline
+import numpy as np
 from datetime import datetime, timedelta
 import pytz
 import openai
 import os
-from typing import Optional, Dict, List, Tuple, Any
+from typing import Optional, Dict, List, Tuple, Any, Iterable, Iterator
 import logging
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from route_geometry import CompactRoute, sample_route, decode_polyline
+import telemetry
+from transport import http_get
+from cache import TTLCache, SQLiteStore, quantize_coordinate
+from cache_policy import CachedLookup
+from singleflight import SingleFlight
+from tiles import TileStore
+from forecast_index import HourlySeries
+from models import Forecast, RoutePoint, Stop
+from hazards import assess_trip
+from weather_providers import (
+    MetNoProvider,
+    ProviderError,
+    ProviderRouter,
+    WeatherAPIProvider,
+    WeatherProvider,
+    extract_weatherAPI_details
+)
 
 # Configure logging
 logging.basicConfig(
@@ -14,6 +36,94 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Concurrency limits for the per-trip lookup fan-out. Geocodes hold a "google" slot
+# (see call_limited); the weather providers bound their own in-flight requests.
+DEFAULT_MAX_WORKERS = 8
+PROVIDER_CONCURRENCY = {
+    "google": 4,
+    "weatherapi": 4,
+    "metno": 4,
+}
+_provider_slots = {"google": threading.BoundedSemaphore(PROVIDER_CONCURRENCY["google"])}
+
+# Forecast providers, tried cheapest first ("cost") or fastest first ("latency") with
+# failover to the next one. met.no is free but its terms require a User-Agent that
+# identifies the app and a contact (YR_USER_AGENT); generic ones are blocked, so met.no
+# is only used when it is set. Its UTC times are converted to TRIPWEATHER_TIMEZONE.
+YR_USER_AGENT = os.getenv("YR_USER_AGENT")
+WEATHER_PROVIDERS = os.getenv("TRIPWEATHER_WEATHER_PROVIDERS",
+                              "metno,weatherapi" if YR_USER_AGENT else "weatherapi").split(",")
+PROVIDER_STRATEGY = os.getenv("TRIPWEATHER_PROVIDER_STRATEGY", "cost")
+TRIP_TIMEZONE = os.getenv("TRIPWEATHER_TIMEZONE", "Europe/Stockholm")
+
+# Reverse-geocode cache: postal towns rarely change, so entries live for 30 days.
+# Set TRIPWEATHER_CACHE_DB to a file path to persist the cache across restarts.
+# Expired route, geocode and forecast entries are kept for a grace period (stale_ttl) and
+# served when the provider cannot be reached or refuses the request (see CachedLookup).
+GEOCODE_PRECISION = 2
+CACHE_DB_PATH = os.getenv("TRIPWEATHER_CACHE_DB")
+geocode_cache = TTLCache(
+    "geocode",
+    maxsize=20000,
+    ttl=30 * 24 * 3600,
+    stale_ttl=30 * 24 * 3600,
+    store=SQLiteStore(CACHE_DB_PATH, "geocode") if CACHE_DB_PATH else None
+)
+
+# Directions results per normalised (origin, destination, mode). The same city pairs are
+# requested all day and driving routes rarely change, so routes are kept for a day by default.
+ROUTE_TTL = float(os.getenv("TRIPWEATHER_ROUTE_TTL", str(24 * 3600)))
+ROUTE_CACHE_SIZE = int(os.getenv("TRIPWEATHER_ROUTE_CACHE_SIZE", "2000"))
+route_cache = TTLCache(
+    "route",
+    maxsize=ROUTE_CACHE_SIZE,
+    ttl=ROUTE_TTL,
+    stale_ttl=7 * 24 * 3600,
+    store=SQLiteStore(
+        CACHE_DB_PATH, "route", encode=CompactRoute.to_dict, decode=CompactRoute.from_dict
+    ) if CACHE_DB_PATH else None
+)
+
+# Forecast cache: the full hourly series of one day per (grid cell, date), parsed once into
+# a HourlySeries. weatherapi.com refreshes its forecasts about once an hour, which bounds
+# how long a series stays valid.
+FORECAST_PRECISION = 1
+FORECAST_TTL = 3600
+FORECAST_STALE_TTL = 6 * 3600
+FORECAST_SERVE_STALE_FOR = 15 * 60
+forecast_cache = TTLCache(
+    "forecast",
+    maxsize=5000,
+    ttl=FORECAST_TTL,
+    stale_ttl=FORECAST_STALE_TTL,
+    store=SQLiteStore(
+        CACHE_DB_PATH, "forecast", encode=HourlySeries.to_dict, decode=HourlySeries.from_dict
+    ) if CACHE_DB_PATH else None
+)
+
+# Forecasts and city names precomputed along busy corridors by the warm-up scheduler
+# (see corridors.py), shared by all worker processes through memory-mapped files.
+# A relative TRIPWEATHER_TILE_DIR is resolved against this module's directory.
+TILE_DIR = os.getenv("TRIPWEATHER_TILE_DIR", "corridor_tiles")
+if TILE_DIR:
+    TILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), TILE_DIR)
+corridor_tiles = TileStore(TILE_DIR)
+
+# LLM travel comments, cached on a bucketed summary of the stops (see summarize_stops)
+COMMENT_MODEL = "gpt-4-turbo-preview"
+PRECIPITATION_BANDS = [(0.1, "no"), (1.0, "light"), (4.0, "moderate")]
+WIND_BANDS = [(5.0, "calm"), (10.0, "moderate"), (15.0, "strong")]
+comment_cache = TTLCache("comment", maxsize=1000, ttl=3 * 3600)
+
+# When to ask the LLM for the travel comment instead of the rule-based summary:
+# "always", "hazards" (only when hazards are detected) or "never"
+COMMENT_POLICIES = ("always", "hazards", "never")
+COMMENT_POLICY = os.getenv("TRIPWEATHER_COMMENT_POLICY", "hazards")
+_openai_client: Optional[openai.OpenAI] = None
+_openai_client_lock = threading.Lock()
+_weather_router: Optional[ProviderRouter] = None
+_weather_router_lock = threading.Lock()
+
 def read_api_key(file_path): 
     """Read API key from a file."""
     try:
@@ -48,10 +158,27 @@ class Config:
         """Reset the configuration instance (useful for testing)."""
         self._initialized = False
 
+# Shown in a stop's Error field when its geocode or forecast lookup failed; the
+# exception itself is only logged
+STOP_LOOKUP_ERROR = "Weather lookup failed for this stop"
+
 class APIError(Exception):
     """Custom exception for API-related errors."""
     pass
 
+# Stale-while-revalidate and negative caching for the provider lookups: entries that
+# expired recently are served at once and refreshed in the background, and a failed
+# lookup is remembered for TRIPWEATHER_NEGATIVE_TTL seconds instead of being retried
+# by every request.
+NEGATIVE_TTL = float(os.getenv("TRIPWEATHER_NEGATIVE_TTL", "30"))
+route_lookup = CachedLookup(route_cache, serve_stale_for=6 * 3600, negative_ttl=NEGATIVE_TTL, errors=(APIError,))
+geocode_lookup = CachedLookup(geocode_cache, serve_stale_for=24 * 3600, negative_ttl=NEGATIVE_TTL,
+                              errors=(APIError,))
+forecast_lookup = CachedLookup(forecast_cache, serve_stale_for=FORECAST_SERVE_STALE_FOR, negative_ttl=NEGATIVE_TTL,
+                               errors=(APIError,))
+# Identical lookups awaited by concurrent async trips share one worker thread
+async_lookups = SingleFlight("async_lookup")
+
 def get_config() -> Config:
     """Get the configuration instance."""
     try:
@@ -60,31 +187,56 @@ def get_config() -> Config:
         logger.error(f"Configuration error: {e}")
         raise
 
-def get_route_data_detailed(origin: str, destination: str) -> Tuple[List[Tuple[float, float]], List[Dict[str, Any]]]:
+def normalize_place(place: str) -> str:
+    """Case- and whitespace-insensitive form of a place name, e.g. "sundsvall, sweden"."""
+    return ", ".join(" ".join(part.split()) for part in place.split(",")).casefold()
+
+def route_key(origin: str, destination: str, mode: str = "driving") -> Tuple[str, str, str]:
+    """Route cache key: normalised origin and destination plus the travel mode."""
+    return normalize_place(origin), normalize_place(destination), mode
+
+def get_route_data_detailed(origin: str, destination: str,
+                            mode: str = "driving") -> Tuple[np.ndarray, List[Dict[str, Any]]]:
     """
     Fetch route data from Google Maps Directions API and decode waypoints.
     
+    Routes are cached in ``route_cache`` as a CompactRoute, so repeated requests for
+    the same origin, destination and mode skip the Directions API. Lookups go through
+    ``route_lookup``: a recently expired route is served while it is refreshed in the
+    background, and an older one when the Directions API fails. The lookup is
+    recorded as the "route" stage of the current trace.
+    
     Args:
         origin: Starting location
         destination: Destination location
+        mode: Directions API travel mode
         
     Returns:
         Tuple containing:
-        - List of (latitude, longitude) tuples
+        - Array of shape (n, 2) with latitude and longitude columns
         - List of route steps
         
     Raises:
         APIError: If there's an error fetching the route data
     """
+    with telemetry.span("route", mode=mode) as span:
+        key = route_key(origin, destination, mode)
+        route, source = route_lookup.get(key, lambda: _fetch_route(origin, destination, mode))
+        span.set(cached=source != "fetched", source=source)
+        return decode_polyline(route.polyline), route.steps()
+
+def _fetch_route(origin: str, destination: str, mode: str) -> CompactRoute:
+    """Fetch a route from the Directions API."""
     url = "https://maps.googleapis.com/maps/api/directions/json"
     params = {
         "origin": origin,
         "destination": destination,
+        "mode": mode,
         "key": get_config().GOOGLE_API_KEY
     }
     
     try:
-        response = requests.get(url, params=params, timeout=10)
+        response = http_get("google", url, params=params)
         response.raise_for_status()
         data = response.json()
         
@@ -93,19 +245,108 @@ def get_route_data_detailed(origin: str, destination: str) -> Tuple[List[Tuple[f
         
         polyline_points = data["routes"][0]["overview_polyline"]["points"]
         steps = data["routes"][0]["legs"][0]["steps"]
-        
-        return polyline.decode(polyline_points), steps
+        return CompactRoute.from_directions(polyline_points, steps)
         
     except requests.exceptions.RequestException as e:
         logger.error(f"Error fetching route data: {e}")
         raise APIError(f"Failed to fetch route data: {e}")
 
-def get_weather_comment(weather_data: List[Dict[str, Any]]) -> str:
+def build_weather_provider(name: str) -> WeatherProvider:
+    """
+    Create a forecast provider by name.
+    
+    Raises:
+        ValueError: If the provider is unknown, or is met.no without YR_USER_AGENT
+    """
+    name = name.strip()
+    if name == "weatherapi":
+        return WeatherAPIProvider(lambda: get_config().WEATHERAPI_API_KEY,
+                                  concurrency=PROVIDER_CONCURRENCY["weatherapi"])
+    if name == "metno":
+        if not YR_USER_AGENT:
+            raise ValueError("met.no needs YR_USER_AGENT with the app name and a contact address")
+        return MetNoProvider(YR_USER_AGENT, timezone=TRIP_TIMEZONE,
+                             concurrency=PROVIDER_CONCURRENCY["metno"])
+    raise ValueError(f"Unknown weather provider: {name}")
+
+def get_weather_router() -> ProviderRouter:
+    """Get the shared forecast provider router, creating it on first use."""
+    global _weather_router
+    with _weather_router_lock:
+        if _weather_router is None:
+            providers = []
+            for name in WEATHER_PROVIDERS:
+                try:
+                    providers.append(build_weather_provider(name))
+                except ValueError as e:
+                    logger.error(f"Skipping weather provider {name}: {e}")
+            _weather_router = ProviderRouter(providers, strategy=PROVIDER_STRATEGY)
+        return _weather_router
+
+def get_openai_client() -> openai.OpenAI:
+    """Get the shared OpenAI client, creating it on first use."""
+    global _openai_client
+    with _openai_client_lock:
+        if _openai_client is None:
+            _openai_client = openai.OpenAI(api_key=get_config().OPENAI_API_KEY)
+        return _openai_client
+
+def _temperature_band(temperature: Optional[float]) -> Optional[int]:
+    """Temperature rounded to the nearest 2 °C."""
+    return None if temperature is None else int(round(temperature / 2.0) * 2)
+
+def _band(value: Optional[float], bands: List[Tuple[float, str]], top: str) -> Optional[str]:
+    """Name of the first band whose upper limit exceeds ``value``."""
+    if value is None:
+        return None
+    for limit, name in bands:
+        if value < limit:
+            return name
+    return top
+
+def summarize_stops(weather_data: List[Stop]) -> Tuple[Tuple[Any, ...], ...]:
+    """
+    Normalised, bucketed summary of the stops used for the comment prompt and cache key.
+    
+    Temperatures are rounded to 2 °C and precipitation and wind are reduced to named
+    bands, so forecasts that differ only slightly produce the same summary.
+    
+    Args:
+        weather_data: Stops from ``find_weather_along_route``
+        
+    Returns:
+        Tuple of (city, temperature band, precipitation band, wind band) per stop
+    """
+    return tuple(
+        (
+            stop.city,
+            _temperature_band(stop.temperature),
+            _band(stop.precipitation, PRECIPITATION_BANDS, "heavy"),
+            _band(stop.wind_speed, WIND_BANDS, "storm")
+        )
+        for stop in weather_data
+    )
+
+def build_comment_prompt(summary: Tuple[Tuple[Any, ...], ...]) -> str:
+    """Build the LLM prompt from a bucketed stop summary."""
+    lines = []
+    for city, temperature, precipitation, wind in summary:
+        if temperature is None:
+            lines.append(f"- {city}: no forecast")
+        else:
+            lines.append(f"- {city}: about {temperature}°C, {precipitation} precipitation, {wind} wind")
+    stops = "\n".join(lines)
+    return f"Provide a short and high level travel comment based on the following weather along the route, without going into details on all the stops. However, if there are any indications in the weather forecast that driving can be difficult, such as snowfall, temperatures around 0C or heavy winds, please highlight this. Be quite clean in your comments without unnecessary comments:\n{stops}"
+
+def get_weather_comment(weather_data: List[Stop]) -> str:
     """
     Generate a comment using OpenAI's GPT model.
     
+    Comments are cached on the bucketed stop summary, so near-identical
+    forecasts reuse an earlier comment without calling the API.
+    
     Args:
-        weather_data: List of weather data dictionaries
+        weather_data: Stops along the route
         
     Returns:
         Generated weather comment
@@ -113,66 +354,199 @@ def get_weather_comment(weather_data: List[Dict[str, Any]]) -> str:
     Raises:
         APIError: If there's an error with the OpenAI API
     """
+    summary = summarize_stops(weather_data)
+    comment = comment_cache.get(summary)
+    if comment is not None:
+        return comment
+    
+    started = time.perf_counter()
     try:
-        client = openai.OpenAI(api_key=get_config().OPENAI_API_KEY)
-        prompt = f"Provide a short and high level travel comment based on the following weather data, without going into details on all the stops. However, if there are any indications in the weather forecast that driving can be difficult, such as snowfall, temperatures around 0C or heavy winds, please highlight this. Be quite clean in your comments without unnecessary comments: {weather_data}"
-        
-        response = client.chat.completions.create(
-            model="gpt-4-turbo-preview",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": prompt}
-            ]
+        response = get_openai_client().chat.completions.create(
+            model=COMMENT_MODEL,
+            messages=_comment_messages(summary)
         )
-        
-        return response.choices[0].message.content
+        comment = response.choices[0].message.content
         
     except Exception as e:
+        telemetry.record_outbound("openai", getattr(e, "status_code", "error"), time.perf_counter() - started)
         logger.error(f"Error generating weather comment: {e}")
         raise APIError(f"Failed to generate weather comment: {e}")
+    
+    telemetry.record_outbound("openai", 200, time.perf_counter() - started, len(comment or ""))
+    comment_cache.set(summary, comment)
+    return comment
 
-def get_route_data(origin: str, destination: str) -> List[Dict[str, Any]]:
+def stream_weather_comment(weather_data: List[Stop]) -> Iterator[str]:
     """
-    Fetch route data from Google Maps Directions API.
+    Generate a comment, yielding text chunks as the model produces them.
+    
+    A cached comment is yielded as a single chunk. A completed stream is added to
+    the cache; an interrupted one is not.
     
     Args:
-        origin: Starting location
-        destination: Destination location
+        weather_data: Stops along the route
         
-    Returns:
-        List of route steps
+    Yields:
+        Chunks of the comment text
         
     Raises:
-        APIError: If there's an error fetching the route data
+        APIError: If there's an error with the OpenAI API
     """
-    url = "https://maps.googleapis.com/maps/api/directions/json"
-    params = {
-        "origin": origin,
-        "destination": destination,
-        "key": get_config().GOOGLE_API_KEY
-    }
+    summary = summarize_stops(weather_data)
+    comment = comment_cache.get(summary)
+    if comment is not None:
+        yield comment
+        return
     
+    chunks = []
+    started = time.perf_counter()
     try:
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        stream = get_openai_client().chat.completions.create(
+            model=COMMENT_MODEL,
+            messages=_comment_messages(summary),
+            stream=True
+        )
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if text:
+                chunks.append(text)
+                yield text
         
-        if data["status"] != "OK":
-            raise APIError(f"Google Maps API error: {data['status']}")
+    except Exception as e:
+        telemetry.record_outbound("openai", getattr(e, "status_code", "error"), time.perf_counter() - started)
+        logger.error(f"Error generating weather comment: {e}")
+        raise APIError(f"Failed to generate weather comment: {e}")
+    
+    comment = "".join(chunks)
+    telemetry.record_outbound("openai", 200, time.perf_counter() - started, len(comment))
+    comment_cache.set(summary, comment)
+
+def _use_llm(weather_data: List[Stop], policy: Optional[str], use_llm: bool) -> Tuple[bool, str]:
+    """Decide whether the comment needs the LLM; also returns the templated summary."""
+    policy = policy or COMMENT_POLICY
+    if policy not in COMMENT_POLICIES:
+        raise ValueError(f"Unknown comment policy: {policy}")
+    assessment = assess_trip(weather_data)
+    if policy == "never":
+        return False, assessment.summary
+    return use_llm or policy == "always" or not assessment.benign, assessment.summary
+
+def get_trip_comment(weather_data: List[Stop], policy: Optional[str] = None,
+                     use_llm: bool = False) -> str:
+    """
+    Travel comment for a trip, calling the LLM only when it is needed.
+    
+    The stops are first classified by the rule-based hazard check. Under the
+    "hazards" policy a trip without hazards gets the instant templated summary and
+    only trips with hazards (or an explicit ``use_llm`` request) go to the LLM. If
+    the LLM fails, the templated summary is returned instead.
+    
+    Args:
+        weather_data: Stops along the route
+        policy: "always", "hazards" or "never"; defaults to COMMENT_POLICY
+        use_llm: The user asked for the AI comment; ignored under "never"
         
-        return data["routes"][0]["legs"][0]["steps"]
+    Returns:
+        The travel comment
+    """
+    with telemetry.span("comment") as span:
+        needs_llm, summary = _use_llm(weather_data, policy, use_llm)
+        span.set(llm=needs_llm)
+        if not needs_llm:
+            return summary
+        try:
+            return get_weather_comment(weather_data)
+        except APIError:
+            span.set(fallback=True)
+            return summary
+
+def stream_trip_comment(weather_data: List[Stop], policy: Optional[str] = None,
+                        use_llm: bool = False) -> Iterator[str]:
+    """
+    Streaming form of ``get_trip_comment``.
+    
+    Yields:
+        The templated summary as one chunk, or the LLM comment as it is generated.
+        If the LLM fails before producing any text, the templated summary is yielded.
+    """
+    # Not a context manager: the span must not stay current in the caller while suspended
+    span = telemetry.begin("comment")
+    try:
+        needs_llm, summary = _use_llm(weather_data, policy, use_llm)
+        span.set(llm=needs_llm)
+        if not needs_llm:
+            yield summary
+            return
+        produced = False
+        try:
+            for text in stream_weather_comment(weather_data):
+                produced = True
+                yield text
+        except APIError:
+            if produced:
+                raise
+            span.set(fallback=True)
+            yield summary
+    finally:
+        span.end()
+
+def _comment_messages(summary: Tuple[Tuple[Any, ...], ...]) -> List[Dict[str, str]]:
+    """Chat messages for the travel comment."""
+    return [
+        {"role": "system", "content": "You are a helpful assistant."},
+        {"role": "user", "content": build_comment_prompt(summary)}
+    ]
+
+def geocode_key(lat: float, lng: float) -> Tuple[float, float]:
+    """Cache key of the reverse-geocode grid cell containing a coordinate."""
+    return quantize_coordinate(lat, lng, GEOCODE_PRECISION)
+
+def forecast_cell(lat: float, lng: float) -> Tuple[float, float]:
+    """Forecast grid cell containing a coordinate."""
+    return quantize_coordinate(lat, lng, FORECAST_PRECISION)
+
+def forecast_key(lat: float, lng: float, date_str: str) -> Tuple[float, float, str]:
+    """Cache key of the forecast grid cell and day containing a coordinate."""
+    return (*forecast_cell(lat, lng), date_str)
+
+def plan_forecast_requests(points: Iterable[RoutePoint]) -> Dict[Tuple[float, float], List[str]]:
+    """
+    Group sample points by forecast grid cell, with the days needed in each cell.
+    
+    Each entry is fetched with a single ``get_forecast_days`` call, so the forecast
+    requests of a trip, sweep or batch are bounded by its distinct cells rather than
+    by stops × days.
+    
+    Args:
+        points: Sample points with their arrival times
         
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error fetching route data: {e}")
-        raise APIError(f"Failed to fetch route data: {e}")
+    Returns:
+        Dates ("YYYY-MM-DD", in order of first use) per (latitude, longitude) cell
+    """
+    cells: Dict[Tuple[float, float], List[str]] = {}
+    for lat, lng, arrival_time in points:
+        dates = cells.setdefault(forecast_cell(lat, lng), [])
+        date_str = arrival_time.strftime("%Y-%m-%d")
+        if date_str not in dates:
+            dates.append(date_str)
+    return cells
 
-def get_city_name(lat: float, lng: float) -> str:
+def get_city_name(lat: float, lng: float, use_tiles: bool = True) -> str:
     """
     Get city name from latitude and longitude coordinates.
     
+    Results are cached per grid cell of ``GEOCODE_PRECISION`` decimals, so nearby
+    points resolve without another Geocoding API call. Cells along a warmed-up
+    corridor are answered from ``corridor_tiles``; other lookups go through
+    ``geocode_lookup``, which serves expired entries while refreshing them and when
+    the Geocoding API fails.
+    
     Args:
         lat: Latitude coordinate
         lng: Longitude coordinate
+        use_tiles: Answer from corridor tiles when they cover the cell
         
     Returns:
         City name or "Unknown Location" if not found
@@ -180,9 +554,25 @@ def get_city_name(lat: float, lng: float) -> str:
     Raises:
         APIError: If there's an error with the geocoding API
     """
+    cell = geocode_key(lat, lng)
+    with telemetry.span("geocode", cell=cell) as span:
+        city = corridor_tiles.city(cell) if use_tiles else None
+        if city is not None:
+            span.set(cached=True, source="tile")
+            return city
+        city, source = geocode_lookup.get(cell, lambda: _fetch_city_name(lat, lng))
+        span.set(cached=source != "fetched", source=source)
+        return city
+
+def _fetch_city_name(lat: float, lng: float) -> str:
+    """Fetch the postal town for a coordinate from the Geocoding API."""
     try:
-        geocode_url = f"https://maps.googleapis.com/maps/api/geocode/json?latlng={lat},{lng}&key={get_config().GOOGLE_API_KEY}"
-        response = requests.get(geocode_url, timeout=10)
+        geocode_url = "https://maps.googleapis.com/maps/api/geocode/json"
+        params = {
+            "latlng": f"{lat},{lng}",
+            "key": get_config().GOOGLE_API_KEY
+        }
+        response = http_get("google", geocode_url, params=params)
         response.raise_for_status()
         geocode_result = response.json()
         
@@ -198,7 +588,8 @@ def get_city_name(lat: float, lng: float) -> str:
         logger.error(f"Error fetching city name: {e}")
         raise APIError(f"Failed to fetch city name: {e}")
 
-def get_weatherAPI_forecast(lat: float, lng: float, date_time: datetime) -> Optional[Dict[str, Any]]:
+def get_weatherAPI_forecast(lat: float, lng: float, date_time: datetime,
+                            interpolate: bool = False) -> Optional[Forecast]:
     """
     Get weather forecast for a specific location and time.
     
@@ -206,6 +597,8 @@ def get_weatherAPI_forecast(lat: float, lng: float, date_time: datetime) -> Opti
         lat: Latitude coordinate
         lng: Longitude coordinate
         date_time: Date and time for the forecast
+        interpolate: Interpolate between the neighbouring hours instead of
+            using the closest hour
         
     Returns:
         Weather forecast data or None if not available
@@ -213,107 +606,282 @@ def get_weatherAPI_forecast(lat: float, lng: float, date_time: datetime) -> Opti
     Raises:
         APIError: If there's an error with the weather API
     """
-    try:
-        date_str = date_time.strftime("%Y-%m-%d")
-        url = f"http://api.weatherapi.com/v1/forecast.json?key={get_config().WEATHERAPI_API_KEY}&q={lat},{lng}&dt={date_str}"
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
+    series = get_forecast_series(lat, lng, date_time.strftime("%Y-%m-%d"))
+    return series.at(date_time, interpolate=interpolate)
+
+def get_forecast_series(lat: float, lng: float, date_str: str) -> HourlySeries:
+    """
+    Get the hourly forecast series for the grid cell containing a coordinate.
+    
+    The series is fetched and parsed once per (grid cell, date) and served from
+    ``forecast_cache`` for any later lookup in that cell and day.
+    
+    Args:
+        lat: Latitude coordinate
+        lng: Longitude coordinate
+        date_str: Forecast date as "YYYY-MM-DD"
+        
+    Returns:
+        The parsed series, empty if the day is not available
+        
+    Raises:
+        APIError: If there's an error with the weather API
+    """
+    return get_forecast_days(lat, lng, [date_str])[date_str]
+
+def get_forecast_days(lat: float, lng: float, dates: List[str]) -> Dict[str, HourlySeries]:
+    """
+    Get the hourly forecast series of several days for one grid cell.
+    
+    Cells along a warmed-up corridor are answered from ``corridor_tiles`` when a
+    fresh tile covers every requested day. Otherwise, days already in
+    ``forecast_cache`` are served from it; all missing days are fetched together
+    with one provider request where the provider supports it, and
+    every day that came back is cached per (grid cell, date). Days that expired less
+    than ``FORECAST_SERVE_STALE_FOR`` ago are served while the cell is refreshed in
+    the background. Concurrent requests for the same cell and days share one fetch.
+    When the providers fail, the failure is remembered for the cell (see
+    ``forecast_lookup``) and expired series are served if there are any.
+    
+    Args:
+        lat: Latitude coordinate
+        lng: Longitude coordinate
+        dates: Forecast dates as "YYYY-MM-DD"
         
-        forecast_data = response.json()
-        forecast_day = forecast_data.get('forecast', {}).get('forecastday', [])[0]
+    Returns:
+        Series per requested date, empty if the day is not available
         
-        if not forecast_day:
-            return None
+    Raises:
+        APIError: If there's an error with the weather API
+    """
+    cell = forecast_cell(lat, lng)
+    with telemetry.span("forecast", cell=cell, days=len(dates)) as span:
+        tiled = corridor_tiles.forecast_days(cell, dates)
+        if tiled is not None:
+            span.set(cached=True, source="tile")
+            return tiled
+        result: Dict[str, HourlySeries] = {}
+        missing = []
+        refresh = []
+        for date_str in dict.fromkeys(dates):
+            series = forecast_cache.get((*cell, date_str))
+            if series is None:
+                series = forecast_cache.get_stale((*cell, date_str), max_age=forecast_lookup.serve_stale_for)
+                if series is not None:
+                    refresh.append(date_str)
+            if series is None:
+                missing.append(date_str)
+            else:
+                result[date_str] = series
+        if refresh:
+            forecast_lookup.refresh_in_background(cell, lambda: _fetch_forecast_days(cell, refresh))
+        span.set(cached=not missing, stale=len(refresh))
+        if not missing:
+            return result
         
-        closest_hour = min(
-            forecast_day['hour'],
-            key=lambda h: abs(datetime.strptime(h['time'], "%Y-%m-%d %H:%M") - date_time)
-        )
+        error = forecast_cache.get_failure(cell)
+        if error is None:
+            try:
+                fetched, _ = forecast_lookup.flight.do((cell, tuple(missing)), _fetch_forecast_days, cell, missing)
+            except APIError as e:
+                forecast_cache.set_failure(cell, e, forecast_lookup.negative_ttl)
+                error = e
+        if error is not None:
+            for date_str in missing:
+                result[date_str] = forecast_lookup.fallback((*cell, date_str), error)
+            span.set(source="fallback")
+            return result
+        for date_str in missing:
+            result[date_str] = fetched.get(date_str, HourlySeries.from_rows([]))
+        return result
+
+def fetch_forecast_days(lat: float, lng: float, dates: List[str]) -> Dict[str, HourlySeries]:
+    """
+    Fetch days of one grid cell from the weather providers, bypassing tiles and caches.
+    
+    Unlike ``get_forecast_days``, no cached or expired series and no remembered
+    failure is used, so nothing older than the providers' own data is returned. The
+    fetched days are cached as usual, and concurrent identical fetches are shared.
+    
+    Args:
+        lat: Latitude coordinate
+        lng: Longitude coordinate
+        dates: Forecast dates as "YYYY-MM-DD"
         
-        return extract_weatherAPI_details(closest_hour)
+    Returns:
+        Series per requested date, empty if the day is not available
         
-    except requests.exceptions.RequestException as e:
+    Raises:
+        APIError: If there's an error with the weather API
+    """
+    cell = forecast_cell(lat, lng)
+    dates = list(dict.fromkeys(dates))
+    fetched, _ = forecast_lookup.flight.do((cell, tuple(dates)), _fetch_forecast_days, cell, dates)
+    return {date_str: fetched.get(date_str, HourlySeries.from_rows([])) for date_str in dates}
+
+def _fetch_forecast_days(cell: Tuple[float, float], dates: List[str]) -> Dict[str, HourlySeries]:
+    """Fetch days of one grid cell from the weather providers and cache every non-empty day."""
+    try:
+        fetched = get_weather_router().fetch_days(cell[0], cell[1], dates)
+    except ProviderError as e:
         logger.error(f"Error fetching weather forecast: {e}")
         raise APIError(f"Failed to fetch weather forecast: {e}")
+    for date_str, series in fetched.items():
+        if len(series):
+            forecast_cache.set((*cell, date_str), series)
+    return fetched
 
-def extract_weatherAPI_details(weather_data: Dict[str, Any]) -> Dict[str, Any]:
+def call_limited(provider: str, func, *args) -> Any:
+    """Call ``func`` while holding one of the provider's in-flight slots."""
+    with _provider_slots[provider]:
+        return func(*args)
+
+def lookup_points(points: List[RoutePoint],
+                  max_workers: int = DEFAULT_MAX_WORKERS) -> List[Tuple[str, Optional[Forecast], Optional[str]]]:
     """
-    Extract and format weather details from API response.
+    Geocode and fetch the forecast for every sample point concurrently.
+    
+    All lookups for the trip are submitted to a bounded thread pool at once, while
+    ``PROVIDER_CONCURRENCY`` caps the number of in-flight requests per provider.
+    Forecasts are fetched once per grid cell for all the days its points need
+    (see ``plan_forecast_requests``).
     
     Args:
-        weather_data: Raw weather data from API
+        points: Sample points along the route
+        max_workers: Size of the thread pool; 1 runs the lookups sequentially
         
     Returns:
-        Formatted weather details
+        List of (city, weather, error) tuples in the same order as ``points``.
+        A failed lookup does not fail the trip; its message is returned in ``error``.
+    """
+    results: List[Any] = [None] * len(points)
+    for index, result in iter_lookup_points(points, max_workers):
+        results[index] = result
+    return results
+
+def iter_lookup_points(points: List[RoutePoint],
+                       max_workers: int = DEFAULT_MAX_WORKERS) -> Iterator[Tuple[int, Tuple[str, Optional[Forecast], Optional[str]]]]:
     """
-    temperature = weather_data.get('temp_c', None)
-    precipitation = weather_data.get('precip_mm', None)
-    wind_speed = weather_data.get('wind_kph', None)
-    icon_url = weather_data.get('condition', {}).get('icon', None)
+    Generator form of ``lookup_points`` yielding each point as soon as it resolves.
     
-    if icon_url and not icon_url.startswith("http"):
-        icon_url = "https:" + icon_url
+    Args:
+        points: Sample points along the route
+        max_workers: Size of the thread pool
+        
+    Yields:
+        (index into ``points``, (city, weather, error)) in completion order
+    """
+    if not points:
+        return
     
-    if wind_speed is not None:
-        wind_speed = round(wind_speed / 3.6, 1)  # Convert kph to mps
+    cells = plan_forecast_requests(points)
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(points) + len(cells))))
+    try:
+        forecasts = {
+            cell: executor.submit(telemetry.in_context(get_forecast_days), cell[0], cell[1], dates)
+            for cell, dates in cells.items()
+        }
+        pending = {}
+        for index, (lat, lng, arrival_time) in enumerate(points):
+            pending[index] = (
+                executor.submit(telemetry.in_context(call_limited), "google", get_city_name, lat, lng),
+                forecasts[forecast_cell(lat, lng)]
+            )
         
+        while pending:
+            wait({future for pair in pending.values() for future in pair}, return_when=FIRST_COMPLETED)
+            for index in [index for index, pair in pending.items() if all(future.done() for future in pair)]:
+                city_future, days_future = pending.pop(index)
+                errors = []
+                city = _future_result(city_future, errors, "Unknown Location")
+                weather = forecast_at(_future_result(days_future, errors, None), points[index].arrival_time)
+                yield index, (city, weather, "; ".join(errors) or None)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def forecast_at(days: Optional[Dict[str, HourlySeries]], date_time: datetime) -> Optional[Forecast]:
+    """Forecast for a time from ``get_forecast_days`` output, or None if its day is missing."""
+    series = days.get(date_time.strftime("%Y-%m-%d")) if days else None
+    return series.at(date_time) if series is not None else None
+
+def record_stop_error(errors: List[str], error: Exception) -> None:
+    """
+    Log a failed stop lookup and record the generic message shown for it.
+    
+    Provider exceptions can carry the request URL, API key included, so their text
+    only goes to the server log; ``errors`` gets ``STOP_LOOKUP_ERROR`` once.
+    """
+    logger.error(f"Lookup failed for stop: {error}")
+    if STOP_LOOKUP_ERROR not in errors:
+        errors.append(STOP_LOOKUP_ERROR)
+
+def _future_result(future: Future, errors: List[str], default: Any) -> Any:
+    """Return the future's result, recording its exception in ``errors`` instead of raising."""
+    try:
+        return future.result()
+    except Exception as e:
+        record_stop_error(errors, e)
+        return default
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Hit rate and eviction counters for the route, lookup and comment caches."""
     return {
-        "temperature": temperature,
-        "precipitation": precipitation,
-        "wind_speed": wind_speed,
-        "icon_url": icon_url
+        "route": route_cache.stats(),
+        "geocode": geocode_cache.stats(),
+        "forecast": forecast_cache.stats(),
+        "comment": comment_cache.stats()
     }
 
-def find_weather_along_route(origin: str, destination: str, start_date_time: datetime) -> List[Dict[str, Any]]:
+def _cache_metrics():
+    """Cache counters for /metrics."""
+    stats = get_cache_stats()
+    families = [
+        (f"tripweather_cache_{counter}_total", "counter", f"Cache {counter}.",
+         [({"cache": name}, values[counter]) for name, values in stats.items()])
+        for counter in ("hits", "misses", "evictions", "expirations", "stale_hits", "negative_hits")
+    ]
+    families.append(("tripweather_cache_entries", "gauge", "Entries held in memory.",
+                     [({"cache": name}, values["size"]) for name, values in stats.items()]))
+    return families
+
+telemetry.register_collector(_cache_metrics)
+
+def find_weather_along_route(origin: str, destination: str, start_date_time: datetime,
+                             max_workers: int = DEFAULT_MAX_WORKERS,
+                             stops: Optional[int] = None,
+                             spacing_km: Optional[float] = None,
+                             spacing_minutes: Optional[float] = None) -> List[Stop]:
     """
     Find weather conditions along a route at regular intervals.
     
+    Sample points are spread evenly by distance (or driving time) along the route,
+    and their arrival times are derived from the steps of the single Directions API
+    response, so the route is only requested once per trip. Without a sampling
+    option ``DEFAULT_SAMPLES`` stops are used.
+    
     Args:
         origin: Starting location
         destination: Destination location
         start_date_time: Start time of the journey
+        max_workers: Number of concurrent geocode and forecast lookups
+        stops: Number of evenly spaced stops
+        spacing_km: Distance between stops, instead of a stop count
+        spacing_minutes: Driving time between stops, instead of a stop count
         
     Returns:
-        List of weather data points along the route
+        List of stops along the route. Stops whose lookups failed carry an
+        ``error`` instead of failing the whole trip.
         
     Raises:
         APIError: If there's an error fetching route or weather data
     """
     try:
-        waypoints, steps = get_route_data_detailed(origin, destination)
-        
-        if not waypoints:
-            return []
+        points = plan_route_points(origin, destination, start_date_time, stops, spacing_km, spacing_minutes)
         
-        current_time = start_date_time
         weather_data_list = []
-        lat_start, lng_start = waypoints[0]
-        total_stops = 10
-        interval = max(1, len(waypoints) // (total_stops - 1))
-        
-        for i, (lat, lng) in enumerate(waypoints):
-            if i % interval == 0 or i == len(waypoints) - 1:
-                steps = get_route_data(f"{lat_start},{lng_start}", f"{lat},{lng}")
-                
-                for step in steps:
-                    duration = step['duration']['value']
-                    current_time = current_time + timedelta(seconds=duration)
-                
-                city = get_city_name(lat, lng)
-                weather = get_weatherAPI_forecast(lat, lng, current_time)
-                
-                if weather:
-                    weather_dict = {
-                        "City": city,
-                        "Time": current_time.strftime("%Y-%m-%d %H:%M:%S"),
-                        "Temperature": weather['temperature'],
-                        "Precipitation": weather['precipitation'],
-                        "WindSpeed": weather['wind_speed'],
-                        "IconURL": weather['icon_url']
-                    }
-                    weather_data_list.append(weather_dict)
-                
-                lat_start, lng_start = lat, lng
+        for (lat, lng, current_time), (city, weather, error) in zip(points, lookup_points(points, max_workers)):
+            if weather or error:
+                weather_data_list.append(build_stop(current_time, city, weather, error))
         
         return weather_data_list
         
@@ -321,6 +889,179 @@ def find_weather_along_route(origin: str, destination: str, start_date_time: dat
         logger.error(f"Error finding weather along route: {e}")
         raise APIError(f"Failed to find weather along route: {e}")
 
+def iter_weather_along_route(origin: str, destination: str, start_date_time: datetime,
+                             max_workers: int = DEFAULT_MAX_WORKERS,
+                             stops: Optional[int] = None,
+                             spacing_km: Optional[float] = None,
+                             spacing_minutes: Optional[float] = None) -> Iterator[Tuple[int, Stop]]:
+    """
+    Generator form of ``find_weather_along_route`` for streaming results.
+    
+    The route is fetched first; each stop is then yielded as soon as its geocode
+    and forecast lookups have resolved, in completion order.
+    
+    Args:
+        origin: Starting location
+        destination: Destination location
+        start_date_time: Start time of the journey
+        max_workers: Number of concurrent geocode and forecast lookups
+        stops: Number of evenly spaced stops
+        spacing_km: Distance between stops, instead of a stop count
+        spacing_minutes: Driving time between stops, instead of a stop count
+        
+    Yields:
+        (stop index along the route, stop). Points without a forecast
+        and without an error are skipped.
+        
+    Raises:
+        APIError: If there's an error fetching route data
+    """
+    try:
+        points = plan_route_points(origin, destination, start_date_time, stops, spacing_km, spacing_minutes)
+    except Exception as e:
+        logger.error(f"Error finding weather along route: {e}")
+        raise APIError(f"Failed to find weather along route: {e}")
+    
+    for index, (city, weather, error) in iter_lookup_points(points, max_workers):
+        if weather or error:
+            yield index, build_stop(points[index].arrival_time, city, weather, error)
+
+async def find_weather_along_route_async(origin: str, destination: str, start_date_time: datetime,
+                                         stops: Optional[int] = None,
+                                         spacing_km: Optional[float] = None,
+                                         spacing_minutes: Optional[float] = None) -> List[Stop]:
+    """
+    Awaitable version of ``find_weather_along_route``.
+    
+    The blocking provider calls run in worker threads while the caller awaits them,
+    so the event loop stays free to serve other requests. All geocode lookups and the
+    per-cell forecast requests of the trip are awaited together, within
+    ``PROVIDER_CONCURRENCY``. Lookups identical to one already awaited, by this or a
+    concurrent trip, wait for its result without taking another worker thread.
+    
+    Args:
+        origin: Starting location
+        destination: Destination location
+        start_date_time: Start time of the journey
+        stops: Number of evenly spaced stops
+        spacing_km: Distance between stops, instead of a stop count
+        spacing_minutes: Driving time between stops, instead of a stop count
+        
+    Returns:
+        List of stops along the route, as ``find_weather_along_route``
+        
+    Raises:
+        APIError: If there's an error fetching route data
+    """
+    try:
+        points = await asyncio.to_thread(
+            plan_route_points, origin, destination, start_date_time, stops, spacing_km, spacing_minutes
+        )
+        cells = plan_forecast_requests(points)
+        results = await asyncio.gather(
+            *(_lookup_async(("geocode", geocode_key(lat, lng)), call_limited, "google", get_city_name, lat, lng)
+              for lat, lng, _ in points),
+            *(_lookup_async(("forecast", lat, lng, tuple(dates)), get_forecast_days, lat, lng, dates)
+              for (lat, lng), dates in cells.items()),
+            return_exceptions=True
+        )
+        days_by_cell = dict(zip(cells, results[len(points):]))
+        lookups = [
+            _point_result(city, days_by_cell[forecast_cell(lat, lng)], arrival_time)
+            for (lat, lng, arrival_time), city in zip(points, results[:len(points)])
+        ]
+        
+        return [
+            build_stop(arrival_time, city, weather, error)
+            for (_, _, arrival_time), (city, weather, error) in zip(points, lookups)
+            if weather or error
+        ]
+        
+    except Exception as e:
+        logger.error(f"Error finding weather along route: {e}")
+        raise APIError(f"Failed to find weather along route: {e}")
+
+async def _lookup_async(key: Tuple[Any, ...], func, *args) -> Any:
+    """Run a blocking lookup in a worker thread, shared with identical lookups in flight."""
+    result, _ = await async_lookups.do_async(key, func, *args)
+    return result
+
+def _point_result(city: Any, days: Any, arrival_time: datetime) -> Tuple[str, Optional[Forecast], Optional[str]]:
+    """Combine one point's geocode and cell forecasts, either of which may be an exception."""
+    errors = []
+    if isinstance(city, Exception):
+        record_stop_error(errors, city)
+        city = "Unknown Location"
+    if isinstance(days, Exception):
+        record_stop_error(errors, days)
+        days = None
+    return city, forecast_at(days, arrival_time), "; ".join(errors) or None
+
+def build_trip_report(origin: str, destination: str, start_date_time: datetime,
+                      stops: Optional[int] = None,
+                      spacing_km: Optional[float] = None,
+                      spacing_minutes: Optional[float] = None,
+                      use_llm: bool = False) -> Dict[str, Any]:
+    """
+    Compute the full result shown for a trip: the stops and the AI comment.
+    
+    Args:
+        origin: Starting location
+        destination: Destination location
+        start_date_time: Start time of the journey
+        stops: Number of evenly spaced stops
+        spacing_km: Distance between stops, instead of a stop count
+        spacing_minutes: Driving time between stops, instead of a stop count
+        use_llm: Ask the LLM for the comment even when no hazards are found
+        
+    Returns:
+        Dictionary with the serialised stops as "weather_data" and "ai_comment"
+        
+    Raises:
+        APIError: If there's an error fetching the route
+    """
+    with telemetry.trace("trip_report", origin=origin, destination=destination):
+        weather_data = find_weather_along_route(
+            origin, destination, start_date_time,
+            stops=stops, spacing_km=spacing_km, spacing_minutes=spacing_minutes
+        )
+        ai_comment = get_trip_comment(weather_data, use_llm=use_llm) if weather_data else ""
+    return {"weather_data": [stop.to_dict() for stop in weather_data], "ai_comment": ai_comment}
+
+def plan_route_points(origin: str, destination: str, start_date_time: datetime,
+                      stops: Optional[int] = None,
+                      spacing_km: Optional[float] = None,
+                      spacing_minutes: Optional[float] = None) -> List[RoutePoint]:
+    """
+    Fetch the route once and sample the points to look weather up for.
+    
+    Args:
+        origin: Starting location
+        destination: Destination location
+        start_date_time: Start time of the journey
+        stops: Number of evenly spaced stops
+        spacing_km: Distance between stops, instead of a stop count
+        spacing_minutes: Driving time between stops, instead of a stop count
+        
+    Returns:
+        Sample points with their arrival times
+        
+    Raises:
+        APIError: If there's an error fetching the route data
+    """
+    waypoints, steps = get_route_data_detailed(origin, destination)
+    
+    if len(waypoints) == 0:
+        return []
+    
+    samples = sample_route(waypoints, steps, count=stops, spacing_km=spacing_km, spacing_minutes=spacing_minutes)
+    return [RoutePoint(lat, lng, start_date_time + timedelta(seconds=offset)) for lat, lng, offset in samples]
+
+def build_stop(arrival_time: datetime, city: str, weather: Optional[Forecast],
+               error: Optional[str] = None) -> Stop:
+    """Combine one stop's lookups; ``Stop.to_dict`` serialises it for the template and JSON."""
+    return Stop(city, arrival_time, weather, error or None)
+
 if __name__ == "__main__":
     # Example usage
     try:
@@ -329,7 +1070,7 @@ if __name__ == "__main__":
         test_start_time = datetime.now()
         
         weather_data = find_weather_along_route(test_origin, test_destination, test_start_time)
-        print(weather_data)
+        print([stop.to_dict() for stop in weather_data])
         
     except APIError as e:
         logger.error(f"API Error: {e}")
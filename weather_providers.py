@@ -0,0 +1,443 @@
+import threading
+import time
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from email.utils import parsedate_to_datetime
+from typing import Optional, Dict, List, Tuple, Any, Callable
+
+import pytz
+import requests
+
+from cache import TTLCache
+from forecast_index import HourlySeries
+from models import Forecast
+from ratelimit import RateLimitExceeded
+from transport import http_get
+
+logger = logging.getLogger(__name__)
+
+class ProviderError(Exception):
+    """A weather provider could not deliver a forecast."""
+    pass
+
+class RateLimitedError(ProviderError):
+    """The provider rejected the request because of its rate limit or quota."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class WeatherProvider:
+    """
+    A source of hourly forecasts.
+
+    Subclasses implement ``_fetch`` and may override ``_fetch_days`` when one request
+    can cover several days; ``fetch_series`` and ``fetch_days`` bound the number of
+    requests in flight to the provider with ``concurrency``. ``cost`` is the relative
+    price of one request, used by ProviderRouter to prefer cheaper providers.
+    """
+    name = "provider"
+
+    def __init__(self, cost: float = 1.0, concurrency: int = 4):
+        self.cost = cost
+        self._slots = threading.BoundedSemaphore(concurrency)
+
+    def fetch_series(self, lat: float, lng: float, date_str: str) -> HourlySeries:
+        """
+        Fetch the hourly forecast of one day at a coordinate.
+
+        Args:
+            lat: Latitude coordinate
+            lng: Longitude coordinate
+            date_str: Forecast date as "YYYY-MM-DD", in trip (wall-clock) time
+
+        Returns:
+            The parsed series, empty if the provider has no forecast for the day
+
+        Raises:
+            RateLimitedError: If the provider is rate limiting us
+            ProviderError: If the request or the response is invalid
+        """
+        with self._slots:
+            return self._fetch(lat, lng, date_str)
+
+    def fetch_days(self, lat: float, lng: float, dates: List[str]) -> Dict[str, HourlySeries]:
+        """
+        Fetch the hourly forecasts of several days at a coordinate.
+
+        Args:
+            lat: Latitude coordinate
+            lng: Longitude coordinate
+            dates: Forecast dates as "YYYY-MM-DD"
+
+        Returns:
+            Series per date; every requested date is present (empty if not covered), and
+            other days that came with the same response may be included as well
+
+        Raises:
+            RateLimitedError: If the provider is rate limiting us
+            ProviderError: If the request or the response is invalid
+        """
+        with self._slots:
+            return self._fetch_days(lat, lng, dates)
+
+    def _fetch(self, lat: float, lng: float, date_str: str) -> HourlySeries:
+        raise NotImplementedError
+
+    def _fetch_days(self, lat: float, lng: float, dates: List[str]) -> Dict[str, HourlySeries]:
+        return {date_str: self._fetch(lat, lng, date_str) for date_str in dates}
+
+def _check_response(provider: str, response: requests.Response) -> None:
+    """Raise the matching ProviderError for a failed response."""
+    if response.status_code == 429:
+        raise RateLimitedError(f"{provider} rate limit exceeded", _retry_after(response))
+    try:
+        response.raise_for_status()
+    except requests.exceptions.HTTPError as e:
+        raise ProviderError(f"{provider} request failed: {e}")
+
+def _retry_after(response: requests.Response) -> Optional[float]:
+    try:
+        return max(0.0, float(response.headers["Retry-After"]))
+    except (KeyError, ValueError):
+        return None
+
+class WeatherAPIProvider(WeatherProvider):
+    """
+    weatherapi.com forecasts; hours are in the location's local time.
+
+    A single day is requested with ``dt=``. Several days are requested together with
+    ``days=``, which returns every day from the location's today up to ``MAX_DAYS``;
+    dates that response does not cover (past days, days beyond the plan's range) are
+    then requested one by one with ``dt=``.
+    """
+    name = "weatherapi"
+    URL = "https://api.weatherapi.com/v1/forecast.json"
+    MAX_DAYS = 14
+
+    def __init__(self, api_key: Callable[[], str], cost: float = 1.0, concurrency: int = 4):
+        super().__init__(cost, concurrency)
+        self.api_key = api_key
+
+    def _fetch(self, lat: float, lng: float, date_str: str) -> HourlySeries:
+        days = self._request(lat, lng, dt=date_str)
+        return days.get(date_str, HourlySeries.from_rows([]))
+
+    def _fetch_days(self, lat: float, lng: float, dates: List[str]) -> Dict[str, HourlySeries]:
+        today = date.today()
+        offsets = [(datetime.strptime(date_str, "%Y-%m-%d").date() - today).days for date_str in dates]
+        in_range = [offset for offset in offsets if -1 <= offset < self.MAX_DAYS]
+        result: Dict[str, HourlySeries] = {}
+        if len(in_range) > 1:
+            # One extra day in case the location's today is behind ours
+            result = self._request(lat, lng, days=min(self.MAX_DAYS, max(in_range) + 2))
+        for date_str in dates:
+            if date_str not in result:
+                result[date_str] = self._fetch(lat, lng, date_str)
+        return result
+
+    def _request(self, lat: float, lng: float, **params: Any) -> Dict[str, HourlySeries]:
+        """Send one forecast.json request and parse every returned day."""
+        params = {"key": self.api_key(), "q": f"{lat},{lng}", **params}
+        try:
+            response = http_get(self.name, self.URL, params=params)
+            _check_response(self.name, response)
+            forecast_days = response.json().get('forecast', {}).get('forecastday', [])
+        except RateLimitExceeded as e:
+            raise RateLimitedError(str(e), e.retry_after)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            raise ProviderError(f"Failed to fetch weather forecast: {e}")
+
+        result = {}
+        for day in forecast_days:
+            hours = day.get('hour', [])
+            date_str = day.get('date') or (hours[0]['time'][:10] if hours else None)
+            if date_str:
+                result[date_str] = parse_weatherAPI_hours(hours)
+        return result
+
+def parse_weatherAPI_hours(hours: List[Dict[str, Any]]) -> HourlySeries:
+    """Parse weatherapi.com hour entries into a HourlySeries."""
+    return HourlySeries.from_rows([
+        (datetime.strptime(hour['time'], "%Y-%m-%d %H:%M"), extract_weatherAPI_details(hour))
+        for hour in hours
+    ])
+
+def extract_weatherAPI_details(weather_data: Dict[str, Any]) -> Forecast:
+    """
+    Extract and format weather details from API response.
+
+    Args:
+        weather_data: Raw weather data from API
+
+    Returns:
+        Formatted weather details
+    """
+    temperature = weather_data.get('temp_c', None)
+    precipitation = weather_data.get('precip_mm', None)
+    wind_speed = weather_data.get('wind_kph', None)
+    icon_url = weather_data.get('condition', {}).get('icon', None)
+
+    if icon_url and not icon_url.startswith("http"):
+        icon_url = "https:" + icon_url
+
+    if wind_speed is not None:
+        wind_speed = round(wind_speed / 3.6, 1)  # Convert kph to mps
+
+    return Forecast(temperature, precipitation, wind_speed, icon_url)
+
+@dataclass
+class _MetNoEntry:
+    """A parsed locationforecast response and the headers needed to revalidate it."""
+    series: HourlySeries
+    last_modified: Optional[str]
+    expires: float
+
+class MetNoProvider(WeatherProvider):
+    """
+    MET Norway locationforecast (the forecast behind yr.no).
+
+    One request returns about nine days for a location, so the whole timeseries is
+    parsed once into a HourlySeries per location and days are cut out of it with
+    ``HourlySeries.window``. met.no asks clients to honour ``Expires`` and to revalidate
+    with ``If-Modified-Since``: until a response expires it is served without a request,
+    and afterwards a 304 Not Modified keeps the parsed series.
+
+    met.no reports UTC; times are converted to ``timezone`` so they compare with the
+    naive wall-clock trip times like weatherapi.com's local hours. While the local
+    rate limiter holds requests back, an expired entry is served as it is.
+    """
+    name = "metno"
+    URL = "https://api.met.no/weatherapi/locationforecast/2.0/compact"
+    ICON_URL = "https://raw.githubusercontent.com/metno/weathericons/main/weather/png/{symbol}.png"
+
+    def __init__(self, user_agent: str, timezone: str = "Europe/Stockholm", cost: float = 0.0,
+                 concurrency: int = 4, maxsize: int = 5000):
+        super().__init__(cost, concurrency)
+        self.user_agent = user_agent
+        self.timezone = pytz.timezone(timezone)
+        # Entries outlive their Expires header so they can still be revalidated
+        self.entries = TTLCache("metno", maxsize=maxsize, ttl=24 * 3600)
+
+    def _fetch(self, lat: float, lng: float, date_str: str) -> HourlySeries:
+        key = (round(lat, 4), round(lng, 4))
+        entry = self.entries.get(key)
+        if entry is None or time.time() >= entry.expires:
+            entry = self._refresh(key, entry)
+        day = datetime.strptime(date_str, "%Y-%m-%d")
+        return entry.series.window(day, day + timedelta(days=1))
+
+    def _refresh(self, key: Tuple[float, float], entry: Optional[_MetNoEntry]) -> _MetNoEntry:
+        """Download or revalidate the timeseries of one location."""
+        headers = {"User-Agent": self.user_agent}
+        if entry is not None and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        params = {"lat": key[0], "lon": key[1]}
+        try:
+            response = http_get(self.name, self.URL, params=params, headers=headers)
+            if response.status_code == 304 and entry is not None:
+                entry = _MetNoEntry(entry.series, entry.last_modified, _expires(response))
+            else:
+                _check_response(self.name, response)
+                entry = _MetNoEntry(
+                    self.parse(response.json()), response.headers.get("Last-Modified"), _expires(response)
+                )
+        except RateLimitExceeded as e:
+            if entry is not None:
+                logger.warning(f"Serving expired met.no forecast for {key}: {e}")
+                return entry
+            raise RateLimitedError(str(e), e.retry_after)
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            raise ProviderError(f"Failed to fetch met.no forecast: {e}")
+
+        self.entries.set(key, entry)
+        return entry
+
+    def parse(self, data: Dict[str, Any]) -> HourlySeries:
+        """Parse a locationforecast/2.0 compact response into a HourlySeries."""
+        rows = []
+        for step in data['properties']['timeseries']:
+            utc = datetime.strptime(step['time'], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=pytz.utc)
+            rows.append((utc.astimezone(self.timezone).replace(tzinfo=None), self._forecast(step['data'])))
+        return HourlySeries.from_rows(rows)
+
+    def _forecast(self, data: Dict[str, Any]) -> Forecast:
+        details = data.get('instant', {}).get('details', {})
+        precipitation = None
+        symbol = None
+        # Hourly steps carry next_1_hours; the later 6-hourly steps only next_6_hours
+        for period, hours in (('next_1_hours', 1), ('next_6_hours', 6)):
+            if period in data:
+                amount = data[period].get('details', {}).get('precipitation_amount')
+                precipitation = None if amount is None else round(amount / hours, 1)
+                symbol = data[period].get('summary', {}).get('symbol_code')
+                break
+        return Forecast(
+            details.get('air_temperature'),
+            precipitation,
+            details.get('wind_speed'),
+            self.ICON_URL.format(symbol=symbol) if symbol else None
+        )
+
+def _expires(response: requests.Response) -> float:
+    """Epoch of the response's Expires header, or now if it is missing or invalid."""
+    try:
+        return parsedate_to_datetime(response.headers["Expires"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return time.time()
+
+@dataclass
+class ProviderHealth:
+    """Failure and latency bookkeeping for one provider."""
+    requests: int = 0
+    errors: int = 0
+    consecutive_failures: int = 0
+    unavailable_until: float = 0.0
+    latency: Optional[float] = None  # exponentially weighted mean, seconds
+
+class ProviderRouter:
+    """
+    Route forecast requests to the cheapest (or fastest) healthy provider.
+
+    Providers are tried in order of ``cost`` (strategy "cost") or observed latency
+    (strategy "latency"), ties broken by the order given. A rate-limited provider is
+    skipped for its Retry-After (or ``cooldown``) seconds, and one that failed
+    ``max_failures`` times in a row for ``cooldown`` seconds; the next provider is tried
+    instead. Days a provider returns empty also fall through, so a provider with a
+    shorter forecast range does not hide a longer one.
+    """
+    STRATEGIES = ("cost", "latency")
+
+    def __init__(self, providers: List[WeatherProvider], strategy: str = "cost",
+                 cooldown: float = 60.0, max_failures: int = 3):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown provider strategy: {strategy}")
+        if not providers:
+            raise ValueError("At least one weather provider is required")
+        self.providers = providers
+        self.strategy = strategy
+        self.cooldown = cooldown
+        self.max_failures = max_failures
+        self._lock = threading.Lock()
+        self._health = {provider.name: ProviderHealth() for provider in providers}
+
+    def order(self) -> List[WeatherProvider]:
+        """Providers in the order they will be tried; unavailable ones last."""
+        now = time.time()
+        with self._lock:
+            def rank(indexed: Tuple[int, WeatherProvider]) -> Tuple[Any, ...]:
+                index, provider = indexed
+                health = self._health[provider.name]
+                available = health.unavailable_until <= now
+                if self.strategy == "latency":
+                    preference = (health.latency or 0.0, provider.cost)
+                else:
+                    preference = (provider.cost, health.latency or 0.0)
+                return (not available, health.unavailable_until if not available else 0.0, *preference, index)
+            return [provider for _, provider in sorted(enumerate(self.providers), key=rank)]
+
+    def fetch_series(self, lat: float, lng: float, date_str: str) -> HourlySeries:
+        """
+        Fetch one day of forecasts from the first provider that delivers it.
+
+        Args:
+            lat: Latitude coordinate
+            lng: Longitude coordinate
+            date_str: Forecast date as "YYYY-MM-DD"
+
+        Returns:
+            The first non-empty series, or an empty series if no provider covers the day
+
+        Raises:
+            RateLimitedError: If every provider is rate limiting us
+            ProviderError: If every provider failed
+        """
+        return self.fetch_days(lat, lng, [date_str])[date_str]
+
+    def fetch_days(self, lat: float, lng: float, dates: List[str]) -> Dict[str, HourlySeries]:
+        """
+        Fetch several days of forecasts, each from the first provider that delivers it.
+
+        Each provider is asked once for all days still missing, so a trip over several
+        days costs one request per location rather than one per day.
+
+        Args:
+            lat: Latitude coordinate
+            lng: Longitude coordinate
+            dates: Forecast dates as "YYYY-MM-DD"
+
+        Returns:
+            Series per date: every requested date (empty if no provider covers it), plus
+            any other non-empty days the providers returned
+
+        Raises:
+            RateLimitedError: If every provider is rate limiting us
+            ProviderError: If every provider failed
+        """
+        errors = []
+        retry_after: List[Optional[float]] = []
+        result: Dict[str, HourlySeries] = {}
+        missing = list(dict.fromkeys(dates))
+        answered = False
+        for provider in self.order():
+            if not missing:
+                break
+            started = time.perf_counter()
+            try:
+                days = provider.fetch_days(lat, lng, missing)
+            except RateLimitedError as e:
+                logger.warning(f"{provider.name} is rate limited, trying the next provider")
+                self._failed(provider, e.retry_after or self.cooldown)
+                errors.append(str(e))
+                retry_after.append(e.retry_after)
+                continue
+            except ProviderError as e:
+                logger.warning(f"{provider.name} failed ({e}), trying the next provider")
+                self._failed(provider, None)
+                errors.append(str(e))
+                continue
+            self._succeeded(provider, time.perf_counter() - started)
+            answered = True
+            result.update((date_str, series) for date_str, series in days.items() if len(series))
+            missing = [date_str for date_str in missing if date_str not in result]
+        if not answered:
+            if errors and len(retry_after) == len(errors):
+                known = [seconds for seconds in retry_after if seconds is not None]
+                raise RateLimitedError("; ".join(errors), min(known) if known else None)
+            raise ProviderError("; ".join(errors))
+        for date_str in missing:
+            result[date_str] = HourlySeries.from_rows([])
+        return result
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Request, error and latency figures per provider."""
+        now = time.time()
+        with self._lock:
+            return {
+                name: {
+                    "requests": health.requests,
+                    "errors": health.errors,
+                    "available": health.unavailable_until <= now,
+                    "latency": None if health.latency is None else round(health.latency, 3)
+                }
+                for name, health in self._health.items()
+            }
+
+    def _succeeded(self, provider: WeatherProvider, elapsed: float) -> None:
+        with self._lock:
+            health = self._health[provider.name]
+            health.requests += 1
+            health.consecutive_failures = 0
+            health.latency = elapsed if health.latency is None else 0.8 * health.latency + 0.2 * elapsed
+
+    def _failed(self, provider: WeatherProvider, pause: Optional[float]) -> None:
+        with self._lock:
+            health = self._health[provider.name]
+            health.requests += 1
+            health.errors += 1
+            health.consecutive_failures += 1
+            if pause is None and health.consecutive_failures >= self.max_failures:
+                pause = self.cooldown
+            if pause is not None:
+                health.unavailable_until = time.time() + pause